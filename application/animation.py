@@ -0,0 +1,149 @@
+"""
+animation.py — анимация ковра по масштабу z: один мастер-расчёт + кадры.
+
+Кадр с параметром alpha — это ковёр при z_eff = z / alpha, т.е. окно
+одного мастер-ковра по z_eff ∈ [z_min/alpha_max, z_max/alpha_min].
+Мастер считается один раз на адаптивной сетке (плотность там, где её
+требует самый мелкий шаг кадров), кадры получаются линейной
+интерполяцией строк, растеризуются в пуле процессов и потоком уходят
+в писатель GIF/MP4 без хранения всех RGB-кадров в памяти.
+"""
+
+from __future__ import annotations
+import os
+import shutil
+import subprocess
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+
+# ────────── мастер-сетка и кадры ───────────────────────────────────────
+def master_grid(z: np.ndarray, alphas, oversample: float = 2.0) -> np.ndarray:
+    """
+    Узлы z_eff для мастер-ковра. Строки кадра alpha идут с шагом dz/alpha,
+    поэтому в точке z_eff шаг мастера — dz / (oversample·a_max(z_eff)),
+    где a_max — наибольший alpha, чьё окно покрывает z_eff.
+    """
+    z = np.asarray(z, dtype=np.float64)
+    alphas = np.asarray(alphas, dtype=np.float64)
+    dz = float(np.min(np.diff(z))) if z.size > 1 else 1.0
+    lo, hi = z[0] / alphas.max(), z[-1] / alphas.min()
+    nodes = [lo]
+    while nodes[-1] < hi:
+        ze = nodes[-1]
+        cover = alphas[(z[0] / alphas <= ze * (1 + 1e-12)) & (ze <= z[-1] / alphas * (1 + 1e-12))]
+        a_max = cover.max() if cover.size else alphas.max()
+        nodes.append(ze + dz / (oversample * a_max))
+    nodes[-1] = hi
+    return np.asarray(nodes)
+
+
+def frame_from_master(zm: np.ndarray, Im: np.ndarray, z_eff: np.ndarray) -> np.ndarray:
+    """Строки мастер-ковра Im (узлы zm), линейно интерполированные в z_eff."""
+    j = np.clip(np.searchsorted(zm, z_eff) - 1, 0, zm.size - 2)
+    t = ((z_eff - zm[j]) / (zm[j + 1] - zm[j])).astype(np.float32)[:, None]
+    return (1 - t) * Im[j] + t * Im[j + 1]
+
+
+# ────────── растеризация в процессах ───────────────────────────────────
+_FIG = None
+
+
+def _init_raster(style: dict):
+    """Инициализатор процесса: одна фигура matplotlib на процесс."""
+    global _FIG
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import matplotlib.colors as colors
+
+    fig, ax = plt.subplots(figsize=style.get("figsize", (10, 6)), dpi=style.get("dpi", 100))
+    ax.set_xlabel(style.get("xlabel", ""))
+    ax.set_ylabel(style.get("ylabel", ""))
+    norm = colors.PowerNorm(gamma=style.get("gamma", 1.0),
+                            vmin=style["vmin"], vmax=style["vmax"])
+    im = ax.imshow(np.zeros((2, 2)), extent=style["extent"], cmap=style.get("cmap", "inferno"),
+                   aspect="auto", norm=norm)
+    fig.colorbar(im, ax=ax, label=style.get("clabel", ""))
+    title = ax.set_title("")
+    _FIG = (fig, im, title, style.get("title", "{:.1f}"))
+
+
+def _raster(item) -> np.ndarray:
+    """(alpha, кадр) → RGB-картинка (h, w, 3) uint8."""
+    alpha, arr = item
+    fig, im, title, fmt = _FIG
+    im.set_data(arr)
+    title.set_text(fmt.format(alpha))
+    fig.canvas.draw()
+    return np.asarray(fig.canvas.buffer_rgba())[..., :3].copy()
+
+
+# ────────── писатели ──────────────────────────────────────────────────
+def _write_ffmpeg(path: str, fps: float, rgbs):
+    """Поток сырых RGB-кадров в ffmpeg (GIF или MP4 по расширению)."""
+    proc = None
+    try:
+        for rgb in rgbs:
+            if proc is None:
+                h, w, _ = rgb.shape
+                cmd = ["ffmpeg", "-y", "-loglevel", "error", "-f", "rawvideo", "-pix_fmt", "rgb24",
+                       "-s", f"{w}x{h}", "-r", str(fps), "-i", "-"]
+                if path.endswith(".mp4"):
+                    cmd += ["-pix_fmt", "yuv420p", "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2"]
+                proc = subprocess.Popen(cmd + [path], stdin=subprocess.PIPE)
+            proc.stdin.write(rgb.tobytes())
+    finally:
+        if proc is not None:
+            proc.stdin.close()
+            proc.wait()
+
+
+def _write_pillow(path: str, fps: float, rgbs):
+    """
+    Без ffmpeg: GIF через Image.save(save_all=True). Палитра — по первому
+    кадру (цветовая шкала у кадров общая); остальные Pillow забирает из
+    генератора по одному и квантует в неё, так что RGB-кадры не копятся —
+    до записи файла Pillow держит только их палитровые копии (1 байт/пиксель).
+    """
+    from PIL import Image
+    rgbs = iter(rgbs)
+    first = next(rgbs, None)
+    if first is None:
+        return
+    pal = Image.fromarray(first).quantize(256)
+    rest = (Image.fromarray(rgb).quantize(palette=pal, dither=Image.Dither.NONE) for rgb in rgbs)
+    pal.save(path, save_all=True, append_images=rest,
+             duration=int(1000 / fps), loop=0, optimize=False)
+
+
+def _writer(path: str):
+    if shutil.which("ffmpeg"):
+        return _write_ffmpeg
+    if path.endswith(".mp4"):
+        raise RuntimeError("для MP4 нужен ffmpeg в PATH")
+    return _write_pillow
+
+
+def _rastered(frames, ex, workers: int):
+    """RGB-кадры по порядку; в полёте не больше 2·workers."""
+    pending = deque()
+    for item in frames:
+        pending.append(ex.submit(_raster, item))
+        if len(pending) >= 2 * workers:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def render_animation(frames, path: str, style: dict, *, fps: float = 5, workers: int | None = None):
+    """
+    Растеризовать кадры (итератор пар (alpha, массив)) в пуле процессов
+    и по порядку отдать писателю. В полёте не больше 2·workers кадров.
+    """
+    workers = workers or os.cpu_count() or 1
+    write = _writer(path)
+    with ProcessPoolExecutor(workers, initializer=_init_raster, initargs=(style,)) as ex:
+        write(path, fps, _rastered(frames, ex, workers))
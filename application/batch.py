@@ -0,0 +1,142 @@
+"""
+batch.py — пакетный расчёт ковров без GUI по сетке параметров.
+
+    python batch.py sweep.json -o results/sweep --workers 4 --threads 1
+
+Конфиг (JSON или TOML): значения — число/строка или список; считается
+декартово произведение списков поверх значений по умолчанию, например
+    {"a": [0.5, 1.0], "duty": [0.1, 0.2, 0.3], "res": 200, "z_max": 3}
+
+Точки считаются в пуле процессов; каждому процессу ограничено число
+потоков BLAS/OpenMP/FFT (--threads), чтобы пул не переподписывал ядра.
+Каждый результат — отдельный чанк <ключ>.npy, manifest.json дописывается
+по мере готовности; повторный запуск пропускает уже посчитанные точки.
+"""
+
+from __future__ import annotations
+import argparse
+import itertools
+import json
+import multiprocessing as mp
+import os
+import pathlib
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from cache import cache_key
+
+# значения по умолчанию — как у ControlPanel, но вывод — сырая |E|² float32
+DEFAULTS = dict(
+    a=1.0, wavelength=1.0, duty=0.2, nslits=20, x_min=-3.0, x_max=3.0,
+    z_max=3.0, res=150, use_gpu=False, engine="fft", pad=False, out_dtype="float32",
+)
+# переменные окружения, ограничивающие потоки нативных библиотек
+_THREAD_ENV = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS",
+               "NUMEXPR_NUM_THREADS", "VECLIB_MAXIMUM_THREADS", "NUMBA_NUM_THREADS")
+
+
+def load_config(path) -> dict:
+    path = pathlib.Path(path)
+    if path.suffix == ".toml":
+        import tomllib
+        with open(path, "rb") as f:
+            return tomllib.load(f)
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def expand_grid(cfg: dict) -> list[dict]:
+    """Декартово произведение списков конфига поверх DEFAULTS."""
+    unknown = set(cfg) - set(DEFAULTS)
+    if unknown:
+        raise ValueError(f"unknown parameters: {sorted(unknown)}")
+    axes = {k: v if isinstance(v, list) else [v] for k, v in {**DEFAULTS, **cfg}.items()}
+    keys = list(axes)
+    return [dict(zip(keys, vals)) for vals in itertools.product(*axes.values())]
+
+
+# ────────── манифест ──────────────────────────────────────────────────
+class Manifest:
+    """manifest.json: ключ точки → параметры, файл, форма, время."""
+
+    def __init__(self, root: pathlib.Path):
+        self.root = root
+        self.path = root / "manifest.json"
+        self.entries: dict[str, dict] = {}
+        if self.path.exists():
+            self.entries = json.loads(self.path.read_text(encoding="utf-8"))["points"]
+
+    def done(self, key: str) -> bool:
+        e = self.entries.get(key)
+        return e is not None and (self.root / e["file"]).exists()
+
+    def add(self, key: str, entry: dict):
+        self.entries[key] = entry
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"points": self.entries}, indent=1, ensure_ascii=False),
+                       encoding="utf-8")
+        os.replace(tmp, self.path)
+
+
+# ────────── процесс-исполнитель ─────────────────────────────────────────
+def _init_worker(threads: int):
+    import compute
+    compute.FFT_WORKERS = threads
+    compute.load_kernels()              # из дискового кэша, один раз на процесс
+
+
+def _run_point(params: dict, key: str, root: str) -> dict:
+    import numpy as np
+    from compute import talbot_carpet
+    t0 = time.perf_counter()
+    arr = talbot_carpet(**params)
+    seconds = time.perf_counter() - t0
+    name = f"{key}.npy"
+    tmp = pathlib.Path(root) / f"{key}.tmp.npy"
+    np.save(tmp, arr)
+    os.replace(tmp, pathlib.Path(root) / name)
+    return dict(params=params, file=name, shape=list(arr.shape),
+                dtype=str(arr.dtype), seconds=round(seconds, 4))
+
+
+def run_sweep(points: list[dict], out_dir, *, workers: int = 0, threads: int = 1, log=print):
+    root = pathlib.Path(out_dir)
+    root.mkdir(parents=True, exist_ok=True)
+    manifest = Manifest(root)
+    todo = [(cache_key(p), p) for p in points]
+    todo = [(k, p) for k, p in todo if not manifest.done(k)]
+    log(f"{len(points)} точек, уже готово {len(points) - len(todo)}, считаем {len(todo)}")
+    if not todo:
+        return manifest
+
+    workers = workers or max(1, (os.cpu_count() or 1) // max(1, threads))
+    # дочерние процессы (spawn) наследуют окружение до импорта numpy
+    for var in _THREAD_ENV:
+        os.environ[var] = str(threads)
+    ctx = mp.get_context("spawn")
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(workers, mp_context=ctx, initializer=_init_worker,
+                             initargs=(threads,)) as ex:
+        futs = {ex.submit(_run_point, p, k, str(root)): k for k, p in todo}
+        for i, fut in enumerate(as_completed(futs), 1):
+            key = futs[fut]
+            entry = fut.result()
+            manifest.add(key, entry)
+            log(f"[{i}/{len(todo)}] {key[:10]} {entry['seconds']:.2f} с")
+    log(f"готово за {time.perf_counter() - t0:.1f} с")
+    return manifest
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Пакетный расчёт ковров Талбота по сетке параметров")
+    ap.add_argument("config", help="JSON/TOML с сеткой параметров")
+    ap.add_argument("-o", "--out", default="sweep", help="каталог результатов")
+    ap.add_argument("--workers", type=int, default=0, help="процессов (0 — ядра / threads)")
+    ap.add_argument("--threads", type=int, default=1, help="потоков на процесс")
+    args = ap.parse_args(argv)
+    run_sweep(expand_grid(load_config(args.config)), args.out,
+              workers=args.workers, threads=args.threads)
+
+
+if __name__ == "__main__":
+    main()
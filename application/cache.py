@@ -0,0 +1,165 @@
+"""
+cache.py — кэш готовых ковров по содержимому параметров.
+
+В памяти — LRU, ограниченный суммарным размером массивов в байтах.
+Опционально — сквозная запись на диск (<ключ>.npy), которая переживает
+перезапуск; с диска массивы открываются через memmap без копирования.
+"""
+
+from __future__ import annotations
+import hashlib
+import json
+import os
+import pathlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# параметры, не влияющие на результат (устройство расчёта)
+_VOLATILE = frozenset({"use_gpu"})
+
+
+def cache_key(params: dict) -> str:
+    """
+    Ключ по нормализованному словарю ControlPanel.params(): порядок ключей
+    не важен, float округляются до 10 значащих цифр (шум raw·step слайдера).
+    """
+    norm = {}
+    for k, v in sorted(params.items()):
+        if k in _VOLATILE:
+            continue
+        if isinstance(v, float):
+            v = float(f"{v:.10g}")
+        elif isinstance(v, (tuple, list)):
+            # окно зума: те же 10 значащих цифр, что и у скаляров
+            v = [float(f"{u:.10g}") if isinstance(u, float) else u for u in v]
+        norm[k] = v
+    blob = json.dumps(norm, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(blob.encode()).hexdigest()
+
+
+class ResultCache:
+    """
+    Потокобезопасный LRU-кэш результатов talbot_carpet.
+
+    max_bytes      — предел памяти под массивы;
+    disk_dir       — каталог для .npy (None — только память);
+    max_disk_bytes — предел на диске, вытесняются самые старые по mtime.
+    """
+
+    def __init__(self, max_bytes: int = 512 * 2**20, disk_dir=None,
+                 max_disk_bytes: int = 4 * 2**30):
+        self.max_bytes = max_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.disk_dir = pathlib.Path(disk_dir) if disk_dir else None
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+        self._mem: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.disk_hits = self.misses = 0
+        self.evictions = self.disk_evictions = 0
+
+    # ---------- доступ ----------------------------------------------------
+    def get(self, params: dict):
+        key = cache_key(params)
+        with self._lock:
+            arr = self._mem.get(key)
+            if arr is not None:
+                self._mem.move_to_end(key)
+                self.hits += 1
+                return arr
+            path = self._path(key)
+            if path is not None and path.exists():
+                try:
+                    os.utime(path)
+                    arr = np.load(path, mmap_mode="r")
+                except FileNotFoundError:
+                    pass                    # вытеснен другим потоком между exists и load
+                else:
+                    self.disk_hits += 1
+                    return arr
+            self.misses += 1
+            return None
+
+    def contains(self, params: dict) -> bool:
+        """Есть ли результат в памяти или на диске (не влияет на статистику и LRU)."""
+        key = cache_key(params)
+        with self._lock:
+            if key in self._mem:
+                return True
+        path = self._path(key)
+        return path is not None and path.exists()
+
+    def put(self, params: dict, arr: np.ndarray):
+        """В кэш — вид только для чтения; флаги самого arr не меняются."""
+        key = cache_key(params)
+        arr = arr.view()
+        arr.flags.writeable = False
+        with self._lock:
+            if arr.nbytes <= self.max_bytes:
+                old = self._mem.pop(key, None)
+                if old is not None:
+                    self._bytes -= old.nbytes
+                self._mem[key] = arr
+                self._bytes += arr.nbytes
+                while self._bytes > self.max_bytes:
+                    _, ev = self._mem.popitem(last=False)
+                    self._bytes -= ev.nbytes
+                    self.evictions += 1
+        path = self._path(key)
+        if path is not None and not path.exists():
+            # своё имя временного файла у каждой записи: параллельный put того
+            # же ключа не переименует чужой недописанный файл
+            fd, tmp = tempfile.mkstemp(suffix=".tmp.npy", dir=self.disk_dir)
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    np.save(f, arr)
+                os.replace(tmp, path)
+            except BaseException:
+                pathlib.Path(tmp).unlink(missing_ok=True)
+                raise
+            self._trim_disk()
+
+    def clear(self):
+        with self._lock:
+            self._mem.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(
+                hits=self.hits, disk_hits=self.disk_hits, misses=self.misses,
+                evictions=self.evictions, disk_evictions=self.disk_evictions,
+                entries=len(self._mem), bytes=self._bytes, max_bytes=self.max_bytes,
+            )
+
+    # ---------- диск ------------------------------------------------------
+    def _path(self, key: str):
+        return self.disk_dir / f"{key}.npy" if self.disk_dir is not None else None
+
+    def _trim_disk(self):
+        # файлы может параллельно удалить другой поток: такие просто пропускаются
+        files = []
+        for p in self.disk_dir.glob("*.npy"):
+            if p.name.endswith(".tmp.npy"):
+                continue
+            try:
+                st = p.stat()
+            except FileNotFoundError:
+                continue
+            files.append((st.st_mtime, st.st_size, p))
+        files.sort(key=lambda f: f[0])
+        total = sum(size for _, size, _ in files)
+        for _, size, p in files:
+            if total <= self.max_disk_bytes:
+                break
+            total -= size
+            try:
+                p.unlink()
+            except FileNotFoundError:
+                continue
+            with self._lock:
+                self.disk_evictions += 1
@@ -2,26 +2,109 @@
 """
 compute.py — быстрый расчёт «ковра Талбота» (FFT + Numba)
 
-CPU: NumPy-FFT, ускоряется Numba.
-GPU: torch.fft (ROCm/NVIDIA) включается чекбоксом GPU (torch).
+CPU: спектр решётки A_k — в замкнутой форме (sinc × ядро Дирихле),
+     обратное FFT пакетами по чанкам z (scipy.fft, complex64, многопоточно);
+     пропагатор и |E|² — prange-ядра Numba (kernels.py), если есть;
+     зеркально-симметричное окно — пропагатор на половине спектра.
+torch: тот же FFT-путь на torch.fft (torch_fft.py) — GPU (CUDA/ROCm), а без
+     него многопоточный CPU; включается чекбоксом «torch».
+harmonic: замкнутый ряд Фурье идеальной решётки, один период z_T.
+fresnel: точный интеграл Френеля по щелям (fresnel.py).
+out_dtype: float16/uint16/uint8 — ковёр, нормированный на максимум, считается
+     блоками по z и сразу пишется в компактный тип (в 2–4 раза меньше памяти).
+
+Тяжёлые бэкенды (scipy.fft, numba, torch) импортируются при первом
+использовании или заранее в фоне — warmup_async() после показа окна.
 """
 
 from __future__ import annotations
+import importlib.util
+import threading
+import warnings
+from collections import OrderedDict
+from contextlib import contextmanager
+
 import numpy as np
 
-# optional numba
-try:
-    import numba as nb
-    NUMBA = True
-except ImportError:
-    NUMBA = False
+import timing
+from timing import stage
+
+# optional numba: kernels.py импортируется и компилируется load_kernels(),
+# до этого движки идут по пути NumPy
+NUMBA = importlib.util.find_spec("numba") is not None
+kernels = None
+# False — всегда путь NumPy (сравнение, отладка)
+USE_NUMBA = True
+
+# optional scipy.fft (многопоточное FFT в одинарной точности), см. _scipy_fft()
+sfft = None
+
+# optional torch: импорт стоит секунды, см. torch_ok()
+_torch_ok: bool | None = None
+
+_load_lock = threading.Lock()
+_warm_started = False
+
+
+def load_kernels():
+    """Импорт kernels.py и компиляция ядер (из дискового кэша — доли секунды)."""
+    global kernels, NUMBA
+    with _load_lock:
+        if NUMBA and kernels is None:
+            try:
+                import kernels as k
+            except ImportError:
+                NUMBA = False
+                return None
+            k.warmup()
+            kernels = k
+    return kernels
+
+
+def _scipy_fft():
+    """scipy.fft или None, если scipy нет; импорт при первом FFT."""
+    global sfft
+    if sfft is None:
+        try:
+            import scipy.fft as m
+        except ImportError:
+            m = False
+        sfft = m
+    return sfft or None
 
-# optional torch
-try:
-    import torch
-    TORCH_OK = torch.cuda.is_available()
-except ImportError:
-    TORCH_OK = False
+
+def torch_ok() -> bool:
+    """Есть ли torch (устройство — см. torch_fft.device()); импорт при первом вызове."""
+    global _torch_ok
+    if _torch_ok is None:
+        try:
+            import torch.fft  # noqa: F401
+            _torch_ok = True
+        except ImportError:
+            _torch_ok = False
+    return _torch_ok
+
+
+def __getattr__(name):
+    # compute.TORCH_OK — ленивый, чтобы импорт модуля не тянул torch
+    if name == "TORCH_OK":
+        return torch_ok()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def warmup_async():
+    """Фоновый прогрев бэкендов: scipy.fft, ядра Numba, torch (один раз)."""
+    global _warm_started
+    if _warm_started:
+        return
+    _warm_started = True
+
+    def run():
+        _scipy_fft()
+        load_kernels()
+        torch_ok()
+
+    threading.Thread(target=run, name="backend-warmup", daemon=True).start()
 
 
 def _mask_1d(x: np.ndarray, a: float, duty: float, nslits: int):
@@ -33,53 +116,827 @@ def _mask_1d(x: np.ndarray, a: float, duty: float, nslits: int):
     return m.astype(np.float32)
 
 
-def _cpu_fft(a, wl, duty, nslits, xmin, xmax, res, z_rel):
+# Бюджет памяти на промежуточные буферы одного чанка по z (байт).
+# Размер чанка подбирается так, чтобы пиковая память не зависела от nz × nx.
+MEM_BUDGET = 256 * 2**20
+# float64-фаза + float32-фаза + complex64-поле на один отсчёт (x, z)
+_ROW_BYTES = 8 + 4 + 8
+# число потоков для scipy.fft (-1 — все ядра); внутри serial() — 1
+FFT_WORKERS = -1
+_LOCAL = threading.local()
+# верхняя граница чанка: между чанками проверяется отмена и идёт прогресс
+MAX_CHUNK_ROWS = 256
+
+
+class Cancelled(Exception):
+    """Расчёт прерван через cancel-токен."""
+
+
+def _numba():
+    """Модуль ядер, если Numba включена и ядра уже скомпилированы, иначе None."""
+    return kernels if USE_NUMBA else None
+
+
+def _chunk_rows(nx: int, budget: int = MEM_BUDGET, row_bytes: int = _ROW_BYTES) -> int:
+    """Сколько строк z помещается в бюджет памяти (от 1 до MAX_CHUNK_ROWS)."""
+    return max(1, min(MAX_CHUNK_ROWS, int(budget // (row_bytes * nx))))
+
+
+def _fft_workers() -> int:
+    """Потоков scipy.fft для расчёта в текущем потоке."""
+    return getattr(_LOCAL, "fft_workers", FFT_WORKERS)
+
+
+@contextmanager
+def serial():
+    """
+    Расчёты в текущем потоке — в один поток ОС: scipy.fft с workers=1 и
+    ядра Numba с одним потоком (в Numba это настройка вызывающего потока),
+    остальные потоки процесса не затрагиваются. Пул torch на CPU общий на
+    процесс — его serial() не ограничивает.
+    """
+    k = load_kernels() if USE_NUMBA else None
+    prev = k.set_threads(1) if k else None
+    _LOCAL.fft_workers = 1
+    try:
+        yield
+    finally:
+        del _LOCAL.fft_workers
+        if k:
+            k.set_threads(prev)
+
+
+def _tick(cancel, progress, done, total, partial=None):
+    """
+    Точка кооперативной отмены между чанками.
+    cancel — объект с is_set() (например threading.Event),
+    progress(done, total, partial) — колбэк; partial — заполняемый массив или None.
+    """
+    if cancel is not None and cancel.is_set():
+        raise Cancelled
+    if progress is not None:
+        progress(done, total, partial)
+
+
+def _ifft_rows(E: np.ndarray) -> np.ndarray:
+    """Пакетное обратное FFT по последней оси, на месте, complex64."""
+    fft = _scipy_fft()
+    if fft is not None:
+        return fft.ifft(E, axis=-1, overwrite_x=True, workers=_fft_workers())
+    return np.fft.ifft(E, axis=-1).astype(np.complex64, copy=False)
+
+
+def _abs2_into(E: np.ndarray, out: np.ndarray, nbk=None):
+    if nbk:
+        nbk.abs2(E, out)
+    else:
+        np.square(E.real, out=out)
+        out += np.square(E.imag)
+
+
+# ────────── зеркальная симметрия ────────────────────────────────────────
+# Решётка, симметричная относительно центра окна x_c, даёт вещественный
+# чётный спектр в фазе x_c, а H(k, z) чётен по k — значит, и поле чётно
+# по x − x_c. Пропагатор и A_k считаются на половине спектра m = 0 … n//2
+# (вдвое меньше sincos — это и есть основной выигрыш); дальше:
+#   x_c — отсчёт сетки: половина зеркально разворачивается в полный
+#       спектр, одно комплексное ifft длины n, окно — со сдвигом на x_c;
+#   x_c — между отсчётами (чётное n): DCT-III (отсчёты на полушаге от
+#       центра) плюс вклад частоты Найквиста, и половина окна.
+# Само обратное FFT зеркальность почти не ускоряет: DCT-I и пара irfft в
+# pocketfft не быстрее комплексного ifft той же длины, поэтому длину FFT
+# она не ограничивает — с pad это обычная 5-гладкая длина. Без pad
+# длина n = (x_max − x_min)·res + 1 часто не 5-гладкая, и ifft там
+# дорогое в обоих путях: выигрыш — только половина пропагатора.
+# Несимметричные входы идут полным комплексным FFT.
+
+# False — всегда полное FFT (сравнение, отладка)
+USE_SYMMETRY = True
+# допустимая асимметрия спектра в долях max|A_k|
+SYM_TOL = 1e-5
+
+
+def _mirror_centre(n: int, off: int, nx: int):
+    """
+    Центр симметрии окна на периодической сетке длины n: (c, d) — c
+    первый отсчёт справа от центра, d = 1, если центр между отсчётами.
+    """
+    c2 = 2 * off + nx - 1                # удвоенный индекс центра окна
+    if c2 % 2 and n % 2:
+        c2 += n                          # у нечётного n второй центр — отсчёт
+    return (c2 + 1) // 2 % n, c2 % 2
+
+
+def _even_spectrum(A_k: np.ndarray, k: np.ndarray, shift: float):
+    """Половина A_k в фазе точки shift (complex64), если он вещественный и чётный; иначе None."""
+    Ac = A_k * np.exp(2j * np.pi * k * shift)
+    tol = SYM_TOL * np.abs(A_k).max()
+    if np.abs(Ac.imag).max() > tol or np.abs(Ac[1:] - Ac[:0:-1]).max() > tol:
+        return None
+    return Ac.real[:A_k.size // 2 + 1].astype(np.complex64)
+
+
+def _unfold(C: np.ndarray, n: int) -> np.ndarray:
+    """Полный чётный спектр (rows, n) из половины C (m = 0 … n//2)."""
+    h = n // 2
+    E = np.empty((C.shape[0], n), dtype=np.complex64)
+    E[:, :h + 1] = C
+    E[:, h + 1:] = C[:, n - h - 1:0:-1]
+    return E
+
+
+def _roll_abs2(E, start, out, nbk=None):
+    """|E|² столбцов start, start + 1, … (по модулю n) в out (rows, nx)."""
+    n, nx = E.shape[1], out.shape[1]
+    k = min(nx, n - start)
+    _abs2_into(E[:, start:start + k], out[:, :k], nbk)
+    if k < nx:
+        _abs2_into(E[:, :nx - k], out[:, k:], nbk)
+
+
+def _half_rows(C: np.ndarray, n: int):
+    """
+    Поле по половинному спектру C (m = 0 … n//2) при чётном n и центре
+    между отсчётами: (S, q), справа от центра S + q, слева зеркально S − q.
+    q — вклад частоты Найквиста −i(−1)^t·C_N/n.
+    """
+    h = n // 2
+    S = _scipy_fft().dct(C[:, :h], type=3, axis=-1, workers=_fft_workers())
+    S *= np.float32(1 / n)
+    alt = np.where(np.arange(h) % 2, 1j, -1j).astype(np.complex64) / np.float32(n)
+    return S, C[:, h:] * alt
+
+
+def _mirror_abs2(S, q, r0, out, nbk=None):
+    """|E|² окна из половины поля (S, q) в out (rows, nx); r0 — столбец out первого отсчёта справа от центра."""
+    nx = out.shape[1]
+    c = max(r0, 0)
+    if c < nx:
+        t = slice(c - r0, nx - r0)
+        _abs2_into(S[:, t] + q[:, t], out[:, c:], nbk)
+    if r0 > 0:
+        c = min(r0, nx)
+        t = slice(r0 - c, r0)
+        _abs2_into((S[:, t] - q[:, t])[:, ::-1], out[:, :c], nbk)
+
+
+# ────────── план FFT и защитная полоса ──────────────────────────────────
+# Без паддинга окно FFT периодично: свет от крайних щелей заворачивает на
+# другой край. С pad=True решётка конечна (все nslits щелей), окно
+# расширяется на защитную полосу и дополняется нулями до быстрой длины
+# FFT (5-гладкой), а результат обрезается обратно до [x_min, x_max].
+
+# доля энергии дифракционных порядков, которую защитная полоса не ловит
+GUARD_TOL = 0.01
+# предел длины FFT с полосой: дальше pad считается движком Френеля (урезанная
+# полоса вернула бы заворот; строка такой длины — 32 МБ complex64)
+PAD_MAX_N = 1 << 22
+
+
+def _next_smooth(n: int, primes=(2, 3, 5)) -> int:
+    """Наименьшее m ≥ n, все простые множители которого из primes."""
+    m = n
+    while True:
+        k = m
+        for p in primes:
+            while k % p == 0:
+                k //= p
+        if k == 1:
+            return m
+        m += 1
+
+
+def _factors(n: int) -> list[int]:
+    out, p = [], 2
+    while p * p <= n:
+        while n % p == 0:
+            out.append(p)
+            n //= p
+        p += 1
+    return out + ([n] if n > 1 else [])
+
+
+def _fft_direct(n: int) -> float:
+    return n * sum(p if p <= 5 else 1.1 * p for p in _factors(n))
+
+
+def _fft_cost(n: int) -> float:
+    """Оценка стоимости FFT длины n по модели pocketfft (прямой проход или Блюстейн)."""
+    return min(_fft_direct(n), 3.0 * _fft_direct(_next_smooth(2 * n - 1)))
+
+
+def fft_plan(n: int) -> tuple[int, float]:
+    """Быстрая длина ≥ n и ожидаемое ускорение FFT по модели стоимости."""
+    m = _next_smooth(n)
+    return m, _fft_cost(n) / _fft_cost(m)
+
+
+def _guard(a: float, duty: float, z_max: float) -> float:
+    """
+    Защитная полоса: порядок n к z/z_T уходит вбок на 2·a·n·z/z_T, а чтобы
+    завернуть в окно, свету нужно пройти обе полосы — хватает a·N·z_max,
+    где N ловит 1 − GUARD_TOL энергии решётки. z_max округляется вверх до
+    степени двойки, чтобы сетка не менялась при каждой правке z_max.
+    """
+    N = _harmonic_coeffs(duty, 4096, GUARD_TOL).size - 1
+    zq = 2.0 ** np.ceil(np.log2(max(z_max, 0.25)))
+    return a * max(N, 1) * zq
+
+
+def _pad_bands(a, duty, nslits, xmin, xmax, nx, z_max):
+    """
+    Полосы (left, right) в отсчётах шага окна: вся решётка плюс защитная
+    полоса с каждой стороны, и признак симметричного окна.
+    """
+    dx = (xmax - xmin) / (nx - 1)
+    half = duty * a / 2
+    lo = min(xmin, -(nslits // 2) * a - half)
+    hi = max(xmax, (nslits - 1 - nslits // 2) * a + half)
+    guard = _guard(a, duty, z_max)
+    left = int(np.ceil((xmin - lo + guard) / dx))
+    right = int(np.ceil((hi - xmax + guard) / dx))
+    # окно с центром в центре решётки остаётся симметричным (зеркальный
+    # путь _fft_setup): полосы поровну, добивка до быстрой длины — тоже
+    # поровну с точностью до отсчёта, центр симметрии от этого не сдвигается
+    sym = USE_SYMMETRY and abs(xmin + xmax - (lo + hi)) < 1e-9 * (xmax - xmin)
+    if sym:
+        left = right = max(left, right)
+    return left, right, sym
+
+
+def _pad_fits(a, duty, nslits, xmin, xmax, res, z_max) -> bool:
+    """Помещается ли решётка с защитной полосой в PAD_MAX_N отсчётов."""
     nx = int((xmax - xmin) * res) + 1
+    left, right, _ = _pad_bands(a, duty, nslits, xmin, xmax, nx, z_max)
+    return nx + left + right <= PAD_MAX_N
+
+
+def _geometry(a, duty, nslits, xmin, xmax, res, z_max, pad):
+    """
+    Сетка FFT: (x0, x1, n, off, nx) — n отсчётов от x0 до x1 с шагом окна,
+    столбцы off:off + nx — запрошенное окно [x_min, x_max]. С pad сетка
+    накрывает всю решётку и защитную полосу целиком — без урезания, иначе
+    заворот вернётся; длина сверх PAD_MAX_N — ValueError (см. _pad_fits).
+    """
+    nx = int((xmax - xmin) * res) + 1
+    if not pad:
+        # без pad окно — ровно один период поля: дополнение до быстрой длины
+        # вставило бы тёмный зазор между периодами и сменило картину, а тот
+        # же период в nx узлах — по определению DFT длины nx. Длина остаётся
+        # nx; во что обходится медленная, видно по аннотации fft
+        m, speedup = fft_plan(nx)
+        timing.annotate(fft=f"{nx} (быстрая {m} ×{speedup:.2f})")
+        return xmin, xmax, nx, 0, nx
     dx = (xmax - xmin) / (nx - 1)
-    x = np.linspace(xmin, xmax, nx)
-    mask = _mask_1d(x, a, duty, nslits)
-
-    A_k = np.fft.fft(mask)
-    k = np.fft.fftfreq(nx, d=dx)
-    k2 = k * k
-
-    z_T = 2 * a * a / wl
-    out = np.empty((z_rel.size, nx), dtype=np.float32)
-    for i, alpha in enumerate(z_rel):
-        z = alpha * z_T
-        H = np.exp(-1j * np.pi * wl * z * k2)
-        E = np.fft.ifft(A_k * H)
-        out[i] = np.abs(E) ** 2
+    left, right, _ = _pad_bands(a, duty, nslits, xmin, xmax, nx, z_max)
+    n_min = nx + left + right
+    if n_min > PAD_MAX_N:
+        raise ValueError(f"pad needs an FFT of {n_min} samples > PAD_MAX_N = {PAD_MAX_N}; "
+                         f"use engine='fresnel'")
+    n, speedup = fft_plan(n_min)
+    left += (n - n_min) // 2
+    timing.annotate(fft=f"{n_min}→{n} ×{speedup:.2f}")
+    x0 = xmin - left * dx
+    return x0, x0 + (n - 1) * dx, n, left, nx
+
+
+# ────────── стадии конвейера с инвалидацией ───────────────────────────
+# Стадии FFT-движка и от чего они зависят (z в единицах z_T, поэтому
+# длина волны в параксиальном приближении выпадает из всех стадий):
+#   grid        — x, k:                       сетка FFT (x_min, x_max, res, паддинг)
+#   spectrum    — A_k решётки (замкнутая форма): grid + a, duty, nslits
+#   propagator  — H(k, z) для строк z:         grid + a, строки z
+#   rows        — |E|² для строк z:            spectrum + строки z + обрезка
+# Каждая правка пересчитывает только инвалидированные стадии; строки z
+# переиспользуются по общему префиксу, так что рост z_max досчитывает
+# только новые строки.
+
+# предел памяти на один сохранённый H(k, z) (больше — не кэшируется)
+STAGE_BUDGET = 256 * 2**20
+# сколько вариантов каждой стадии держать (грубый и полный проход)
+STAGE_SLOTS = 2
+
+
+class _StageCache:
+    """Последние значения стадий конвейера, по STAGE_SLOTS на стадию."""
+
+    def __init__(self, slots: int = STAGE_SLOTS):
+        self.slots = slots
+        self._d: dict[str, OrderedDict] = {}
+        self._lock = threading.Lock()
+
+    def get(self, stage: str, key):
+        with self._lock:
+            d = self._d.get(stage)
+            if d is None or key not in d:
+                return None
+            d.move_to_end(key)
+            return d[key]
+
+    def put(self, stage: str, key, value):
+        with self._lock:
+            d = self._d.setdefault(stage, OrderedDict())
+            d[key] = value
+            d.move_to_end(key)
+            while len(d) > self.slots:
+                d.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._d.clear()
+
+
+_STAGES = _StageCache()
+# максимум |E|² полных ковров в компактном out_dtype по параметрам — общая
+# шкала для окон зума (в ковре uint8 сам максимум уже не виден)
+_PEAKS = _StageCache(slots=64)
+
+
+def _common_rows(prev_z: np.ndarray | None, z: np.ndarray) -> int:
+    """Длина общего префикса двух наборов строк z."""
+    if prev_z is None:
+        return 0
+    n = min(prev_z.size, z.size)
+    diff = np.nonzero(prev_z[:n] != z[:n])[0]
+    return int(diff[0]) if diff.size else n
+
+
+def _grid(x0, x1, n):
+    key = (x0, x1, n)
+    g = _STAGES.get("grid", key)
+    if g is None:
+        g = (np.linspace(x0, x1, n), np.fft.fftfreq(n, d=(x1 - x0) / (n - 1)))
+        _STAGES.put("grid", key, g)
+    return g
+
+
+def _grating_spectrum(k: np.ndarray, a, duty, nslits, x0, x1, n: int | None = None) -> np.ndarray:
+    """
+    A_k решётки в замкнутой форме — то, что дал бы FFT маски на сетке
+    x0…x1, но без маски и без пиксельной ступеньки на краях щелей:
+        A(k) = (1/dx)·Σ_j ∫ e^{−2πik(x − x0)} dx  по щелям j,
+    обрезанным ячейкой окна [x0 − dx/2, x1 + dx/2]. Целые щели дают
+    w·sinc(kw) × ядро Дирихле sin(πkaM)/sin(πka), обрезанные краем окна
+    (не больше двух) добавляются по отдельности. n — число отсчётов сетки
+    x0…x1 (по умолчанию k.size; k может быть и шире её полосы).
+    """
+    n = n or k.size
+    dx = (x1 - x0) / (n - 1)
+    lo, hi = x0 - dx / 2, x1 + dx / 2
+    w = duty * a
+    c = (np.arange(nslits) - nslits // 2) * a
+    L, R = np.maximum(c - w / 2, lo), np.minimum(c + w / 2, hi)
+    full = np.nonzero((L == c - w / 2) & (R == c + w / 2))[0]
+    A = np.zeros(k.size, dtype=np.complex128)
+    if full.size:
+        M = full.size
+        ka = k * a
+        den = np.sin(np.pi * ka)
+        small = np.abs(den) < 1e-9
+        # при целом k·a = p предел sin(πpM)/sin(πp) = M·(−1)^{p(M−1)}
+        p = np.rint(ka)
+        D = np.where(small, M * np.cos(np.pi * p * (M - 1)),
+                     np.sin(np.pi * ka * M) / np.where(small, 1.0, den))
+        phase = np.exp(-2j * np.pi * (k * (c[full[0]] - x0) + ka * (M - 1) / 2))
+        A += w * np.sinc(k * w) * D * phase
+    for j in np.nonzero((R > L) & ~np.isin(np.arange(nslits), full))[0]:
+        width = R[j] - L[j]
+        A += width * np.sinc(k * width) * np.exp(-2j * np.pi * k * ((L[j] + R[j]) / 2 - x0))
+    return (A / dx).astype(np.complex64)
+
+
+def _spectrum(a, duty, nslits, geom):
+    key = geom + (a, duty, nslits)
+    A_k = _STAGES.get("spectrum", key)
+    if A_k is None:
+        x, k = _grid(*geom)
+        if duty < 1:
+            with stage("spectrum", k.nbytes * 2):
+                A_k = _grating_spectrum(k, a, duty, nslits, geom[0], geom[1])
+        else:
+            # щели сливаются (duty ≥ 1): маска-объединение и прямое FFT
+            nbk = _numba()
+            with stage("mask", x.nbytes):
+                mask = nbk.mask_1d(x, a, duty, nslits) if nbk else _mask_1d(x, a, duty, nslits)
+            with stage("fft_fwd", mask.nbytes):
+                A_k = np.fft.fft(mask).astype(np.complex64)
+        _STAGES.put("spectrum", key, A_k)
+    return A_k
+
+
+def _propagator(a2k2: np.ndarray, z_rel: np.ndarray) -> np.ndarray:
+    """H = exp(-iπλzk²) = exp(-2πi·(z/z_T)·a²k²), complex64."""
+    # доля оборота считается в float64: при больших z фаза достигает 10⁶ рад
+    frac = np.multiply.outer(z_rel, a2k2)
+    np.remainder(frac, 1.0, out=frac)
+    return np.exp(-2j * np.pi * frac.astype(np.float32))
+
+
+def _fft_setup(a, duty, nslits, xmin, xmax, res, z_max, pad, mirror=True):
+    """
+    Общая часть FFT-движков: (geom, off, nx, A_k, a2k2, half). При half =
+    (c, d) (см. _mirror_centre) A_k и a²k² — половина спектра m = 0 … n//2
+    в фазе центра окна; mirror=False — всегда полный спектр.
+    """
+    x0, x1, n, off, nx = _geometry(a, duty, nslits, xmin, xmax, res, z_max, pad)
+    geom = (x0, x1, n)
+    _, k = _grid(*geom)
+    A_k = _spectrum(a, duty, nslits, geom)
+    a2k2 = (a * k) ** 2
+    half = None
+    if mirror and USE_SYMMETRY and n > 2:
+        c, d = _mirror_centre(n, off, nx)
+        if not d or _scipy_fft() is not None:
+            Ac = _even_spectrum(A_k, k, (c - d / 2) * (x1 - x0) / (n - 1))
+            if Ac is not None:
+                A_k, a2k2, half = Ac, a2k2[:Ac.size], (c, d)
+                timing.annotate(sym="dct" if d else "mirror")
+    return geom, off, nx, A_k, a2k2, half
+
+
+def _field_abs2(E, n, off, out, nbk=None, half=None):
+    """|E|² столбцов off … off + nx окна по строкам спектра E (полного или половинного) в out."""
+    if half is not None and half[1]:
+        with stage("dct", E.nbytes):
+            S, q = _half_rows(E, n)
+        with stage("abs2", S.nbytes // 2):
+            _mirror_abs2(S, q, half[0] - off, out, nbk)
+        return
+    if half is not None:
+        with stage("unfold", E.nbytes * 2):
+            E = _unfold(E, n)
+    with stage("ifft", E.nbytes):
+        E = _ifft_rows(E)
+    # при зеркальном пути отсчёт t ifft — точка c + t сетки
+    start = off if half is None else (off - half[0]) % n
+    with stage("abs2", out.nbytes * 2):
+        _roll_abs2(E, start, out, nbk)
+
+
+def _cpu_fft(a, wl, duty, nslits, xmin, xmax, res, z_rel, pad=False, budget=MEM_BUDGET,
+             cancel=None, progress=None, out_dtype="float32"):
+    z_rel = np.asarray(z_rel, dtype=np.float64)
+    geom, off, nx, A_k, a2k2, half = _fft_setup(
+        a, duty, nslits, xmin, xmax, res, float(z_rel.max()) if z_rel.size else 0.0, pad)
+    n, w = geom[2], A_k.size
+
+    nz = z_rel.size
+    rkey = geom + (off, nx, a, duty, nslits, out_dtype)
+    hkey = geom + (a, w)
+    prev = _STAGES.get("rows", rkey)
+    done = _common_rows(prev[0] if prev else None, z_rel)
+    hprev = _STAGES.get("propagator", hkey)
+    hdone = _common_rows(hprev[0] if hprev else None, z_rel)
+    keep_h = nz * w * 8 <= STAGE_BUDGET
+    H_all = np.empty((nz, w), dtype=np.complex64) if keep_h else None
+    if keep_h and hdone:
+        H_all[:hdone] = hprev[1][:hdone]
+
+    nbk = _numba()
+    step = _chunk_rows(n, budget)
+    # компактный вывод: чанк |E|² во float32-буфер и сразу в out_dtype
+    norm = None if out_dtype == "float32" else _Normalizer((nz, nx), out_dtype)
+    if norm is None:
+        out = np.zeros((nz, nx), dtype=np.float32)
+        if done:
+            out[:done] = prev[1][:done]
+    else:
+        out = norm.out
+        buf = np.empty((min(step, nz), nx), dtype=np.float32)
+        if done:
+            norm.seed(prev[1][:done], prev[2])
+    for s in range(done, nz, step):
+        _tick(cancel, progress, s, nz, out)
+        e = min(nz, s + step)
+        if e <= hdone:
+            with stage("propagator_reuse", (e - s) * w * 8):
+                E = hprev[1][s:e] * A_k
+        elif nbk:
+            # один проход: фаза, пропагатор (в стадию) и умножение на A_k
+            with stage("propagator", (e - s) * w * 8):
+                E = nbk.propagate(a2k2, z_rel[s:e], A_k, H_all[s:e] if keep_h else None)
+        else:
+            with stage("propagator", (e - s) * w * 8):
+                E = _propagator(a2k2, z_rel[s:e])
+                if keep_h:
+                    H_all[s:e] = E
+                E *= A_k
+        if norm is None:
+            _field_abs2(E, n, off, out[s:e], nbk, half)
+        else:
+            _field_abs2(E, n, off, buf[:e - s], nbk, half)
+            norm.put(s, buf[:e - s])
+    _tick(cancel, progress, nz, nz, out)
+
+    # в стадию — своя копия только для чтения: вызывающий волен менять out на месте
+    rows = out.copy()
+    rows.flags.writeable = False
+    _STAGES.put("rows", rkey, (z_rel, rows, norm.peak if norm else None))
+    if keep_h and hdone < nz:
+        # строки, взятые из стадии rows, в H_all ещё не попали
+        for s in range(hdone, done, step):
+            e = min(done, s + step)
+            H_all[s:e] = _propagator(a2k2, z_rel[s:e])
+        _STAGES.put("propagator", hkey, (z_rel, H_all))
     return out
 
-if NUMBA:
-    _cpu_fft = nb.njit(_cpu_fft, fastmath=True, cache=True)
 
+# ────────── гармонический (Фурье-ряд) движок ──────────────────────────
+# Для идеальной (бесконечной) решётки поле — ряд Фурье
+#   E(x, z) = Σ c_n e^{2πinx/a} e^{-2πin²z/z_T},
+# поэтому ковёр строго периодичен по z с периодом z_T: считаем один
+# период и раскладываем его по всем z. nslits на результат не влияет.
+
+def _harmonic_coeffs(duty: float, nmax: int, tol: float) -> np.ndarray:
+    """
+    Коэффициенты c_n = duty·sinc(n·duty) для n = 0..N (c_{-n} = c_n).
+    N — наименьшее, при котором отброшенная доля энергии ряда
+    (по Парсевалю Σ|c_n|² = duty) не превышает tol; но не больше nmax.
+    """
+    n = np.arange(nmax + 1)
+    c = duty * np.sinc(n * duty)
+    energy = np.cumsum(np.where(n == 0, 1.0, 2.0) * c * c)
+    ok = np.nonzero(1.0 - energy / duty <= tol)[0]
+    N = int(ok[0]) if ok.size else nmax
+    return c[:N + 1]
 
-def _gpu_fft(a, wl, duty, nslits, xmin, xmax, res, z_rel):
-    import torch
+
+def _harmonic_rows(c, a, x, frac, budget=MEM_BUDGET, cancel=None, progress=None):
+    """
+    Интенсивность для строк с долями периода frac = (n²·z/z_T) mod 1,
+    заданными матрицей (nz, N+1). Ряд свёрнут по ±n в косинусы, так что
+    E = P·C — два вещественных матричных произведения float32.
+    """
+    n = np.arange(c.size)
+    C = np.cos(np.multiply.outer(n, 2 * np.pi / a * x)).astype(np.float32)
+    C[1:] *= 2
+    cw = c.astype(np.float32)
+    nz = frac.shape[0]
+    out = np.empty((nz, x.size), dtype=np.float32)
+    step = _chunk_rows(x.size, budget, 4 + 4 + 4)
+    for s in range(0, nz, step):
+        _tick(cancel, progress, s, nz)
+        ph = (2 * np.pi) * frac[s:s + step]
+        with stage("harmonic_matmul", ph.shape[0] * x.size * 8):
+            Er = (cw * np.cos(ph).astype(np.float32)) @ C
+            Ei = (cw * np.sin(ph).astype(np.float32)) @ C
+        with stage("abs2", Er.nbytes * 2):
+            np.square(Er, out=out[s:s + ph.shape[0]])
+            out[s:s + ph.shape[0]] += np.square(Ei)
+    _tick(cancel, progress, nz, nz)
+    return out
+
+
+def _harmonic(a, wl, duty, xmin, xmax, res, z_rel, tol, budget=MEM_BUDGET,
+              cancel=None, progress=None):
     nx = int((xmax - xmin) * res) + 1
-    dx = (xmax - xmin) / (nx - 1)
-    dev = torch.device("cuda")
-    x = torch.linspace(xmin, xmax, nx, device=dev)
-    half = duty * a / 2
-    m = torch.zeros_like(x, dtype=torch.float32)
-    for i in range(nslits):
-        c = (i - nslits // 2) * a
-        m |= ((x >= c - half) & (x <= c + half)).float()
-
-    A_k = torch.fft.fft(m)
-    k = torch.fft.fftfreq(nx, d=dx, device=dev)
-    k2 = k * k
-    z_T = 2 * a * a / wl
-    z = torch.tensor(z_rel, device=dev).view(-1, 1) * z_T
-    H = torch.exp(-1j * np.pi * wl * z * k2)
-    E = torch.fft.ifft(A_k * H)
-    return torch.abs(E) ** 2.0.cpu().numpy()
-
-
-def talbot_carpet(*, a, wavelength, duty, nslits, x_min, x_max, z_max, res, use_gpu):
-    z_rel = np.linspace(0.01, z_max, int(z_max * res) + 1)
-    if use_gpu and TORCH_OK:
-        return _gpu_fft(a, wavelength, duty, nslits, x_min, x_max, res, z_rel)
-    return _cpu_fft(a, wavelength, duty, nslits, x_min, x_max, res, z_rel)
+    x = np.linspace(xmin, xmax, nx)
+    # гармоники выше Найквиста сетки по x всё равно неразличимы
+    c = _harmonic_coeffs(duty, max(1, int(a * res / 2)), tol)
+    n2 = np.arange(c.size, dtype=np.float64) ** 2
+
+    # ковёр периодичен по z с периодом z_T: строки, совпадающие по z mod 1
+    # (с точностью до округления float, 1e-12), считаются один раз; доля
+    # периода (n²·z) mod 1 — в float64 для каждой z, без привязки к сетке
+    zm = np.remainder(np.asarray(z_rel, dtype=np.float64), 1.0)
+    _, first, inv = np.unique(np.rint(zm * 1e12), return_index=True, return_inverse=True)
+    frac = np.remainder(np.multiply.outer(zm[first], n2), 1.0)
+    rows = _harmonic_rows(c, a, x, frac, budget, cancel, progress)
+    return rows[inv.ravel()]
+
+
+def _fresnel(a, duty, nslits, xmin, xmax, res, z_rel, budget=MEM_BUDGET,
+             cancel=None, progress=None):
+    from fresnel import fresnel_carpet
+    nx = int((xmax - xmin) * res) + 1
+    x = np.linspace(xmin, xmax, nx)
+    # s = √(λz/2) = a·√(z/z_T); U = Σ[F] / √(2i), отсюда множитель 1/2
+    scale = a * np.sqrt(np.asarray(z_rel, dtype=np.float64))
+    return fresnel_carpet(x, scale, c0=-(nslits // 2) * a, pitch=a, nslits=nslits,
+                          width=duty * a, norm=0.5, budget=budget,
+                          cancel=cancel, progress=progress)
+
+
+# ────────── компактный вывод ──────────────────────────────────────────
+# float32 — сырая |E|²; остальные типы нормированы на максимум ковра:
+# float16 — 0…1, целые — 0…iinfo.max
+OUT_DTYPES = ("float32", "float16", "uint16", "uint8")
+# строк z на блок потокового расчёта: float32 живёт только для блока
+STREAM_ROWS = MAX_CHUNK_ROWS
+
+
+class _Normalizer:
+    """
+    Потоковая нормировка на максимум: блоки float32 сразу пишутся в out
+    в масштабе текущего максимума; блок ярче прежних пересчитывает уже
+    записанные строки к новому максимуму (у целых — ошибка не больше
+    половины младшего разряда на пересчёт, а максимум растёт считанные разы).
+    """
+
+    def __init__(self, shape, out_dtype):
+        # последний нормировщик потока — пик ковра для talbot_carpet (_PEAKS)
+        _LOCAL.norm = self
+        self.out = np.zeros(shape, dtype=out_dtype)
+        kind = self.out.dtype
+        self.full = float(np.iinfo(kind).max) if kind.kind == "u" else 1.0
+        self.peak = 0.0
+
+    def _write(self, dst, src, scale):
+        v = src * np.float32(scale)
+        if dst.dtype.kind == "u":
+            np.rint(v, out=v)
+        dst[...] = v
+
+    def _rescale(self, rows: int, ratio: float):
+        with stage("renormalize", rows * self.out[:1].nbytes):
+            for r in range(0, rows, STREAM_ROWS):
+                old = self.out[r:min(rows, r + STREAM_ROWS)]
+                self._write(old, old.astype(np.float32), ratio)
+
+    def seed(self, rows: np.ndarray, peak: float):
+        """Начать с уже нормированных строк (масштаб peak) — префикс из стадии rows."""
+        n = rows.shape[0]
+        self.out[:n] = rows
+        top = float(rows.max()) if rows.size else 0.0
+        # peak мог прийти от строк, которых в префиксе нет: растянуть до полной шкалы
+        self.peak = peak * top / self.full
+        if 0 < top < self.full:
+            self._rescale(n, self.full / top)
+
+    def grow(self, s: int, m: float) -> float:
+        """Поднять максимум до m (строки :s — к новому масштабу); множитель для следующего блока."""
+        if m > self.peak:
+            if self.peak > 0:
+                self._rescale(s, self.peak / m)
+            self.peak = m
+        return self.full / self.peak if self.peak > 0 else 0.0
+
+    def settle(self, bounds, scales):
+        """
+        Блоки out[s:e] (bounds), записанные с множителями scales (full/максимум
+        на момент блока, а он только растёт), — к итоговому множителю
+        scales[-1]: каждая строка пересчитывается один раз.
+        """
+        final = scales[-1] if len(scales) else 0.0
+        self.peak = self.full / final if final else 0.0
+        for (s, e), scale in zip(bounds, scales):
+            if scale and scale != final:
+                with stage("renormalize", (e - s) * self.out[:1].nbytes):
+                    old = self.out[s:e]
+                    self._write(old, old.astype(np.float32), final / scale)
+
+    def put(self, s: int, block: np.ndarray):
+        scale = self.grow(s, float(block.max()) if block.size else 0.0)
+        if scale:
+            with stage("quantize", block.nbytes):
+                self._write(self.out[s:s + block.shape[0]], block, scale)
+
+
+def _compact(arr: np.ndarray, out_dtype: str, peak: float | None = None) -> np.ndarray:
+    """
+    Готовый ковёр float32 в out_dtype (нормировка на максимум); float32 — как есть.
+    peak — общая шкала (максимум всего ковра для окна зума): ярче — насыщение.
+    """
+    if out_dtype == "float32":
+        return arr
+    norm = _Normalizer(arr.shape, out_dtype)
+    if peak:
+        norm.peak = peak
+        arr = np.minimum(arr, np.float32(peak))
+    norm.put(0, arr)
+    return norm.out
+
+
+def _check_out_dtype(out_dtype):
+    if out_dtype not in OUT_DTYPES:
+        raise ValueError(f"unknown out_dtype {out_dtype!r}, expected one of {OUT_DTYPES}")
+
+
+ENGINES = ("fft", "harmonic", "fresnel")
+# первая строка по z (в единицах z_T): z = 0 — сама маска
+Z0 = 0.01
+
+
+def z_grid(z_max: float, res: int) -> np.ndarray:
+    """
+    Строки z/z_T с фиксированным шагом 1/res от Z0 до z_max: при смене
+    z_max общие строки совпадают точно и переиспользуются.
+
+    Это изменение вывода относительно исходного linspace(Z0, z_max,
+    int(z_max·res) + 1): строк round((z_max − Z0)·res) + 1 (при res ≥ 50
+    на одну меньше), последняя — ближайший к z_max узел шага 1/res.
+    """
+    n = int(round((z_max - Z0) * res)) + 1
+    return Z0 + np.arange(max(1, n)) / res
+
+
+def talbot_carpet(*, a, wavelength, duty, nslits, x_min, x_max, z_max, res, use_gpu,
+                  engine="fft", tol=1e-3, pad=False, view=None, shape=None,
+                  out_dtype="float32", cancel=None, progress=None):
+    """
+    Интенсивность ковра Талбота, массив (nz, nx) float32 (или out_dtype).
+    Строки — z_grid(z_max, res): шаг ровно 1/res от Z0, см. там отличие
+    от исходной сетки linspace.
+
+    engine="fft"      — распространение конечной решётки (nslits щелей);
+    engine="harmonic" — ряд Фурье идеальной решётки, усечённый до
+                        относительной ошибки энергии tol;
+    engine="fresnel"  — точная дифракция Френеля на nslits щелях
+                        (без периодизации окна, медленнее FFT).
+
+    pad      — для FFT: конечная решётка без заворота на краях окна
+               (защитная полоса, быстрая длина FFT, обрезка до окна).
+    view     — (x0, x1, z0, z1): считать только это окно просмотра на
+               сетке shape = (nz, nx) пикселей (roi.py); цена — по числу
+               видимых пикселей, а не по res всей области.
+    out_dtype — "float32" (сырая |E|²) или нормированный на максимум
+               компактный тип: "float16" (0…1), "uint16", "uint8".
+    use_gpu  — для FFT: считать на torch (torch_fft.py) — на GPU, если он
+               есть, иначе в пуле потоков torch на CPU.
+
+    cancel  — токен с методом is_set(); проверяется между чанками по z,
+               при отмене бросается Cancelled.
+    progress — колбэк progress(done, total, partial) после каждого чанка.
+    """
+    pkey = (a, duty, nslits, x_min, x_max, z_max, res, engine, tol, pad)
+    if view is not None:
+        from roi import roi_carpet
+        peak = None
+        if out_dtype != "float32":
+            # окно — в шкале всего ковра (как ковёр под ним и цветовая шкала);
+            # пик неизвестен — один раз считается сам ковёр, без прогресса окна
+            peak = _PEAKS.get("carpet", pkey)
+            if peak is None:
+                talbot_carpet(a=a, wavelength=wavelength, duty=duty, nslits=nslits,
+                              x_min=x_min, x_max=x_max, z_max=z_max, res=res, use_gpu=use_gpu,
+                              engine=engine, tol=tol, pad=pad, out_dtype=out_dtype, cancel=cancel)
+                peak = _PEAKS.get("carpet", pkey)
+        return roi_carpet(view, shape, a=a, duty=duty, nslits=nslits, x_min=x_min,
+                          x_max=x_max, res=res, engine=engine, tol=tol, pad=pad,
+                          z_max=z_max, out_dtype=out_dtype, peak=peak,
+                          cancel=cancel, progress=progress)
+    _LOCAL.norm = None
+    out = carpet_rows(z_grid(z_max, res), a=a, wavelength=wavelength, duty=duty,
+                      nslits=nslits, x_min=x_min, x_max=x_max, res=res, use_gpu=use_gpu,
+                      engine=engine, tol=tol, pad=pad, out_dtype=out_dtype,
+                      cancel=cancel, progress=progress)
+    norm, _LOCAL.norm = _LOCAL.norm, None
+    if norm is not None:
+        _PEAKS.put("carpet", pkey, norm.peak)
+    return out
+
+
+def carpet_rows(z_rel, *, a, wavelength, duty, nslits, x_min, x_max, res, use_gpu,
+                engine="fft", tol=1e-3, pad=False, out_dtype="float32",
+                cancel=None, progress=None):
+    """То же, что talbot_carpet, но для произвольных строк z_rel (в единицах z_T)."""
+    if engine not in ENGINES:
+        raise ValueError(f"unknown engine {engine!r}, expected one of {ENGINES}")
+    _check_out_dtype(out_dtype)
+    z_rel = np.asarray(z_rel, dtype=np.float64)
+    if engine == "harmonic":
+        return _streamed(lambda z, p: _harmonic(a, wavelength, duty, x_min, x_max, res, z, tol,
+                                                cancel=cancel, progress=p),
+                         z_rel, out_dtype, cancel, progress)
+    if engine == "fft" and pad and z_rel.size and not _pad_fits(
+            a, duty, nslits, x_min, x_max, res, float(z_rel.max())):
+        # решётка с полосой не влезает в PAD_MAX_N — та же модель без
+        # периодизации, но прямой суммой по щелям
+        warnings.warn("pad: grating plus guard band exceeds PAD_MAX_N, using engine='fresnel'",
+                      RuntimeWarning, stacklevel=2)
+        timing.annotate(pad="fresnel")
+        engine = "fresnel"
+    if engine == "fresnel":
+        return _streamed(lambda z, p: _fresnel(a, duty, nslits, x_min, x_max, res, z,
+                                               cancel=cancel, progress=p),
+                         z_rel, out_dtype, cancel, progress)
+    if use_gpu and torch_ok():
+        from torch_fft import torch_fft
+        return torch_fft(a, duty, nslits, x_min, x_max, res, z_rel, pad,
+                         out_dtype=out_dtype, cancel=cancel, progress=progress)
+    return _cpu_fft(a, wavelength, duty, nslits, x_min, x_max, res, z_rel, pad,
+                    cancel=cancel, progress=progress, out_dtype=out_dtype)
+
+
+def _streamed(rows, z_rel, out_dtype, cancel, progress):
+    """
+    rows(z, progress) → float32; для компактного out_dtype — блоками по
+    STREAM_ROWS строк z: float32 живёт только у блока, ковёр — сразу в out_dtype.
+    """
+    if out_dtype == "float32":
+        return rows(z_rel, progress)
+    nz = z_rel.size
+    norm = None
+    for s in range(0, nz, STREAM_ROWS):
+        e = min(nz, s + STREAM_ROWS)
+
+        def inner(done, total, _partial, s=s, e=e):
+            if progress is not None:
+                progress(s + (e - s) * done // max(1, total), nz, None)
+
+        block = rows(z_rel[s:e], inner)
+        if norm is None:
+            norm = _Normalizer((nz, block.shape[1]), out_dtype)
+        norm.put(s, block)
+        _tick(cancel, progress, e, nz, norm.out)
+    return norm.out if norm is not None else np.zeros((0, 0), dtype=out_dtype)
@@ -0,0 +1,113 @@
+"""
+fresnel.py — точная дифракция Френеля на конечной решётке щелей.
+
+Поле от щели [L, R] в плоскости z — разность интегралов Френеля
+F(u) = C(u) + iS(u) на её краях:  U(x) = Σ_j [F((R_j − x)/s) − F((L_j − x)/s)],
+где s(z) — масштаб Френеля. Края щелей образуют арифметическую решётку
+c_0 + j·p ± w/2, поэтому если период p кратен шагу сетки dx, вклад
+j-й щели в точке x_i — это вклад нулевой щели, сдвинутый на j·p/dx
+отсчётов. Тогда функция края считается один раз на расширенной сетке
+длины nx + (N−1)·p/dx, а сумма по щелям — страйдовой префиксной суммой.
+Иначе — прямое суммирование по (z, x). Если prange-ядра Numba
+(kernels.py) готовы, функция края и прямая сумма считаются ими.
+"""
+
+from __future__ import annotations
+import numpy as np
+from scipy.special import fresnel as _fresnel
+
+from compute import MEM_BUDGET, _chunk_rows, _numba, _tick
+from timing import stage
+
+# байт на отсчёт расширенной сетки: аргумент, C, S, комплексная сумма
+_EXT_BYTES = 8 * 3 + 16 * 2
+
+
+def _edge(u: np.ndarray) -> np.ndarray:
+    s, c = _fresnel(u)
+    return c + 1j * s
+
+
+def _lattice_step(x: np.ndarray, pitch: float) -> int:
+    """
+    p/dx, если сетка x равномерна, период кратен шагу и короче окна; иначе 0.
+    Таблица края длиной nx + (N − 1)·m дешевле прямой суммы N·nx только при
+    m < nx — в узком окне (зум) период шире окна, и сдвиги не окупаются.
+    """
+    if x.size < 2 or pitch <= 0:
+        return 0
+    dx = (x[-1] - x[0]) / (x.size - 1)
+    if not np.allclose(np.diff(x), dx, rtol=1e-6, atol=0):
+        return 0
+    m = pitch / dx
+    mi = int(round(m))
+    return mi if 1 <= mi < x.size and abs(m - mi) <= 1e-6 * m else 0
+
+
+def _rows_lattice(x, s, c0, pitch, nslits, width, m, nbk=None):
+    """Строки с масштабами s (nz,) через сдвиги одной функции края."""
+    nx = x.size
+    dx = (x[-1] - x[0]) / (nx - 1)
+    # y_t = c_0 − x_0 + t·dx, t = −(nx−1) … (N−1)·m
+    L = nx + (nslits - 1) * m
+    y = (c0 - x[0]) + (np.arange(L) - (nx - 1)) * dx
+    if nbk:
+        g = nbk.fresnel_edges(y, s, width)
+    else:
+        inv = 1.0 / s[:, None]
+        g = _edge((y + width / 2) * inv) - _edge((y - width / 2) * inv)
+    # префикс с шагом m: P[q + m] = Σ_{q' ≤ q, q' ≡ q (mod m)} g[q']
+    blocks = -(-L // m) + 1
+    P = np.zeros((s.size, blocks * m), dtype=np.complex128)
+    P[:, m:m + L] = g
+    P = np.cumsum(P.reshape(s.size, blocks, m), axis=1).reshape(s.size, -1)
+    q0 = (nx - 1) - np.arange(nx)
+    return P[:, q0 + nslits * m] - P[:, q0]
+
+
+def _rows_direct(x, s, c0, pitch, nslits, width):
+    """Прямая сумма по щелям, векторизованная по строкам и x."""
+    inv = 1.0 / s[:, None]
+    U = np.zeros((s.size, x.size), dtype=np.complex128)
+    for j in range(nslits):
+        y = c0 + j * pitch - x
+        U += _edge((y + width / 2) * inv) - _edge((y - width / 2) * inv)
+    return U
+
+
+def fresnel_carpet(x, scale, *, c0, pitch, nslits, width, norm=1.0,
+                   budget=MEM_BUDGET, cancel=None, progress=None):
+    """
+    Интенсивность norm·|U|² для всех (z, x), массив (nz, nx) float32.
+
+    x      — координаты наблюдения (равномерная сетка включает быстрый путь);
+    scale  — масштаб Френеля s(z) для каждой строки, аргумент края (edge − x)/s;
+    c0, pitch, nslits, width — центры щелей c0 + j·pitch, их ширина.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    scale = np.atleast_1d(np.asarray(scale, dtype=np.float64))
+    nz, nx = scale.size, x.size
+    m = _lattice_step(x, pitch)
+    if m:
+        row_bytes = _EXT_BYTES * (nx + (nslits - 1) * m) // nx + 1
+    else:
+        row_bytes = _EXT_BYTES
+    out = np.zeros((nz, nx), dtype=np.float32)
+    nbk = _numba()
+    step = _chunk_rows(nx, budget, row_bytes)
+    for a in range(0, nz, step):
+        _tick(cancel, progress, a, nz, out)
+        s = scale[a:a + step]
+        if nbk and not m:
+            with stage("fresnel_edges", s.size * nx * nslits * 32):
+                out[a:a + s.size] = nbk.fresnel_direct(x, s, c0, pitch, nslits, width, norm)
+            continue
+        with stage("fresnel_edges", s.size * nx * 16):
+            if m:
+                U = _rows_lattice(x, s, c0, pitch, nslits, width, m, nbk)
+            else:
+                U = _rows_direct(x, s, c0, pitch, nslits, width)
+        with stage("abs2", U.nbytes):
+            out[a:a + s.size] = norm * (U.real ** 2 + U.imag ** 2)
+    _tick(cancel, progress, nz, nz, out)
+    return out
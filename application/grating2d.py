@@ -0,0 +1,274 @@
+"""
+grating2d.py — эффект Талбота для двумерных решёток: плоскости x–y и объёмы x–y–z.
+
+Маска вещественна, поэтому её спектр — rfft2 (половина по kx). Пропагатор
+H = exp(−iφ), φ = 2π·(z/z_T)·a²(kx² + ky²), чётен по k, и поле распадается
+на две эрмитовы части: E = irfft2(A·cos φ) − i·irfft2(A·sin φ). Обе
+обратные FFT вещественные, а фаза считается только на половине спектра.
+Плоскости z идут пачками под бюджет памяти; объём пишется слоями
+в .npy-memmap и целиком в памяти не живёт.
+
+    python grating2d.py view --kind hex --periods 8 --res 64
+    python grating2d.py build vol_dir --kind square --z-max 1 --z-res 100
+    python grating2d.py view vol_dir
+"""
+
+from __future__ import annotations
+import argparse
+import json
+import math
+import pathlib
+from collections import OrderedDict
+
+import numpy as np
+
+import compute
+from compute import MEM_BUDGET, _chunk_rows, _scipy_fft, _tick, z_grid
+from timing import stage
+
+KINDS = ("square", "circle", "hex", "checker")
+# float64-фаза (полспектра) + 2 complex64 (полспектра) + 2 float32 на пиксель плоскости
+_PLANE_BYTES = 4 + 8 + 8
+_SQRT3 = math.sqrt(3.0)
+
+
+def grid_2d(kind: str, a: float, periods: int, res: int):
+    """
+    Периодическая сетка окна: periods периодов по x, по y — целое число
+    ячеек решётки (для hex ячейка a × a√3), окно близко к квадрату.
+    Возвращает (x, y) без правой границы, шаг по x — a/res.
+    """
+    cell_y = a * _SQRT3 if kind == "hex" else a
+    py = max(1, round(periods * a / cell_y))
+    nx = periods * res
+    ny = max(2, round(py * cell_y / a * res))
+    x = (np.arange(nx) - nx / 2) * (periods * a / nx)
+    y = (np.arange(ny) - ny / 2) * (py * cell_y / ny)
+    return x, y
+
+
+def _dist_lattice(x, y, px, py):
+    """Расстояния по осям до ближайшего узла прямоугольной решётки px × py."""
+    u = (x[None, :] / px + 0.5) % 1.0 - 0.5
+    v = (y[:, None] / py + 0.5) % 1.0 - 0.5
+    return np.abs(u) * px, np.abs(v) * py
+
+
+def mask_2d(kind: str, x: np.ndarray, y: np.ndarray, a: float, duty: float) -> np.ndarray:
+    """
+    Пропускание (ny, nx) float32:
+    square  — квадратные окна со стороной duty·a на квадратной решётке a;
+    circle  — круглые отверстия диаметра duty·a на квадратной решётке;
+    hex     — круглые отверстия диаметра duty·a на гексагональной решётке a;
+    checker — шахматная доска с периодом a (duty не используется).
+    """
+    if kind not in KINDS:
+        raise ValueError(f"unknown grating {kind!r}, expected one of {KINDS}")
+    r = duty * a / 2
+    if kind == "square":
+        dx, dy = _dist_lattice(x, y, a, a)
+        m = (dx <= r) & (dy <= r)
+    elif kind == "circle":
+        dx, dy = _dist_lattice(x, y, a, a)
+        m = dx * dx + dy * dy <= r * r
+    elif kind == "hex":
+        # две прямоугольные подрешётки a × a√3, сдвинутые на (a/2, a√3/2)
+        h = a * _SQRT3
+        dx, dy = _dist_lattice(x, y, a, h)
+        ex, ey = _dist_lattice(x - a / 2, y - h / 2, a, h)
+        m = (dx * dx + dy * dy <= r * r) | (ex * ex + ey * ey <= r * r)
+    else:
+        cx = np.floor(2 * x / a).astype(np.int64)
+        cy = np.floor(2 * y / a).astype(np.int64)
+        m = (cx[None, :] + cy[:, None]) % 2 == 0
+    return m.astype(np.float32)
+
+
+def _spectrum(mask: np.ndarray):
+    fft = _scipy_fft()
+    with stage("rfft2", mask.nbytes):
+        if fft is not None:
+            return fft.rfft2(mask, workers=compute._fft_workers())
+        return np.fft.rfft2(mask).astype(np.complex64)
+
+
+def _irfft2(B: np.ndarray, shape) -> np.ndarray:
+    fft = _scipy_fft()
+    if fft is not None:
+        return fft.irfft2(B, s=shape, overwrite_x=True, workers=compute._fft_workers())
+    return np.fft.irfft2(B, s=shape).astype(np.float32)
+
+
+class Grating2D:
+    """Решётка и её половинный спектр; planes() считает плоскости |E|² для любых z."""
+
+    def __init__(self, kind: str = "square", *, a: float = 1.0, duty: float = 0.3,
+                 periods: int = 8, res: int = 64):
+        self.kind, self.a, self.duty, self.periods, self.res = kind, a, duty, periods, res
+        self.x, self.y = grid_2d(kind, a, periods, res)
+        self.shape = (self.y.size, self.x.size)
+        with stage("mask", self.x.size * self.y.size * 4):
+            mask = mask_2d(kind, self.x, self.y, a, duty)
+        self.A = _spectrum(mask).astype(np.complex64, copy=False)
+        ky = np.fft.fftfreq(self.y.size, d=self.y[1] - self.y[0])
+        kx = np.fft.rfftfreq(self.x.size, d=self.x[1] - self.x[0])
+        self._a2k2 = a * a * (ky[:, None] ** 2 + kx[None, :] ** 2)
+
+    @property
+    def extent(self):
+        """(x0, x1, y0, y1) окна в тех же единицах, что и a."""
+        return (float(self.x[0]), float(self.x[-1]), float(self.y[0]), float(self.y[-1]))
+
+    def meta(self) -> dict:
+        return dict(kind=self.kind, a=self.a, duty=self.duty, periods=self.periods, res=self.res)
+
+    def planes(self, z_rel, *, budget=MEM_BUDGET, cancel=None, progress=None) -> np.ndarray:
+        """Интенсивность (nz, ny, nx) float32 в плоскостях z_rel (в единицах z_T)."""
+        z_rel = np.atleast_1d(np.asarray(z_rel, dtype=np.float64))
+        nz = z_rel.size
+        ny, nx = self.shape
+        out = np.empty((nz, ny, nx), dtype=np.float32)
+        step = _chunk_rows(ny * nx, budget, _PLANE_BYTES)
+        for s in range(0, nz, step):
+            _tick(cancel, progress, s, nz)
+            zc = z_rel[s:s + step]
+            with stage("propagator", zc.size * self.A.nbytes * 2):
+                ph = np.multiply.outer(zc, self._a2k2)
+                np.remainder(ph, 1.0, out=ph)
+                ph = (2 * np.pi * ph).astype(np.float32)
+                B = np.empty((2,) + ph.shape, dtype=np.complex64)
+                np.multiply(self.A, np.cos(ph), out=B[0])
+                np.multiply(self.A, np.sin(ph), out=B[1])
+                del ph
+            with stage("irfft2", B.nbytes):
+                R = _irfft2(B, self.shape)
+            del B
+            with stage("abs2", R.nbytes):
+                np.square(R[0], out=out[s:s + zc.size])
+                out[s:s + zc.size] += np.square(R[1])
+        _tick(cancel, progress, nz, nz)
+        return out
+
+
+# ────────── объём на диске ──────────────────────────────────────────────
+class VolumeStore:
+    """Каталог с volume.npy (nz, ny, nx) float32 и meta.json; только чтение, memmap."""
+
+    def __init__(self, path):
+        self.path = pathlib.Path(path)
+        self.meta = json.loads((self.path / "meta.json").read_text(encoding="utf-8"))
+        self.vol = np.load(self.path / "volume.npy", mmap_mode="r")
+        self.z = np.asarray(self.meta["z"])
+
+    @property
+    def extent(self):
+        return tuple(self.meta["extent"])
+
+    def plane(self, i: int) -> np.ndarray:
+        return np.asarray(self.vol[i])
+
+
+def build_volume(path, z_rel, *, slab: int = 0, budget=MEM_BUDGET, cancel=None,
+                 progress=None, **grating) -> VolumeStore:
+    """
+    Посчитать плоскости z_rel решётки Grating2D(**grating) слоями по slab
+    плоскостей (0 — сколько влезает в budget) прямо в memmap volume.npy.
+    """
+    path = pathlib.Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    g = Grating2D(**grating)
+    z_rel = np.asarray(z_rel, dtype=np.float64)
+    nz = z_rel.size
+    ny, nx = g.shape
+    slab = slab or _chunk_rows(ny * nx, budget, _PLANE_BYTES + 4)
+    vol = np.lib.format.open_memmap(path / "volume.npy", mode="w+", dtype=np.float32,
+                                    shape=(nz, ny, nx))
+    for s in range(0, nz, slab):
+        _tick(cancel, progress, s, nz)
+        vol[s:s + slab] = g.planes(z_rel[s:s + slab], budget=budget, cancel=cancel)
+    _tick(cancel, progress, nz, nz)
+    vol.flush()
+    del vol
+    meta = dict(g.meta(), z=z_rel.tolist(), extent=list(g.extent))
+    (path / "meta.json").write_text(json.dumps(meta, indent=1), encoding="utf-8")
+    return VolumeStore(path)
+
+
+# ────────── источник плоскостей для просмотрщика ─────────────────────────
+class PlaneCache:
+    """
+    Плоскости по индексу z: уже посчитанные отдаются из памяти (LRU в
+    пределах max_bytes), недостающие досчитываются пачкой вокруг
+    запрошенной, так что прокрутка по z не пересчитывает то, что уже есть.
+    """
+
+    def __init__(self, grating: Grating2D, z_rel, *, max_bytes: int = 512 * 2**20, batch: int = 4):
+        self.g = grating
+        self.z = np.asarray(z_rel, dtype=np.float64)
+        self.batch = batch
+        ny, nx = grating.shape
+        self.max_planes = max(batch, max_bytes // (ny * nx * 4))
+        self._d: OrderedDict[int, np.ndarray] = OrderedDict()
+        self.computed = 0
+
+    @property
+    def extent(self):
+        return self.g.extent
+
+    def plane(self, i: int) -> np.ndarray:
+        arr = self._d.get(i)
+        if arr is not None:
+            self._d.move_to_end(i)
+            return arr
+        want = [j for j in range(i, min(self.z.size, i + self.batch)) if j not in self._d]
+        for j, p in zip(want, self.g.planes(self.z[want])):
+            self._d[j] = p
+        self.computed += len(want)
+        self._d.move_to_end(i)
+        while len(self._d) > self.max_planes:
+            self._d.popitem(last=False)
+        return self._d[i]
+
+
+def view_planes(source, title: str = "Talbot 2D"):
+    """Окно: плоскость x–y на FastTalbotCanvas и слайдер по z."""
+    import sys
+    from PyQt6.QtWidgets import QApplication
+    from ui import PlaneViewer
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    w = PlaneViewer(source)
+    w.setWindowTitle(title)
+    w.resize(1000, 900)
+    w.show()
+    app.exec()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Эффект Талбота для двумерных решёток")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build", help="посчитать объём x–y–z в каталог")
+    b.add_argument("store")
+    v = sub.add_parser("view", help="просмотр: каталог объёма или расчёт на лету")
+    v.add_argument("store", nargs="?")
+    for p in (b, v):
+        p.add_argument("--kind", choices=KINDS, default="square")
+        for name, typ, val in (("a", float, 1.0), ("duty", float, 0.3), ("periods", int, 8),
+                               ("res", int, 64), ("z-max", float, 1.0), ("z-res", int, 100)):
+            p.add_argument(f"--{name}", type=typ, default=val)
+    args = ap.parse_args(argv)
+
+    grating = dict(kind=args.kind, a=args.a, duty=args.duty, periods=args.periods, res=args.res)
+    z_rel = z_grid(args.z_max, args.z_res)
+    if args.cmd == "build":
+        build_volume(args.store, z_rel, **grating,
+                     progress=lambda d, t, _p: print(f"\r{d}/{t}", end="", flush=True))
+        print()
+    elif args.store:
+        view_planes(VolumeStore(args.store), f"Talbot 2D — {args.store}")
+    else:
+        view_planes(PlaneCache(Grating2D(**grating), z_rel), f"Talbot 2D — {args.kind}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+"""
+kernels.py — параллельные Numba-ядра (prange) для CPU-движков.
+
+FFT остаётся за scipy.fft; ядра закрывают всё, что вокруг него:
+маску решётки, умножение спектра на пропагатор (без промежуточного
+H(k, z)), |E|², функцию края и прямую сумму Френеля по щелям.
+Интегралы Френеля C(u), S(u) считаются внутри ядра по тем же
+приближениям Cephes, что и scipy.special.fresnel (он в nopython-режиме
+недоступен).
+
+Компиляция кэшируется на диск (cache=True); compute.load_kernels()
+запускает её (в GUI — в фоне), а до готовности ядер движки идут по
+NumPy-пути и первый кадр не ждёт JIT. Рабочая очередь потоков Numba (workqueue)
+не допускает одновременных запусков из разных потоков — только с ней вызовы
+сериализуются; omp и tbb запускаются параллельно, и фоновая предвыборка не
+держит настоящий расчёт.
+"""
+
+from __future__ import annotations
+import contextlib
+import math
+import os
+import threading
+
+import numba as nb
+import numpy as np
+
+# с TBB интерпретатор зависает на выходе, если ядра запускались не из
+# главного потока (а здесь это всегда так) — TBB только в крайнем случае
+if "NUMBA_THREADING_LAYER" not in os.environ:
+    nb.config.THREADING_LAYER_PRIORITY = ["omp", "workqueue", "tbb"]
+
+# замок вокруг запусков — только для workqueue, см. warmup()
+_LOCK = threading.Lock()
+
+_TWO_PI = 2.0 * math.pi
+# ширина блока k в _propagate_steps: состояние H и шаг на блок в кэше L1
+_BLOCK = 512
+_HALF_PI = 0.5 * math.pi
+
+# интегралы Френеля: рациональные приближения Cephes (fresnl.c), как в scipy.special
+_SN = np.array([-2.99181919401019853726E3, 7.08840045257738576863E5, -6.29741486205862506537E7,
+                2.54890880573376359104E9, -4.42979518059697779103E10, 3.18016297876567817986E11])
+_SD = np.array([1.0, 2.81376268889994315696E2, 4.55847810806532581675E4, 5.17343888770096400730E6,
+                4.19320245898111231129E8, 2.24411795645340920940E10, 6.07366389490084639049E11])
+_CN = np.array([-4.98843114573573548651E-8, 9.50428062829859605134E-6, -6.45191435683965050962E-4,
+                1.88843319396703850064E-2, -2.05525900955013891793E-1, 9.99999999999999998822E-1])
+_CD = np.array([3.99982968972495980367E-12, 9.15439215774657478799E-10, 1.25001862479598821474E-7,
+                1.22262789024179030997E-5, 8.68029542941784300606E-4, 4.12142090722199792936E-2,
+                1.00000000000000000118E0])
+_FN = np.array([4.21543555043677546506E-1, 1.43407919780758885261E-1, 1.15220955073585758835E-2,
+                3.45017939782574027900E-4, 4.63613749287867322088E-6, 3.05568983790257605827E-8,
+                1.02304514164907233465E-10, 1.72010743268161828879E-13, 1.34283276233062758925E-16,
+                3.76329711269987889006E-20])
+_FD = np.array([1.0, 7.51586398353378947175E-1, 1.16888925859191382142E-1, 6.44051526508858611005E-3,
+                1.55934409164153020873E-4, 1.84627567348930545870E-6, 1.12699224763999035261E-8,
+                3.60140029589371370404E-11, 5.88754533621578410010E-14, 4.52001434074129701496E-17,
+                1.25443237090011264384E-20])
+_GN = np.array([5.04442073643383265887E-1, 1.97102833525523411709E-1, 1.87648584092575249293E-2,
+                6.84079380915393090172E-4, 1.15138826111884280931E-5, 9.82852443688422223854E-8,
+                4.45344415861750144738E-10, 1.08268041139020870318E-12, 1.37555460633261799868E-15,
+                8.36354435630677421531E-19, 1.86958710162783235106E-22])
+_GD = np.array([1.0, 1.47495759925128324529E0, 3.37748989120019970451E-1, 2.53603741420338795122E-2,
+                8.14679107184306179049E-4, 1.27545075667729118702E-5, 1.04314589657571990585E-7,
+                4.60680728146520428211E-10, 1.10273215066240270757E-12, 1.38796531259578871258E-15,
+                8.39158816283118707363E-19, 1.86958710162783236342E-22])
+
+
+@nb.njit(cache=True, parallel=True)
+def _mask(x, a, duty, nslits, out):
+    half = duty * a / 2
+    span = int(math.ceil(duty / 2)) + 1
+    shift = nslits // 2
+    for t in nb.prange(x.size):
+        i0 = int(round(x[t] / a)) + shift
+        v = 0.0
+        for i in range(max(0, i0 - span), min(nslits, i0 + span + 1)):
+            c = (i - shift) * a
+            if c - half <= x[t] <= c + half:
+                v = 1.0
+                break
+        out[t] = v
+
+
+@nb.njit(cache=True, parallel=True)
+def _propagate(a2k2, z_rel, A_k, E, H):
+    """E = A_k·exp(−2πi·((z·a²k²) mod 1)); если H непуст — туда же пишется сам пропагатор."""
+    keep = H.shape[0] > 0
+    for r in nb.prange(z_rel.size):
+        z = z_rel[r]
+        for j in range(a2k2.size):
+            f = z * a2k2[j]
+            f -= math.floor(f)
+            h = np.complex64(complex(math.cos(_TWO_PI * f), -math.sin(_TWO_PI * f)))
+            if keep:
+                H[r, j] = h
+            E[r, j] = h * A_k[j]
+
+
+@nb.njit(cache=True, parallel=True)
+def _propagate_steps(a2k2, z0, dz, A_k, E):
+    """
+    E[i·L + l] = A_k·H(k, z0[l] + i·dz[l]) для L рядов равномерных по z строк:
+    по две sincos на (l, k), дальше поворот H ← H·exp(−2πi·dz·a²k²) в complex128.
+    """
+    L, n = z0.size, a2k2.size
+    steps = E.shape[0] // L
+    for b in nb.prange((n + _BLOCK - 1) // _BLOCK):
+        j0 = b * _BLOCK
+        j1 = min(n, j0 + _BLOCK)
+        h = np.empty(j1 - j0, dtype=np.complex128)
+        d = np.empty(j1 - j0, dtype=np.complex128)
+        for l in range(L):
+            for j in range(j0, j1):
+                f = z0[l] * a2k2[j]
+                f -= math.floor(f)
+                h[j - j0] = complex(math.cos(_TWO_PI * f), -math.sin(_TWO_PI * f))
+                f = dz[l] * a2k2[j]
+                f -= math.floor(f)
+                d[j - j0] = complex(math.cos(_TWO_PI * f), -math.sin(_TWO_PI * f))
+            for i in range(steps):
+                r = i * L + l
+                for j in range(j0, j1):
+                    E[r, j] = np.complex64(h[j - j0]) * A_k[j]
+                    h[j - j0] *= d[j - j0]
+
+
+@nb.njit(cache=True, parallel=True)
+def _abs2(E, out):
+    for r in nb.prange(E.shape[0]):
+        for j in range(E.shape[1]):
+            v = E[r, j]
+            out[r, j] = v.real * v.real + v.imag * v.imag
+
+
+@nb.njit(cache=True, inline="always")
+def _polevl(x, coef):
+    r = 0.0
+    for v in coef:
+        r = r * x + v
+    return r
+
+
+@nb.njit(cache=True)
+def _fresnel_cs(x):
+    """C(x) + iS(x): ряд Паде при x² < 2.5625, иначе через вспомогательные f, g."""
+    ax = abs(x)
+    x2 = ax * ax
+    if x2 < 2.5625:
+        t = x2 * x2
+        s = ax * x2 * _polevl(t, _SN) / _polevl(t, _SD)
+        c = ax * _polevl(t, _CN) / _polevl(t, _CD)
+    else:
+        t = math.pi * x2
+        u = 1.0 / (t * t)
+        f = 1.0 - u * _polevl(u, _FN) / _polevl(u, _FD)
+        g = _polevl(u, _GN) / _polevl(u, _GD) / t
+        sn = math.sin(_HALF_PI * x2)
+        cs = math.cos(_HALF_PI * x2)
+        t = math.pi * ax
+        c = 0.5 + (f * sn - g * cs) / t
+        s = 0.5 - (f * cs + g * sn) / t
+    if x < 0:
+        return complex(-c, -s)
+    return complex(c, s)
+
+
+@nb.njit(cache=True, parallel=True)
+def _fresnel_edges(y, scale, width, g):
+    """g = F((y + w/2)/s) − F((y − w/2)/s) для всех строк s — функция края решётки."""
+    L = y.size
+    for t in nb.prange(scale.size * L):
+        r = t // L
+        inv = 1.0 / scale[r]
+        v = y[t - r * L]
+        g[r, t - r * L] = _fresnel_cs((v + width / 2) * inv) - _fresnel_cs((v - width / 2) * inv)
+
+
+@nb.njit(cache=True, parallel=True)
+def _fresnel_direct(x, scale, c0, pitch, nslits, width, norm, out):
+    """norm·|Σ_j [F((R_j − x)/s) − F((L_j − x)/s)]|² по всем (z, x)."""
+    nx = x.size
+    for t in nb.prange(scale.size * nx):
+        r = t // nx
+        inv = 1.0 / scale[r]
+        xi = x[t - r * nx]
+        u = 0j
+        for j in range(nslits):
+            y = c0 + j * pitch - xi
+            u += _fresnel_cs((y + width / 2) * inv) - _fresnel_cs((y - width / 2) * inv)
+        out[r, t - r * nx] = norm * (u.real * u.real + u.imag * u.imag)
+
+
+# ────────── обёртки с сериализацией вызовов ──────────────────────────
+def mask_1d(x: np.ndarray, a: float, duty: float, nslits: int) -> np.ndarray:
+    out = np.empty(x.size, dtype=np.float32)
+    with _LOCK:
+        _mask(np.ascontiguousarray(x, dtype=np.float64), float(a), float(duty), int(nslits), out)
+    return out
+
+
+_NO_H = np.empty((0, 0), dtype=np.complex64)
+
+
+def propagate(a2k2, z_rel, A_k, H=None) -> np.ndarray:
+    """Строки A_k·H(k, z) complex64; H (если задан) заполняется пропагатором."""
+    E = np.empty((z_rel.size, a2k2.size), dtype=np.complex64)
+    with _LOCK:
+        _propagate(a2k2, z_rel, A_k, E, _NO_H if H is None else H)
+    return E
+
+
+def propagate_steps(a2k2, z0, dz, steps: int, A_k) -> np.ndarray:
+    """Строки (steps·L, nk) complex64: z-major, i-я строка l-го ряда — z0[l] + i·dz[l]."""
+    z0 = np.ascontiguousarray(z0, dtype=np.float64)
+    E = np.empty((steps * z0.size, a2k2.size), dtype=np.complex64)
+    with _LOCK:
+        _propagate_steps(a2k2, z0, np.ascontiguousarray(dz, dtype=np.float64), A_k, E)
+    return E
+
+
+def abs2(E: np.ndarray, out: np.ndarray) -> np.ndarray:
+    with _LOCK:
+        _abs2(E, out)
+    return out
+
+
+def fresnel_edges(y, scale, width) -> np.ndarray:
+    g = np.empty((scale.size, y.size), dtype=np.complex128)
+    with _LOCK:
+        _fresnel_edges(y, scale, float(width), g)
+    return g
+
+
+def fresnel_direct(x, scale, c0, pitch, nslits, width, norm=1.0) -> np.ndarray:
+    out = np.empty((scale.size, x.size), dtype=np.float32)
+    with _LOCK:
+        _fresnel_direct(x, scale, float(c0), float(pitch), int(nslits), float(width),
+                        float(norm), out)
+    return out
+
+
+def set_threads(n: int) -> int:
+    """Потоков для ядер, запускаемых из текущего потока; возвращает прежнее значение."""
+    prev = nb.get_num_threads()
+    nb.set_num_threads(max(1, min(n, nb.config.NUMBA_NUM_THREADS)))
+    return prev
+
+
+def warmup():
+    """Скомпилировать (или поднять из дискового кэша) все ядра на крошечных входах."""
+    x = np.linspace(-1.0, 1.0, 8)
+    z = np.array([0.1, 0.2])
+    A = np.ones(8, dtype=np.complex64)
+    mask_1d(x, 1.0, 0.5, 2)
+    E = propagate(x * x, z, A, np.empty((2, 8), dtype=np.complex64))
+    propagate_steps(x * x, z, z, 2, A)
+    abs2(E, np.empty(E.shape, dtype=np.float32))
+    abs2(E[:, 1:5], np.empty((2, 4), dtype=np.float32))     # обрезанное окно (pad)
+    buf = np.empty((2, 10), dtype=np.float32)                # зеркальные половины
+    abs2(E[:, :4] * 2, buf[:, 1:5])
+    abs2(E[:, ::-1], buf[:, 1:9])
+    fresnel_edges(x, z, 0.5)
+    fresnel_direct(x, z, 0.0, 1.0, 2, 0.5)
+    global _LOCK
+    if nb.threading_layer() != "workqueue":
+        _LOCK = contextlib.nullcontext()
+
@@ -1,48 +1,132 @@
-# main.py — безопасный запуск вычислительного потока
+# main.py — запуск вычислений через планировщик «побеждает последний»
+import os
 import sys
-from PyQt6.QtWidgets import QApplication, QWidget, QHBoxLayout
+import time
+from PyQt6.QtWidgets import QApplication, QWidget, QHBoxLayout, QVBoxLayout, QStatusBar
 from PyQt6.QtCore import QTimer
-from ui import ControlPanel, TalbotCanvas
-from worker import ComputeThread
+from ui import ControlPanel, TalbotCanvas, FastTalbotCanvas
+from worker import ComputeScheduler, Prefetcher, PREFETCH_STEPS
+from cache import ResultCache
+import compute
+import timing
+
+# каталог для кэша на диске (переживает перезапуск); по умолчанию только память
+CACHE_DIR = os.environ.get("TALBOT_CACHE_DIR")
+# --fast: QImage-холст с LUT вместо matplotlib
+FAST_CANVAS = "--fast" in sys.argv
+# замеры стадий в статус-баре; TALBOT_TRACE — JSONL-трассы, TALBOT_PROFILE — дампы cProfile
+timing.ENABLED = "--no-timing" not in sys.argv
+timing.JSONL_PATH = os.environ.get("TALBOT_TRACE")
+timing.PROFILE_DIR = os.environ.get("TALBOT_PROFILE")
+# --no-prefetch: без спекулятивного расчёта соседних шагов слайдера в простое
+PREFETCH = "--no-prefetch" not in sys.argv
 
 class MainWindow(QWidget):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Talbot Carpet Viewer")
         self.panel = ControlPanel()
-        self.canvas = TalbotCanvas(self.panel)
+        self.canvas = (FastTalbotCanvas if FAST_CANVAS else TalbotCanvas)(self.panel)
 
-        lay = QHBoxLayout(self)
-        lay.addWidget(self.panel)
-        lay.addWidget(self.canvas, 1)
+        row = QHBoxLayout()
+        row.addWidget(self.panel)
+        row.addWidget(self.canvas, 1)
+        self.status = QStatusBar()
+        lay = QVBoxLayout(self)
+        lay.addLayout(row, 1)
+        lay.addWidget(self.status)
 
-        self.thread: ComputeThread | None = None
+        # новые параметры отменяют текущий расчёт; считается только последний запрос
+        self.cache = ResultCache(disk_dir=CACHE_DIR)
+        self.scheduler = ComputeScheduler(self, cache=self.cache)
+        self.scheduler.busy.connect(self.canvas.set_busy)
+        self.scheduler.partial.connect(self._show_result)
+        self.scheduler.finished.connect(self._show_result)
+        self.scheduler.timings.connect(self._on_timings)
+        # в простое считаем соседние шаги последнего слайдера
+        self.prefetch = Prefetcher(self.cache) if PREFETCH else None
+        self.scheduler.busy.connect(self._on_busy)
+        self.canvas.redrawn.connect(self._on_redrawn)
+        # зум/сдвиг холста — пересчёт только видимого окна с плотностью его пикселей
+        self.canvas.viewChanged.connect(self._on_changed)
+        self._job_view = None
 
         # дебаунс 200 мс — не ставим задачи при каждом «микро-движении» слайдера
         self.debounce = QTimer(interval=200, singleShot=True)
         self.debounce.timeout.connect(self._start_compute)
-        self.panel.changed.connect(self.debounce.start)
+        self.panel.changed.connect(self._on_changed)
 
+        self._changed_at = None
+        self._debounce_ms = 0.0
+        self._compute_text = ""
+        self._redraw_ms = 0.0
         self._start_compute()  # первый расчёт
+        # scipy.fft, ядра Numba и torch грузятся в фоне, когда окно уже показано;
+        # до этого кадры идут по пути NumPy
+        QTimer.singleShot(0, compute.warmup_async)
 
-    # ---------- запуск / перезапуск потока ---------------------------
-    def _start_compute(self):
-        # если поток ещё считает — дождёмся окончания
-        if self.thread is not None and self.thread.isRunning():
+    # ---------- постановка расчёта в очередь -------------------------
+    def _params(self) -> dict:
+        """Параметры панели, а при зуме — ещё окно просмотра и его сетка в пикселях."""
+        params = self.panel.params()
+        if self.canvas.view is not None:
+            params.update(view=tuple(self.canvas.view), shape=self.canvas.plot_shape())
+        return params
+
+    def _on_changed(self, *_):
+        if self._changed_at is None:
+            self._changed_at = time.perf_counter()
+        if self.cache.contains(self._params()):
+            # уже посчитано (в том числе предвыборкой) — из кэша без дебаунса
+            self.debounce.stop()
+            self._start_compute()
             return
+        self.debounce.start()
 
-        params = self.panel.params()
-        self.canvas.set_busy(True)
+    def _start_compute(self):
+        if self._changed_at is not None:
+            self._debounce_ms = (time.perf_counter() - self._changed_at) * 1e3
+            self._changed_at = None
+        params = self._params()
+        self._job_view = params.get("view")
+        if self.prefetch is not None:
+            self.prefetch.preempt()
+            self.prefetch.note_request(params)
+        self.scheduler.submit(params)
 
-        self.thread = ComputeThread(params)
-        self.thread.finished.connect(self.canvas.update_image)
-        self.thread.finished.connect(lambda _arr: self.canvas.set_busy(False))
-        self.thread.finished.connect(self._cleanup_thread)
-        self.thread.start()
+    def _show_result(self, arr):
+        self.canvas.update_image(arr, self._job_view)
+
+    def _on_busy(self, busy: bool):
+        if not busy and self.prefetch is not None and not self.debounce.isActive():
+            roi = {k: v for k, v in self._params().items() if k in ("view", "shape")}
+            self.prefetch.schedule([{**p, **roi} for p in self.panel.neighbours(PREFETCH_STEPS)])
+
+    # ---------- статус-бар: разбивка времени последнего кадра ---------
+    def _on_timings(self, summary: dict):
+        self._compute_text = timing.format_summary(summary)
+        self._show_status()
+
+    def _on_redrawn(self, ms: float):
+        self._redraw_ms = ms
+        self._show_status()
+
+    def _show_status(self):
+        if not timing.ENABLED:
+            return
+        text = (f"дебаунс {self._debounce_ms:.0f} мс | {self._compute_text} | "
+                f"отрисовка {self._redraw_ms:.1f} мс")
+        if self.prefetch is not None and self.prefetch.requests:
+            s = self.prefetch.stats()
+            text += (f" | предвыборка {s['hits']}/{s['requests']} ({s['hit_rate']:.0%}),"
+                     f" впустую {s['wasted_cpu_s']:.2f} с CPU")
+        self.status.showMessage(text)
 
-    def _cleanup_thread(self):
-        # поток завершил работу → можно создать новый
-        self.thread = None
+    def closeEvent(self, ev):
+        self.scheduler.shutdown()
+        if self.prefetch is not None:
+            self.prefetch.shutdown()
+        super().closeEvent(ev)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,115 @@
+"""
+nonlinear.py — ковёр Талбота второй гармоники от гауссова пучка.
+
+Поле строки z — ряд Фурье с масштабированным аргументом:
+    E(x, z) = Σ_n b_n e^{-i n² φ(z)} e^{2πi n u(x, z)},
+    φ(z) = π λ w0² z / (a² w(z)²),  u = x w0² / (a w(z)²),
+    w(z) = w0 √(1 + (2z / w0²)²).
+Сумма копится на месте по чанкам строк z в complex64; чанк подбирается
+под бюджет с учётом гармоник и сетки периода, так что пиковая память —
+O(nz·nx) плюс бюджет, независимо от числа гармоник N:
+  method="direct" — степени e^{iθ} по рекурренции, с точным пересевом
+                    фазы каждые HARMONIC_CHUNK гармоник;
+  method="fft"    — ряд строки через обратное FFT на сетке по периоду u
+                    (M ≫ 2N+1 точек) и линейная интерполяция в u.
+"""
+
+from __future__ import annotations
+import numpy as np
+
+from compute import MEM_BUDGET, _chunk_rows, _tick
+
+# через сколько гармоник рекуррентная степень пересчитывается точно
+HARMONIC_CHUNK = 32
+# запас точек периода на гармонику для method="fft"
+FFT_OVERSAMPLE = 32
+# на отсчёт x строки: complex64 — поле, степень, база и два временных;
+# float64 — аргумент; complex128 — exp
+_ROW_BYTES = 8 * 5 + 8 + 16
+# на гармонику строки: float64 фаза, complex128 exp, complex64 множитель
+_HARM_BYTES = 8 + 16 + 8
+# на точку сетки периода (method="fft"): complex64 спектр, ifft и сетка
+_GRID_BYTES = 8 * 3
+
+
+def beam_width(z, w0):
+    return w0 * np.sqrt(1 + (2 * z / w0 ** 2) ** 2)
+
+
+def _grid_points(nb: int) -> int:
+    """Точек сетки периода у method="fft": степень двойки ≥ FFT_OVERSAMPLE·(2N+1)."""
+    return 1 << int(np.ceil(np.log2(FFT_OVERSAMPLE * nb)))
+
+
+def _row_bytes(method: str, nx: int, nb: int) -> int:
+    """Память на строку z: отсчёты x, гармоники и, у fft, сетка периода."""
+    extra = _grid_points(nb) * _GRID_BYTES if method == "fft" else 0
+    return nx * _ROW_BYTES + nb * _HARM_BYTES + extra
+
+
+def _rows_direct(b, n, phi, u):
+    """Поле строк по рекурренции e^{i(n+1)θ} = e^{inθ}·e^{iθ}."""
+    N = (b.size - 1) // 2
+    pz = np.exp(-1j * np.multiply.outer(phi, n.astype(np.float64) ** 2)).astype(np.complex64)
+    E = np.zeros(u.shape, dtype=np.complex64)
+    E += (b[N] * pz[:, N])[:, None]
+    base = np.exp(2j * np.pi * u).astype(np.complex64)
+    cur = base.copy()
+    for k in range(1, N + 1):
+        if k % HARMONIC_CHUNK == 0:
+            cur = np.exp(2j * np.pi * k * u).astype(np.complex64)
+        E += (b[N + k] * pz[:, N + k])[:, None] * cur
+        E += (b[N - k] * pz[:, N - k])[:, None] * np.conj(cur)
+        cur *= base
+    return E
+
+
+def _rows_fft(b, n, phi, u):
+    """Поле строк через ряд на равномерной сетке периода и интерполяцию."""
+    M = _grid_points(b.size)
+    spec = np.zeros((phi.size, M), dtype=np.complex64)
+    spec[:, n % M] = b * np.exp(-1j * np.multiply.outer(phi, n.astype(np.float64) ** 2))
+    g = np.empty((phi.size, M + 1), dtype=np.complex64)
+    g[:, :M] = np.fft.ifft(spec, axis=1)             # g(j/M) = Σ c_n e^{2πinj/M} / M
+    del spec
+    g[:, :M] *= M
+    g[:, M] = g[:, 0]                                # замыкаем период
+    t = np.remainder(u, 1.0) * M
+    j = np.minimum(t.astype(np.intp), M - 1)
+    w = (t - j).astype(np.float32)
+    g0 = np.take_along_axis(g, j, axis=1)
+    g1 = np.take_along_axis(g, j + 1, axis=1)
+    return ((1 - w) * g0 + w * g1).astype(np.complex64)
+
+
+def sh_carpet(x, z, *, a, wavelength, w0, coeffs, method="direct",
+              budget=MEM_BUDGET, cancel=None, progress=None):
+    """
+    Интенсивность |E|² второй гармоники на сетке (z, x), float32 (nz, nx).
+    coeffs — амплитуды b_n для n = −N … N (длина 2N+1).
+    """
+    x = np.asarray(x, dtype=np.float64)
+    z = np.asarray(z, dtype=np.float64)
+    b = np.asarray(coeffs, dtype=np.complex64)
+    if b.size % 2 != 1:
+        raise ValueError("coeffs must have odd length 2N+1")
+    rows = {"direct": _rows_direct, "fft": _rows_fft}.get(method)
+    if rows is None:
+        raise ValueError(f"unknown method {method!r}, expected 'direct' or 'fft'")
+    N = (b.size - 1) // 2
+    n = np.arange(-N, N + 1)
+
+    s = (w0 / beam_width(z, w0)) ** 2            # w0² / w(z)²
+    phi = np.pi * wavelength * z * s / a ** 2
+    out = np.zeros((z.size, x.size), dtype=np.float32)
+    # строка стоит не только отсчётов x: гармоники и сетка периода растут с N
+    step = _chunk_rows(1, budget, _row_bytes(method, x.size, b.size))
+    for i in range(0, z.size, step):
+        _tick(cancel, progress, i, z.size, out)
+        sl = slice(i, i + step)
+        u = np.multiply.outer(s[sl], x / a)
+        E = rows(b, n, phi[sl], u)
+        np.square(E.real, out=out[sl])
+        out[sl] += np.square(E.imag)
+    _tick(cancel, progress, z.size, z.size, out)
+    return out
@@ -0,0 +1,156 @@
+"""
+polychromatic.py — ковёр Талбота широкополосного источника: некогерентная
+сумма Σ_λ w_λ·|E_λ(x, z)|² по дискретному спектру (длины волн + веса).
+
+В параксиальном приближении λ входит только в пропагатор:
+H = exp(−iπλzk²) = exp(−2πi·(z/z_T(λ))·a²k²), а z/z_T(λ) = (z/z_T0)·λ/λ0.
+Поэтому спектр решётки A_k (и геометрия окна) один на все λ, а пары
+(λ, z) — это просто строки с z_eff = z·λ/λ0 в одном пакетном FFT-проходе
+по чанкам бюджета памяти. Строки одной λ равномерны по z, и ядро Numba
+ведёт H поворотом на шаг вместо sincos на каждый отсчёт. |E|² каждого
+чанка сворачивается с весами сразу в итоговый ковёр, а при rgb=True —
+ещё и с цветами λ (CIE 1931 → sRGB).
+
+    python polychromatic.py --center 0.55 --fwhm 0.15 -n 15 --rgb -o carpet.png
+
+z — в единицах z_T средневзвешенной длины волны λ0 (как z/z_T в talbot_carpet).
+"""
+
+from __future__ import annotations
+import argparse
+
+import numpy as np
+
+from compute import (MEM_BUDGET, _chunk_rows, _field_abs2, _fft_setup, _numba, _propagator,
+                     _tick, z_grid)
+from timing import stage
+
+# XYZ → линейный sRGB (D65)
+_XYZ_RGB = np.array([[3.2406, -1.5372, -0.4986],
+                     [-0.9689, 1.8758, 0.0415],
+                     [0.0557, -0.2040, 1.0570]])
+# многолепестковая аппроксимация функций сложения CIE 1931 (Wyman, Sloan, Shirley):
+# (вес, μ, σ слева, σ справа) в нм
+_CIE = (
+    ((1.056, 599.8, 37.9, 31.0), (0.362, 442.0, 16.0, 26.7), (-0.065, 501.1, 20.4, 26.2)),
+    ((0.821, 568.8, 46.9, 40.5), (0.286, 530.9, 16.3, 31.1)),
+    ((1.217, 437.0, 11.8, 36.0), (0.681, 459.0, 26.0, 13.8)),
+)
+
+
+def gaussian_spectrum(center: float, fwhm: float, n: int = 15):
+    """n длин волн в пределах ±FWHM от center с гауссовыми весами (сумма 1)."""
+    if n < 2 or fwhm <= 0:
+        return np.array([float(center)]), np.array([1.0])
+    wl = center + np.linspace(-fwhm, fwhm, n)
+    wl = wl[wl > 0]
+    w = np.exp(-4 * np.log(2) * ((wl - center) / fwhm) ** 2)
+    return wl, w / w.sum()
+
+
+def wavelength_rgb(wl_nm) -> np.ndarray:
+    """Линейный sRGB (может быть < 0 вне охвата) монохроматического света, (n, 3)."""
+    wl_nm = np.atleast_1d(np.asarray(wl_nm, dtype=np.float64))
+    xyz = np.zeros((wl_nm.size, 3))
+    for i, lobes in enumerate(_CIE):
+        for c, mu, s1, s2 in lobes:
+            s = np.where(wl_nm < mu, s1, s2)
+            xyz[:, i] += c * np.exp(-0.5 * ((wl_nm - mu) / s) ** 2)
+    return xyz @ _XYZ_RGB.T
+
+
+def to_srgb8(rgb: np.ndarray, white: float | None = None) -> np.ndarray:
+    """Линейный RGB (…, 3) → 8-битный sRGB: нормировка на white (по умолчанию 99.5-й перцентиль)."""
+    rgb = np.clip(rgb, 0, None)
+    white = white or float(np.percentile(rgb.max(axis=-1), 99.5)) or 1.0
+    v = np.clip(rgb / white, 0, 1)
+    v = np.where(v <= 0.0031308, 12.92 * v, 1.055 * v ** (1 / 2.4) - 0.055)
+    return (v * 255 + 0.5).astype(np.uint8)
+
+
+def polychromatic_carpet(wavelengths, weights=None, *, a, duty, nslits, x_min, x_max,
+                         z_max, res, pad=False, rgb=False, nm_per_unit=1000.0,
+                         budget=MEM_BUDGET, cancel=None, progress=None):
+    """
+    Некогерентный ковёр (nz, nx) float32 на сетке z_grid(z_max, res).
+
+    wavelengths, weights — дискретный спектр (в единицах a; веса нормируются
+                           на сумму 1, по умолчанию равные);
+    rgb                  — вернуть ещё (nz, nx, 3) float32 в линейном sRGB;
+    nm_per_unit          — нм в единице длины (1000: a и λ в мкм), только для rgb.
+    """
+    wl = np.atleast_1d(np.asarray(wavelengths, dtype=np.float64))
+    w = np.ones_like(wl) if weights is None else np.asarray(weights, dtype=np.float64)
+    if wl.shape != w.shape or wl.size == 0 or np.any(wl <= 0) or w.sum() <= 0:
+        raise ValueError("wavelengths and weights must be non-empty, positive and of equal size")
+    w = w / w.sum()
+    ratio = wl / float(np.dot(w, wl))
+    z_rel = z_grid(z_max, res)
+    nz, nl = z_rel.size, wl.size
+
+    geom, off, nx, A_k, a2k2, half = _fft_setup(a, duty, nslits, x_min, x_max, res,
+                                                float(z_rel[-1] * ratio.max()), pad)
+    n = geom[2]
+    out = np.zeros((nz, nx), dtype=np.float32)
+    w32 = w.astype(np.float32)
+    if rgb:
+        colors = (w[:, None] * wavelength_rgb(wl * nm_per_unit)).T.astype(np.float32)
+        out_rgb = np.zeros((nz, nx, 3), dtype=np.float32)
+    nbk = _numba()
+    # строки чанка — все λ для zc значений z подряд (z-major)
+    zc = max(1, _chunk_rows(n, budget) // nl)
+    buf = np.empty((min(zc, nz) * nl, nx), dtype=np.float32)
+    for s in range(0, nz, zc):
+        _tick(cancel, progress, s, nz, out)
+        e = min(nz, s + zc)
+        z_eff = np.multiply.outer(z_rel[s:e], ratio).ravel()
+        with stage("propagator", z_eff.size * A_k.size * 8):
+            if nbk:
+                # строки каждой λ равномерны по z: поворот вместо sincos на отсчёт
+                E = nbk.propagate_steps(a2k2, z_eff[:nl], ratio / res, e - s, A_k)
+            else:
+                E = _propagator(a2k2, z_eff)
+                E *= A_k
+        I = buf[:z_eff.size]
+        _field_abs2(E, n, off, I, nbk, half)
+        I = I.reshape(e - s, nl, nx)
+        with stage("accumulate", I.nbytes):
+            np.matmul(w32, I, out=out[s:e])
+            if rgb:
+                out_rgb[s:e] = np.matmul(colors, I).transpose(0, 2, 1)
+    _tick(cancel, progress, nz, nz, out)
+    return (out, out_rgb) if rgb else out
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Ковёр Талбота для широкополосного источника")
+    ap.add_argument("--center", type=float, default=0.55, help="центр спектра, в единицах a")
+    ap.add_argument("--fwhm", type=float, default=0.15)
+    ap.add_argument("-n", "--samples", type=int, default=15, help="число длин волн")
+    for name, typ, val in (("a", float, 1.0), ("duty", float, 0.2), ("nslits", int, 20),
+                           ("x-min", float, -3.0), ("x-max", float, 3.0),
+                           ("z-max", float, 3.0), ("res", int, 150)):
+        ap.add_argument(f"--{name}", type=typ, default=val)
+    ap.add_argument("--pad", action="store_true")
+    ap.add_argument("--rgb", action="store_true", help="цветной ковёр (a и λ в мкм)")
+    ap.add_argument("-o", "--out", default="polychromatic.png", help=".png или .npy")
+    args = ap.parse_args(argv)
+
+    wl, w = gaussian_spectrum(args.center, args.fwhm, args.samples)
+    result = polychromatic_carpet(wl, w, a=args.a, duty=args.duty, nslits=args.nslits,
+                               x_min=args.x_min, x_max=args.x_max, z_max=args.z_max,
+                               res=args.res, pad=args.pad, rgb=args.rgb)
+    img = result[1] if args.rgb else result
+    if args.out.endswith(".npy"):
+        np.save(args.out, img)
+        return
+    import matplotlib.pyplot as plt
+    if args.rgb:
+        plt.imsave(args.out, to_srgb8(img), origin="lower")
+    else:
+        plt.imsave(args.out, img, cmap="inferno", origin="lower",
+                   vmax=float(np.percentile(img, 99.5)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+roi.py — ковёр в окне просмотра (зум): только видимые x/z на сетке пикселей виджета.
+
+Окно (x0, x1, z0, z1) считается на сетке shape = (nz, nx); строки z — ровно
+видимые, а отсчёты x — в точках окна, без пересчёта всей области:
+  harmonic     — прямая сумма ряда идеальной решётки в точках окна;
+                 гармоник столько, сколько различимо при шаге пикселя;
+  fft          — та же периодическая модель, что у полного FFT (сетка
+                 compute._geometry: окно [x_min, x_max], с pad — вместе с
+                 защитной полосой), но A(k) считается в замкнутой форме в
+                 полосе |k| ≤ 1/(2·шаг пикселя), не шире, чем велит tol, и
+                 сводится в точки окна chirp-z преобразованием (Блюстейн:
+                 свёртка с чирпом через FFT);
+  fresnel      — конечная решётка без заворота: прямая сумма Френеля по
+                 щелям в точках окна (и fft с pad там, где полный ковёр
+                 тоже уходит во Френеля, см. compute._pad_fits).
+Цена — пиксели окна × гармоники (щели); у fft число гармоник — полоса ×
+период сетки, от res и увеличения сверх предела tol не зависит.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+
+import compute
+from compute import (MEM_BUDGET, Z0, _check_out_dtype, _chunk_rows, _compact, _geometry,
+                     _grating_spectrum, _harmonic_coeffs, _harmonic_rows, _next_smooth,
+                     _numba, _pad_fits, _propagator, _scipy_fft, _tick)
+from timing import stage
+
+# complex64: строка спектра, её FFT и чирп-произведение + float64 фаза пропагатора
+_CZT_ROW_BYTES = 3 * 8 + 8
+
+
+def _fft_mod():
+    fft = _scipy_fft()
+    if fft is None:
+        return np.fft, {}
+    return fft, dict(workers=compute._fft_workers(), overwrite_x=True)
+
+
+def _chirp(t: np.ndarray, theta: float) -> np.ndarray:
+    """exp(iπθt²); доля оборота θt²/2 редуцируется в float64 до умножения на 2π."""
+    f = np.remainder(0.5 * theta * t.astype(np.float64) ** 2, 1.0)
+    return np.exp(2j * np.pi * f)
+
+
+class _ChirpZ:
+    """
+    Σ_m U[:, m]·exp(2πi·m·j·θ), j = 0 … nout − 1, для строк U (rows, nm):
+    m·j = (m² + j² − (j − m)²)/2, так что сумма — свёртка U·чирп с чирпом,
+    одна прямая и одна обратная FFT быстрой длины ≥ nm + nout − 1 на строку.
+    Чирпы и спектр ядра считаются один раз на окно.
+    """
+
+    def __init__(self, nm: int, nout: int, theta: float):
+        self.nm, self.nout = nm, nout
+        self.P = P = _next_smooth(nm + nout - 1)
+        fft, kw = _fft_mod()
+        G = np.zeros(P, dtype=np.complex128)
+        G[:nout] = np.conj(_chirp(np.arange(nout), theta))
+        # отрицательные сдвиги j − m = −(nm − 1) … −1 — в хвост циклического буфера
+        if nm > 1:
+            G[P - nm + 1:] = np.conj(_chirp(np.arange(nm - 1, 0, -1), theta))
+        self.Gf = fft.fft(G, **kw).astype(np.complex64)
+        self.pre = _chirp(np.arange(nm), theta).astype(np.complex64)
+        self.post = _chirp(np.arange(nout), theta).astype(np.complex64)
+
+    def __call__(self, U: np.ndarray) -> np.ndarray:
+        fft, kw = _fft_mod()
+        V = np.zeros((U.shape[0], self.P), dtype=np.complex64)
+        np.multiply(U, self.pre, out=V[:, :self.nm])
+        V = fft.fft(V, axis=-1, **kw)
+        V *= self.Gf
+        V = fft.ifft(V, axis=-1, **kw)
+        return V[:, :self.nout] * self.post
+
+
+def _roi_fft(a, duty, nslits, geom, tol, x, z, budget, cancel, progress):
+    # периодическая модель полного движка: сетка geom = (x0, x1, n), период L = n·dx
+    gx0, gx1, n = geom
+    dx = (gx1 - gx0) / (n - 1)
+    L = n * dx
+    step = x[1] - x[0] if x.size > 1 else dx
+    # полоса — до Найквиста пикселя окна, но не дальше, чем нужно для потери
+    # энергии спектра ≤ tol (как усечение ряда у harmonic); шаг сетки dx её
+    # не ограничивает: при сильном зуме полоса шире, чем у полного FFT
+    N = _harmonic_coeffs(duty, max(1, int(a / (2 * step))), tol).size - 1
+    M = max(1, int(np.ceil(N * L / a)))
+    m = np.arange(-M, M + 1)
+    k = m / L
+    with stage("spectrum", k.nbytes * 2):
+        A = _grating_spectrum(k, a, duty, nslits, gx0, gx1, n)
+        # сдвиг к началу окна: e^{2πik(x − x0)} = e^{2πik(x[0] − x0)}·e^{2πi·m·j·θ}
+        A = A * np.exp(2j * np.pi * np.remainder(k * (x[0] - gx0), 1.0)) / n
+        A = A.astype(np.complex64)
+    a2k2 = (a * k) ** 2
+    with stage("czt_plan", 0):
+        czt = _ChirpZ(m.size, x.size, step / L)
+    out = np.empty((z.size, x.size), dtype=np.float32)
+    rows = _chunk_rows(czt.P, budget, _CZT_ROW_BYTES)
+    nbk = _numba()
+    dz = np.array([z[1] - z[0] if z.size > 1 else 0.0])
+    for s in range(0, z.size, rows):
+        _tick(cancel, progress, s, z.size, out)
+        zc = z[s:s + rows]
+        with stage("propagator", zc.size * m.size * 8):
+            if nbk:
+                # строки окна равномерны по z: поворот на шаг вместо sincos на отсчёт
+                E = nbk.propagate_steps(a2k2, zc[:1], dz, zc.size, A)
+            else:
+                E = _propagator(a2k2, zc)
+                E *= A
+        with stage("czt", zc.size * czt.P * 8):
+            E = czt(E)
+        # множитель e^{−2πi·M·j·θ} от сдвига m → m + M по модулю единица — для |E|² не нужен
+        with stage("abs2", E.nbytes):
+            np.square(E.real, out=out[s:s + zc.size])
+            out[s:s + zc.size] += np.square(E.imag)
+    _tick(cancel, progress, z.size, z.size, out)
+    return out
+
+
+def _roi_harmonic(a, duty, tol, x, z, budget, cancel, progress):
+    step = x[1] - x[0] if x.size > 1 else a
+    c = _harmonic_coeffs(duty, max(1, int(a / (2 * step))), tol)
+    n2 = np.arange(c.size, dtype=np.float64) ** 2
+    # строки z произвольные: точная доля периода (n²·z) mod 1 в float64
+    frac = np.remainder(np.multiply.outer(z, n2), 1.0)
+    return _harmonic_rows(c, a, x, frac, budget, cancel, progress)
+
+
+def _roi_fresnel(a, duty, nslits, x, z, budget, cancel, progress):
+    from fresnel import fresnel_carpet
+    # как в compute._fresnel: s = a·√(z/z_T), нормировка 1/2
+    return fresnel_carpet(x, a * np.sqrt(z), c0=-(nslits // 2) * a, pitch=a, nslits=nslits,
+                          width=duty * a, norm=0.5, budget=budget,
+                          cancel=cancel, progress=progress)
+
+
+def roi_carpet(view, shape, *, a, duty, nslits, x_min, x_max, res, engine="fft",
+               tol=1e-3, pad=False, z_max=None, out_dtype="float32", peak=None,
+               budget=MEM_BUDGET, cancel=None, progress=None):
+    """
+    Интенсивность (nz, nx) float32 в окне view = (x0, x1, z0, z1) на сетке
+    shape = (nz, nx): строка i — z = z0 … z1 (не ближе Z0), столбец j —
+    x = x0 … x1. Параметры решётки и движка — как у talbot_carpet; res и
+    z_max (по умолчанию z1) нужны только fft-движку, чтобы сетка и период
+    совпадали с полным ковром — с pad от z_max зависит защитная полоса.
+    Окно размером с экран, так что out_dtype нормируется целиком, без блоков:
+    на peak — максимум всего ковра (talbot_carpet берёт его из _PEAKS), чтобы
+    яркость совпадала с ковром под окном; None — на максимум самого окна.
+    """
+    if engine not in compute.ENGINES:
+        raise ValueError(f"unknown engine {engine!r}, expected one of {compute.ENGINES}")
+    _check_out_dtype(out_dtype)
+    x0, x1, z0, z1 = map(float, view)
+    nz, nx = (max(1, int(v)) for v in shape)
+    if not (x1 > x0 and z1 >= z0):
+        raise ValueError(f"empty view {view!r}")
+    x = np.linspace(x0, x1, nx)
+    z = np.linspace(max(z0, Z0), max(z1, Z0), nz)
+    zt = float(z[-1] if z_max is None else z_max)
+    if engine == "harmonic":
+        out = _roi_harmonic(a, duty, tol, x, z, budget, cancel, progress)
+    elif engine == "fft" and duty < 1 and (
+            not pad or _pad_fits(a, duty, nslits, x_min, x_max, res, zt)):
+        geom = _geometry(a, duty, nslits, x_min, x_max, res, zt, pad)[:3]
+        out = _roi_fft(a, duty, nslits, geom, tol, x, z, budget, cancel, progress)
+    else:
+        out = _roi_fresnel(a, duty, nslits, x, z, budget, cancel, progress)
+    return _compact(out, out_dtype, peak)
@@ -0,0 +1,254 @@
+"""
+tiles.py — ковры вне оперативной памяти: memmap-хранилище и LOD-пирамида.
+
+Хранилище — каталог с meta.json и уровнями level_<L>.npy: уровень 0 —
+полный ковёр (nz, nx) float32, каждый следующий — 2×2 усреднение
+предыдущего. Ковёр считается полосами по z (tile_rows строк), и каждая
+полоса сразу пишется в memmap уровня 0 и, усреднённая, во все уровни
+пирамиды, так что в памяти одновременно живёт только одна полоса.
+Просмотрщик читает только нужный уровень и окно; экспорт PNG/TIFF идёт
+полосами из того же хранилища.
+
+    python tiles.py build store_dir --res 3000 --z-max 6
+    python tiles.py view store_dir
+    python tiles.py png store_dir out.png --level 1
+"""
+
+from __future__ import annotations
+import argparse
+import json
+import pathlib
+import struct
+import zlib
+
+import numpy as np
+
+from compute import carpet_rows, z_grid, _tick
+
+# уровни строятся, пока сторона больше этого размера
+PYRAMID_MIN = 512
+
+
+def _pool2(block: np.ndarray) -> np.ndarray:
+    """2×2 усреднение; нечётный край дополняется повтором последней строки/столбца."""
+    if block.shape[0] % 2:
+        block = np.concatenate([block, block[-1:]], axis=0)
+    if block.shape[1] % 2:
+        block = np.concatenate([block, block[:, -1:]], axis=1)
+    return 0.25 * (block[0::2, 0::2] + block[1::2, 0::2] + block[0::2, 1::2] + block[1::2, 1::2])
+
+
+def _n_levels(nz: int, nx: int) -> int:
+    n = 1
+    while max(-(-nz // 2 ** (n - 1)), -(-nx // 2 ** (n - 1))) > PYRAMID_MIN:
+        n += 1
+    return n
+
+
+class CarpetStore:
+    """Открытое хранилище: meta + memmap всех уровней (только чтение)."""
+
+    def __init__(self, path):
+        self.path = pathlib.Path(path)
+        self.meta = json.loads((self.path / "meta.json").read_text(encoding="utf-8"))
+        self.levels = [np.load(self.path / f"level_{L}.npy", mmap_mode="r")
+                       for L in range(self.meta["levels"])]
+
+    @property
+    def shape(self):
+        return self.levels[0].shape
+
+    @property
+    def extent(self):
+        """(x_min, x_max, z_first, z_last) уровня 0."""
+        m = self.meta
+        return m["x_min"], m["x_max"], m["z0"], m["z0"] + (self.shape[0] - 1) * m["dz"]
+
+    def level_for(self, rows: float, cols: float, h: int, w: int) -> int:
+        """Самый грубый уровень, где на пиксель экрана ещё приходится ≥ 1 отсчёт."""
+        ratio = min(rows / max(1, h), cols / max(1, w))
+        L = int(np.floor(np.log2(ratio))) if ratio >= 1 else 0
+        return max(0, min(L, len(self.levels) - 1))
+
+    def view(self, x0, x1, z0, z1, h, w):
+        """
+        Окно [x0, x1] × [z0, z1] (физические координаты) для экрана h×w:
+        читается только нужный уровень и срез. Возвращает (массив, extent).
+        """
+        X0, X1, Z0, Z1 = self.extent
+        nz, nx = self.shape
+        c0 = int(np.clip(np.floor((x0 - X0) / (X1 - X0) * (nx - 1)), 0, nx - 1))
+        c1 = int(np.clip(np.ceil((x1 - X0) / (X1 - X0) * (nx - 1)), c0, nx - 1)) + 1
+        r0 = int(np.clip(np.floor((z0 - Z0) / max(Z1 - Z0, 1e-12) * (nz - 1)), 0, nz - 1))
+        r1 = int(np.clip(np.ceil((z1 - Z0) / max(Z1 - Z0, 1e-12) * (nz - 1)), r0, nz - 1)) + 1
+        L = self.level_for(r1 - r0, c1 - c0, h, w)
+        f = 2 ** L
+        arr = np.asarray(self.levels[L][r0 // f:-(-r1 // f), c0 // f:-(-c1 // f)])
+        dx = (X1 - X0) / max(nx - 1, 1)
+        dz = self.meta["dz"]
+        ext = (X0 + c0 // f * f * dx, X0 + (-(-c1 // f) * f - 1) * dx,
+               Z0 + r0 // f * f * dz, Z0 + (-(-r1 // f) * f - 1) * dz)
+        return arr, ext
+
+    def bands(self, level: int = 0, rows: int = 256):
+        """Полосы строк уровня level по rows строк (для экспорта)."""
+        lv = self.levels[level]
+        for s in range(0, lv.shape[0], rows):
+            yield np.asarray(lv[s:s + rows])
+
+
+def build_store(path, *, tile_rows: int = 256, cancel=None, progress=None, **params) -> CarpetStore:
+    """
+    Посчитать ковёр talbot_carpet(**params) полосами прямо в memmap-хранилище.
+    tile_rows округляется вверх до кратного 2^(уровни−1), чтобы полосы
+    ровно ложились во все уровни пирамиды.
+    """
+    path = pathlib.Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    params = {k: v for k, v in params.items() if k not in ("cancel", "progress")}
+    z_rel = z_grid(params.pop("z_max"), params["res"])
+    nx = int((params["x_max"] - params["x_min"]) * params["res"]) + 1
+    nz = z_rel.size
+    n_lv = _n_levels(nz, nx)
+    q = 2 ** (n_lv - 1)
+    tile_rows = -(-tile_rows // q) * q
+
+    levels = []
+    for L in range(n_lv):
+        shape = (-(-nz // 2 ** L), -(-nx // 2 ** L))
+        levels.append(np.lib.format.open_memmap(path / f"level_{L}.npy", mode="w+",
+                                                dtype=np.float32, shape=shape))
+    for s in range(0, nz, tile_rows):
+        _tick(cancel, progress, s, nz)
+        block = carpet_rows(z_rel[s:s + tile_rows], **params)
+        for L, lv in enumerate(levels):
+            if L:
+                block = _pool2(block)
+            r = s // 2 ** L
+            lv[r:r + block.shape[0]] = block
+    _tick(cancel, progress, nz, nz)
+    for lv in levels:
+        lv.flush()
+    del levels
+
+    meta = dict(params, z0=float(z_rel[0]), dz=float(z_rel[1] - z_rel[0]) if nz > 1 else 1.0,
+                levels=n_lv, tile_rows=tile_rows)
+    (path / "meta.json").write_text(json.dumps(meta, indent=1), encoding="utf-8")
+    return CarpetStore(path)
+
+
+# ────────── экспорт полосами ──────────────────────────────────────────
+def _lut(cmap: str) -> np.ndarray:
+    import matplotlib
+    return (matplotlib.colormaps[cmap](np.linspace(0, 1, 256))[:, :3] * 255).astype(np.uint8)
+
+
+def _rgb(band: np.ndarray, lut: np.ndarray, vmax: float) -> np.ndarray:
+    idx = np.clip(band * (255.0 / vmax), 0, 255).astype(np.uint8)
+    return lut[idx]
+
+
+def _png_chunk(tag: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+
+
+def export_png(store: CarpetStore, out, *, level: int = 0, cmap: str = "viridis",
+               vmax: float = 1.0, rows: int = 256):
+    """RGB PNG уровня level: полосы → LUT → zlib-поток, без полного изображения в памяти."""
+    lut = _lut(cmap)
+    h, w = store.levels[level].shape
+    z = zlib.compressobj(6)
+    with open(out, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        f.write(_png_chunk(b"IHDR", struct.pack(">IIBBBBB", w, h, 8, 2, 0, 0, 0)))
+        for band in store.bands(level, rows):
+            rgb = _rgb(band, lut, vmax).reshape(band.shape[0], -1)
+            raw = np.concatenate([np.zeros((rgb.shape[0], 1), np.uint8), rgb], axis=1)
+            data = z.compress(raw.tobytes())
+            if data:
+                f.write(_png_chunk(b"IDAT", data))
+        f.write(_png_chunk(b"IDAT", z.flush()))
+        f.write(_png_chunk(b"IEND", b""))
+
+
+def export_tiff(store: CarpetStore, out, *, level: int = 0, cmap: str | None = None,
+                vmax: float = 1.0, tile: int = 256):
+    """
+    Тайловый TIFF (нужен tifffile): float32 как есть или RGB через cmap.
+    Тайлы читаются из memmap по одному.
+    """
+    try:
+        import tifffile
+    except ImportError as e:
+        raise RuntimeError("для TIFF нужен пакет tifffile") from e
+    lv = store.levels[level]
+    h, w = lv.shape
+    lut = _lut(cmap) if cmap else None
+
+    def tiles():
+        for r in range(0, h, tile):
+            for c in range(0, w, tile):
+                t = np.zeros((tile, tile), np.float32)
+                src = lv[r:r + tile, c:c + tile]
+                t[:src.shape[0], :src.shape[1]] = src
+                yield t if lut is None else _rgb(t, lut, vmax)
+
+    shape, dtype = ((h, w), np.float32) if lut is None else ((h, w, 3), np.uint8)
+    tifffile.imwrite(out, tiles(), shape=shape, dtype=dtype, tile=(tile, tile),
+                     photometric="minisblack" if lut is None else "rgb")
+
+
+# ────────── просмотрщик ─────────────────────────────────────────────────
+def view_store(path):
+    """Окно с FastTalbotCanvas: колесо — масштаб, перетаскивание — сдвиг."""
+    import sys
+    from PyQt6.QtWidgets import QApplication
+    from ui import StoreCanvas
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    w = StoreCanvas(CarpetStore(path))
+    w.setWindowTitle(f"Talbot store — {path}")
+    w.resize(1200, 800)
+    w.show()
+    app.exec()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Ковры Талбота вне памяти")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build", help="посчитать ковёр в хранилище")
+    b.add_argument("store")
+    for name, typ, val in (("a", float, 1.0), ("wavelength", float, 1.0), ("duty", float, 0.2),
+                           ("nslits", int, 20), ("x-min", float, -3.0), ("x-max", float, 3.0),
+                           ("z-max", float, 3.0), ("res", int, 1000), ("engine", str, "fft"),
+                           ("tile-rows", int, 256)):
+        b.add_argument(f"--{name}", type=typ, default=val)
+    b.add_argument("--pad", action="store_true", help="FFT без заворота на краях окна")
+    v = sub.add_parser("view", help="открыть хранилище в просмотрщике")
+    v.add_argument("store")
+    for fmt in ("png", "tiff"):
+        e = sub.add_parser(fmt, help=f"экспорт в {fmt.upper()} полосами")
+        e.add_argument("store")
+        e.add_argument("out")
+        e.add_argument("--level", type=int, default=0)
+        e.add_argument("--vmax", type=float, default=1.0)
+    args = ap.parse_args(argv)
+
+    if args.cmd == "build":
+        build_store(args.store, a=args.a, wavelength=args.wavelength, duty=args.duty,
+                    nslits=args.nslits, x_min=args.x_min, x_max=args.x_max, z_max=args.z_max,
+                    res=args.res, use_gpu=False, engine=args.engine, pad=args.pad,
+                    tile_rows=args.tile_rows,
+                    progress=lambda d, t, _p: print(f"\r{d}/{t}", end="", flush=True))
+        print()
+    elif args.cmd == "view":
+        view_store(args.store)
+    elif args.cmd == "png":
+        export_png(CarpetStore(args.store), args.out, level=args.level, vmax=args.vmax)
+    else:
+        export_tiff(CarpetStore(args.store), args.out, level=args.level, vmax=args.vmax,
+                    cmap="viridis")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+timing.py — лёгкая покадровая трассировка стадий расчёта.
+
+    with timing.trace("compute", res=300) as tr:
+        with timing.stage("ifft", E.nbytes):
+            ...
+    tr.summary()  # {"total_ms": …, "stages": {"ifft": {"ms": …, "calls": …, "bytes": …}}}
+
+Трасса привязана к потоку. Без активной трассы stage() возвращает
+общий пустой контекст — на горячем пути это один вызов функции.
+JSONL_PATH — куда дописывать трассы (по строке JSON на расчёт),
+PROFILE_DIR — куда класть дампы cProfile (*.prof) каждого расчёта.
+"""
+
+from __future__ import annotations
+import contextlib
+import cProfile
+import json
+import os
+import pathlib
+import threading
+import time
+
+ENABLED = False
+JSONL_PATH: str | None = None
+PROFILE_DIR: str | None = None
+
+_local = threading.local()
+_NULL = contextlib.nullcontext()
+_write_lock = threading.Lock()
+
+
+class Trace:
+    """Длительности, число вызовов и объём данных по стадиям одного расчёта."""
+
+    def __init__(self, label: str = "", **meta):
+        self.label = label
+        self.meta = meta
+        self.stages: dict[str, list] = {}
+        self.notes: dict[str, str] = {}
+        self.total = 0.0
+
+    def add(self, name: str, seconds: float, nbytes: int = 0):
+        st = self.stages.get(name)
+        if st is None:
+            self.stages[name] = [seconds, 1, nbytes]
+        else:
+            st[0] += seconds
+            st[1] += 1
+            st[2] += nbytes
+
+    def summary(self) -> dict:
+        return dict(
+            label=self.label, meta=self.meta, total_ms=round(self.total * 1e3, 3),
+            stages={k: dict(ms=round(v[0] * 1e3, 3), calls=v[1], bytes=v[2])
+                    for k, v in self.stages.items()},
+            notes=dict(self.notes),
+        )
+
+
+def format_summary(s: dict) -> str:
+    """Короткая строка для статус-бара: «ifft 31.2 · propagator 12.0 · … = 50.3 мс»."""
+    parts = sorted(s["stages"].items(), key=lambda kv: -kv[1]["ms"])
+    body = " · ".join(f"{k} {v['ms']:.1f}" for k, v in parts)
+    text = f"{body} = {s['total_ms']:.1f} мс" if body else f"{s['total_ms']:.1f} мс"
+    notes = " ".join(f"{k} {v}" for k, v in s.get("notes", {}).items())
+    return f"{text} | {notes}" if notes else text
+
+
+class _Stage:
+    __slots__ = ("tr", "name", "nbytes", "t0")
+
+    def __init__(self, tr, name, nbytes):
+        self.tr, self.name, self.nbytes = tr, name, nbytes
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.tr.add(self.name, time.perf_counter() - self.t0, self.nbytes)
+
+
+def stage(name: str, nbytes: int = 0):
+    """Контекст замера стадии; вне трассы — пустой."""
+    tr = getattr(_local, "trace", None)
+    if tr is None:
+        return _NULL
+    return _Stage(tr, name, nbytes)
+
+
+def record(name: str, seconds: float, nbytes: int = 0):
+    """Добавить уже измеренную длительность в текущую трассу (если есть)."""
+    tr = getattr(_local, "trace", None)
+    if tr is not None:
+        tr.add(name, seconds, nbytes)
+
+
+def annotate(**notes):
+    """Пометки к текущей трассе (например, выбранная длина FFT)."""
+    tr = getattr(_local, "trace", None)
+    if tr is not None:
+        tr.notes.update({k: str(v) for k, v in notes.items()})
+
+
+@contextlib.contextmanager
+def trace(label: str = "", **meta):
+    """Активная трасса потока; по выходе — запись в JSONL и дамп профиля."""
+    tr = Trace(label, **meta)
+    prev = getattr(_local, "trace", None)
+    _local.trace = tr
+    prof = cProfile.Profile() if PROFILE_DIR else None
+    t0 = time.perf_counter()
+    if prof is not None:
+        prof.enable()
+    try:
+        yield tr
+    finally:
+        if prof is not None:
+            prof.disable()
+        tr.total = time.perf_counter() - t0
+        _local.trace = prev
+        stamp = time.strftime("%Y%m%d-%H%M%S") + f"-{int(t0 * 1e6) % 10**6:06d}"
+        if prof is not None:
+            pathlib.Path(PROFILE_DIR).mkdir(parents=True, exist_ok=True)
+            prof.dump_stats(os.path.join(PROFILE_DIR, f"{label or 'trace'}-{stamp}.prof"))
+        if JSONL_PATH:
+            line = json.dumps(dict(tr.summary(), time=stamp), ensure_ascii=False, default=str)
+            with _write_lock, open(JSONL_PATH, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
@@ -0,0 +1,164 @@
+"""
+torch_fft.py — FFT-движок на torch: одна и та же программа на GPU (CUDA/ROCm)
+и на CPU (внутрипоточный пул torch), так что её можно мерить и на узлах без GPU.
+
+Геометрия окна, защитная полоса (pad) и спектр A_k — общие с CPU-движком
+(compute._fft_setup, полный спектр без зеркального пути); на устройство
+уходят только A_k и a²k², один раз на геометрию. Строки z идут чанками
+под бюджет памяти, поле — complex64; доля оборота фазы считается в
+float64, как в compute._propagator. |E|² окна, а для компактного
+out_dtype ещё и нормировка на текущий максимум с квантованием, — на
+устройстве: на хост копируется уже итоговый тип. Текущий максимум — тоже
+тензор на устройстве, так что чанки не ждут хоста; множители чанков
+хост читает один раз в конце и приводит ранние чанки к итоговому
+(_Normalizer.settle). На GPU копии идут асинхронно отдельным потоком
+CUDA в закреплённые (pinned) буферы, пока устройство считает следующий.
+
+    TALBOT_TORCH_DEVICE=cpu python benchmarks/bench.py --only fft_torch
+"""
+
+from __future__ import annotations
+import math
+import os
+
+import numpy as np
+import torch
+
+from compute import MEM_BUDGET, _STAGES, _Normalizer, _chunk_rows, _fft_setup, _tick
+from timing import annotate, stage
+
+# устройство: "auto" — CUDA/ROCm, если есть, иначе CPU; либо явно "cpu", "cuda:1", …
+DEVICE = os.environ.get("TALBOT_TORCH_DEVICE", "auto")
+# потоков внутрипоточного пула torch на CPU; 0 — как решит torch (все ядра)
+CPU_THREADS = int(os.environ.get("TALBOT_TORCH_THREADS", "0"))
+# байт на отсчёт чанка — все буферы, через которые он проходит: float64
+# фаза, float32 фаза, единицы для polar, complex64 E, выход ifft, float32
+# |E|² и квадрат мнимой части. Живы одновременно не все, но кэширующий
+# аллокатор CUDA держит освобождённые блоки за собой, и блоки разных
+# размеров друг друга не заменяют — считаем сумму
+_ROW_BYTES = 8 + 4 + 4 + 8 + 8 + 4 + 4
+# чанков в полёте на GPU: пока один копируется на хост, следующий считается
+PIPELINE = 2
+
+# тип, в котором строки едут на хост; биты uint16 — как int16 (torch.uint16
+# поддерживает не все операции)
+_TRANSFER = {"float32": torch.float32, "float16": torch.float16,
+             "uint16": torch.int16, "uint8": torch.uint8}
+
+
+def device() -> torch.device:
+    if DEVICE == "auto":
+        return torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    return torch.device(DEVICE)
+
+
+def _on_device(A_k: np.ndarray, a2k2: np.ndarray, key, dev: torch.device):
+    """A_k и a²k² на устройстве — стадия torch_spectrum, как spectrum у CPU-движка."""
+    key = key + (str(dev),)
+    t = _STAGES.get("torch_spectrum", key)
+    if t is None:
+        with stage("h2d", A_k.nbytes + a2k2.nbytes):
+            t = (torch.from_numpy(A_k).to(dev), torch.from_numpy(a2k2).to(dev))
+        _STAGES.put("torch_spectrum", key, t)
+    return t
+
+
+def _quantize(I: torch.Tensor, scale: torch.Tensor, out_dtype: str) -> torch.Tensor:
+    """Строки |E|² в масштабе scale → тип передачи (как _Normalizer._write, но на устройстве)."""
+    I *= scale
+    if out_dtype in ("uint8", "uint16"):
+        I.round_()
+    if out_dtype == "uint16":
+        # float → int16 вне диапазона не определён, int32 → int16 — по модулю 2¹⁶
+        return I.to(torch.int32).to(torch.int16)
+    return I.to(_TRANSFER[out_dtype])
+
+
+def torch_fft(a, duty, nslits, xmin, xmax, res, z_rel, pad=False, out_dtype="float32",
+              budget=MEM_BUDGET, cancel=None, progress=None):
+    """Ковёр (nz, nx) в out_dtype для строк z_rel (в единицах z_T) — как compute._cpu_fft."""
+    dev = device()
+    if dev.type == "cpu" and CPU_THREADS and torch.get_num_threads() != CPU_THREADS:
+        torch.set_num_threads(CPU_THREADS)
+    z_rel = np.asarray(z_rel, dtype=np.float64)
+    nz = z_rel.size
+    geom, off, nx, A_k, a2k2, _ = _fft_setup(
+        a, duty, nslits, xmin, xmax, res, float(z_rel.max()) if nz else 0.0, pad, mirror=False)
+    n = geom[2]
+    annotate(device=dev)
+    if dev.type == "cpu":
+        annotate(threads=torch.get_num_threads())
+    tA, tk = _on_device(A_k, a2k2, geom + (a, duty, nslits), dev)
+    tz = torch.from_numpy(z_rel).to(dev)
+
+    norm = None if out_dtype == "float32" else _Normalizer((nz, nx), out_dtype)
+    out = np.zeros((nz, nx), dtype=np.float32) if norm is None else norm.out
+    # максимум |E|² на устройстве и множитель full/максимум каждого чанка
+    top = torch.zeros((), dtype=torch.float32, device=dev)
+    bounds, scales = [], []
+    host = out.view(np.int16) if out_dtype == "uint16" else out
+    step = _chunk_rows(n, budget, _ROW_BYTES)
+
+    cuda = dev.type == "cuda"
+    if cuda:
+        copier = torch.cuda.Stream(dev)
+        pinned = [torch.empty((min(step, nz), nx), dtype=_TRANSFER[out_dtype], pin_memory=True)
+                  for _ in range(PIPELINE)]
+        events: list = [None] * PIPELINE
+        pending: list = [None] * PIPELINE    # (s, e) строк, ещё не перенесённых из pinned в out
+
+    def land(slot):
+        if pending[slot] is None:
+            return
+        s0, e0 = pending[slot]
+        with stage("d2h", host[s0:e0].nbytes):
+            events[slot].synchronize()
+            host[s0:e0] = pinned[slot][:e0 - s0].numpy()
+        pending[slot] = None
+
+    for i, s in enumerate(range(0, nz, step)):
+        # частичный out до settle: каждый чанк — в масштабе своего максимума
+        _tick(cancel, progress, s, nz, out)
+        e = min(nz, s + step)
+        with stage("propagator", (e - s) * n * 8):
+            ph = torch.outer(tz[s:e], tk)
+            torch.remainder(ph, 1.0, out=ph)
+            ph = ph.to(torch.float32).mul_(-2 * math.pi)
+            E = torch.polar(torch.ones_like(ph), ph)
+            del ph
+            E *= tA
+        with stage("ifft", E.numel() * 8):
+            E = torch.fft.ifft(E, dim=-1)
+        with stage("abs2", (e - s) * nx * 4):
+            W = E[:, off:off + nx]
+            I = W.real.square()
+            I += W.imag.square()
+            del E, W
+            if norm is not None:
+                top = torch.maximum(top, I.max())
+                scale = torch.where(top > 0, norm.full / top, 0.0)
+                bounds.append((s, e))
+                scales.append(scale)
+                I = _quantize(I, scale, out_dtype)
+        if not cuda:
+            with stage("store", host[s:e].nbytes):
+                torch.from_numpy(host[s:e]).copy_(I)
+            continue
+        slot = i % PIPELINE
+        land(slot)
+        # копия — в своём потоке CUDA после расчёта чанка; устройство тем
+        # временем берётся за следующий
+        copier.wait_stream(torch.cuda.current_stream(dev))
+        with torch.cuda.stream(copier):
+            pinned[slot][:e - s].copy_(I, non_blocking=True)
+            events[slot] = torch.cuda.Event()
+            events[slot].record(copier)
+        I.record_stream(copier)
+        pending[slot] = (s, e)
+    if cuda:
+        for slot in range(PIPELINE):
+            land(slot)
+    if norm is not None and scales:
+        norm.settle(bounds, torch.stack(scales).cpu().tolist())
+    _tick(cancel, progress, nz, nz, out)
+    return out
@@ -1,17 +1,17 @@
 # ui.py — полный интерфейс (PyQt6 + Matplotlib QtAgg)
+# matplotlib импортируется при первой отрисовке, а не при старте окна
 
 import pathlib
-import matplotlib
-matplotlib.use("QtAgg")
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg as Canvas
-from PyQt6.QtCore import Qt, pyqtSignal, QSize
-from PyQt6.QtGui import QMovie, QFont
+import time
+import numpy as np
+from PyQt6.QtCore import Qt, pyqtSignal, QSize, QRect, QRectF
+from PyQt6.QtGui import QMovie, QFont, QImage, QPainter, QColor
 from PyQt6.QtWidgets import (
     QWidget, QSlider, QFormLayout, QCheckBox, QLabel, QVBoxLayout,
     QHBoxLayout, QPushButton, QDoubleSpinBox, QDialog, QDialogButtonBox,
-    QSpacerItem, QSizePolicy, QProgressBar
+    QSpacerItem, QSizePolicy, QProgressBar, QComboBox
 )
+from compute import z_grid
 
 # Константы для масштабирования шрифтов
 BASE_MULT = 20        # базовый размер шрифта (pt)
@@ -136,11 +136,23 @@ class RangeDialog(QDialog):
 
 
 # ────────── ControlPanel ───────────────────────────────────────────────
+# слайдер → (ключ params(), тип значения)
+_SLIDER_PARAMS = {
+    "a": ("a", float), "lam": ("wavelength", float), "duty": ("duty", float),
+    "nslit": ("nslits", int), "res": ("res", int), "zmax": ("z_max", float),
+}
+
+
 class ControlPanel(QWidget):
     """
     Панель с ползунками и кнопками.
     """
     changed = pyqtSignal()
+    # полное окно по x (в единицах a); по z — строки z_grid до слайдера z_max
+    X_MIN, X_MAX = -3.0, 3.0
+    # ковёр нормирован на максимум и сразу в uint8: палитра всё равно 256 цветов,
+    # а память, кэш и предвыборка вчетверо меньше, чем у float32
+    OUT_DTYPE = "uint8"
 
     def __init__(self):
         super().__init__()
@@ -157,11 +169,26 @@ class ControlPanel(QWidget):
         self.res   = LabeledSlider(60, 500, 150, 10, " px/u")
         self.zmax  = LabeledSlider(0.5, 6.0, 3.0, 0.5, " z/zT")
 
-        for sl in (self.a, self.lam, self.duty, self.nslit, self.res, self.zmax):
+        # последний сдвинутый слайдер и направление — для предвыборки соседей
+        self._raw = {}
+        self._last: tuple[str, int] | None = None
+        for name in _SLIDER_PARAMS:
+            sl = getattr(self, name)
+            self._raw[name] = sl.slider.value()
+            sl.valueChanged.connect(lambda v, n=name: self._moved(n, v))
             sl.valueChanged.connect(self.changed.emit)
 
-        self.gpu = QCheckBox("GPU (torch)")
+        self.gpu = QCheckBox("torch (GPU или потоки CPU)")
         self.gpu.stateChanged.connect(self.changed.emit)
+        # конечная решётка: защитная полоса вместо заворота на краях окна
+        self.pad = QCheckBox("Без заворота (паддинг)")
+        self.pad.stateChanged.connect(self.changed.emit)
+
+        # движок расчёта: подпись → имя для compute.talbot_carpet(engine=...)
+        self.engine = QComboBox()
+        for label, name in (("FFT", "fft"), ("Гармоники", "harmonic"), ("Френель (точно)", "fresnel")):
+            self.engine.addItem(label, name)
+        self.engine.currentIndexChanged.connect(self.changed.emit)
 
         btn_plus, btn_minus = QPushButton("A+"), QPushButton("A-")
         btn_plus.clicked.connect(lambda: self._bump_font(+1))
@@ -192,7 +219,9 @@ class ControlPanel(QWidget):
         form.addRow("Щелей", self.nslit)
         form.addRow("Разр-е", self.res)
         form.addRow("Z / zT", self.zmax)
+        form.addRow("Движок", self.engine)
         form.addRow(self.gpu)
+        form.addRow(self.pad)
         self.setLayout(form)
 
     def _bump_font(self, delta: int):
@@ -226,31 +255,151 @@ class ControlPanel(QWidget):
                 getattr(self, attr).set_range(mn, mx, st)
             self.changed.emit()
 
+    def _moved(self, name: str, raw: int):
+        step = raw - self._raw[name]
+        self._raw[name] = raw
+        if step:
+            self._last = (name, 1 if step > 0 else -1)
+
+    def neighbours(self, steps: int = 1) -> list[dict]:
+        """
+        params() для соседних шагов последнего сдвинутого слайдера, ближние
+        первыми и сначала по направлению движения; в пределах диапазона.
+        """
+        if self._last is None:
+            return []
+        name, direction = self._last
+        sl = getattr(self, name)
+        key, typ = _SLIDER_PARAMS[name]
+        base, raw = self.params(), sl.slider.value()
+        out = []
+        for d in range(1, steps + 1):
+            for v in (raw + direction * d, raw - direction * d):
+                if sl.slider.minimum() <= v <= sl.slider.maximum():
+                    out.append({**base, key: typ(v * sl._step)})
+        return out
+
     def params(self) -> dict:
         return dict(
             a=self.a.current(),
             wavelength=self.lam.current(),
             duty=self.duty.current(),
             nslits=int(self.nslit.current()),
-            x_min=-3.0,
-            x_max=3.0,
+            x_min=self.X_MIN,
+            x_max=self.X_MAX,
             z_max=self.zmax.current(),
             res=int(self.res.current()),
             use_gpu=self.gpu.isChecked(),
+            engine=self.engine.currentData(),
+            pad=self.pad.isChecked(),
+            out_dtype=self.OUT_DTYPE,
         )
 
+    def window(self) -> tuple[float, float, float, float]:
+        """Полное окно ковра (x_min, x_max, z₀, z₁): по z — первая и последняя строки z_grid."""
+        z = z_grid(self.zmax.current(), int(self.res.current()))
+        return self.X_MIN, self.X_MAX, float(z[0]), float(z[-1])
+
+
+# ────────── индикатор занятости ────────────────────────────────────────
+def _busy_overlay(parent: QWidget):
+    """spinner.gif поверх parent, а если его нет — бегущий QProgressBar."""
+    gif = pathlib.Path(__file__).with_name("spinner.gif")
+    if gif.exists():
+        overlay = QLabel(parent)
+        mv = QMovie(str(gif))
+        mv.setScaledSize(QSize(SPINNER_PX, SPINNER_PX))
+        overlay.setMovie(mv)
+    else:
+        overlay = QProgressBar(parent, maximum=0, textVisible=False)
+        overlay.setFixedHeight(4)
+        mv = None
+    overlay.hide()
+    return overlay, mv
+
+
+# ────────── зум и сдвиг окна просмотра ─────────────────────────────────
+# окно не сужается больше, чем до этой доли полного
+MIN_VIEW_FRAC = 1e-5
+
+
+def _fit_view(view, bounds, prev):
+    """view, если оно не слишком узкое (иначе prev); None — если покрывает всё bounds."""
+    x0, x1, z0, z1 = view
+    X0, X1, Z0, Z1 = bounds
+    if x1 - x0 < MIN_VIEW_FRAC * (X1 - X0) or z1 - z0 < MIN_VIEW_FRAC * (Z1 - Z0):
+        return prev
+    if x0 <= X0 and x1 >= X1 and z0 <= Z0 and z1 >= Z1:
+        return None
+    return view
+
+
+def _zoom_view(view, bounds, cx, cz, k):
+    """Окно view, масштабированное в k раз вокруг (cx, cz) в пределах bounds."""
+    x0, x1, z0, z1 = view
+    X0, X1, Z0, Z1 = bounds
+    return _fit_view((max(X0, cx + (x0 - cx) * k), min(X1, cx + (x1 - cx) * k),
+                      max(Z0, cz + (z0 - cz) * k), min(Z1, cz + (z1 - cz) * k)), bounds, view)
+
+
+def _pan_view(view, bounds, dx, dz):
+    """Окно view, сдвинутое перетаскиванием на (dx, dz), не выходя за bounds."""
+    x0, x1, z0, z1 = view
+    X0, X1, Z0, Z1 = bounds
+    dx = min(max(dx, x1 - X1), x0 - X0)
+    dz = min(max(dz, z1 - Z1), z0 - Z0)
+    return _fit_view((x0 - dx, x1 - dx, z0 - dz, z1 - dz), bounds, view)
+
+
+def _relative(arr) -> np.ndarray:
+    """Нормированный целочисленный ковёр → float32 0…1; float — как есть."""
+    arr = np.asarray(arr)
+    if arr.dtype.kind == "u":
+        return arr.astype(np.float32) / np.iinfo(arr.dtype).max
+    return arr
+
 
 # ────────── TalbotCanvas ───────────────────────────────────────────────
 class TalbotCanvas(QWidget):
     """
     Canvas с постоянной цветовой шкалой 0–1 и крупными подписями.
     Цветовая шкала прижата к правому краю, оси занимают оставшуюся область.
+    redrawn — время от update_image до завершения отрисовки (мс).
+    Фигура matplotlib создаётся при первом кадре: окно показывается
+    без ожидания импорта matplotlib.
+
+    Колесо мыши — масштаб вокруг курсора, перетаскивание — сдвиг, двойной
+    щелчок — всё окно. Новое окно просмотра уходит в viewChanged (None —
+    полное окно панели); пока его пересчёт не пришёл, виден растянутый
+    полный ковёр, а пришедший поверх него ложится отдельным слоем.
     """
+    redrawn = pyqtSignal(float)
+    viewChanged = pyqtSignal(object)
 
     def __init__(self, ctrl: ControlPanel):
         super().__init__()
         self.ctrl = ctrl
-        self.fig = plt.Figure()
+        self.fig = None
+        self.canvas = None
+        self.im = None
+        self.roi_im = None
+        self.cbar = None
+        self.view = None          # (x0, x1, z0, z1) окна зума; None — всё окно
+        self._drag = None
+        self._t_update = None
+
+        self.overlay, self._movie = _busy_overlay(self)
+
+        self._lay = QVBoxLayout(self)
+        self._lay.setContentsMargins(0, 0, 0, 0)
+
+    def _build_figure(self):
+        import matplotlib
+        matplotlib.use("QtAgg")
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg as Canvas
+
+        self.fig = Figure()
         # Разбиваем фигуру: оставляем место справа для colorbar
         self.ax = self.fig.add_axes([0.10, 0.1, 0.78, 0.85])  # [left, bottom, width, height]
         size = BASE_MULT * GRAPH_FONT_SCALE
@@ -262,29 +411,18 @@ class TalbotCanvas(QWidget):
         self.cax = self.fig.add_axes([0.89, 0.1, 0.03, 0.85])
 
         self.canvas = Canvas(self.fig)
-        self.im = None
-        self.cbar = None
-
-        gif = pathlib.Path(__file__).with_name("spinner.gif")
-        if gif.exists():
-            self.overlay = QLabel(self.canvas)
-            mv = QMovie(str(gif))
-            mv.setScaledSize(QSize(SPINNER_PX, SPINNER_PX))
-            self.overlay.setMovie(mv)
-            self._movie = mv
-        else:
-            self.overlay = QProgressBar(self.canvas, maximum=0, textVisible=False)
-            self.overlay.setFixedHeight(4)
-            self._movie = None
-        self.overlay.hide()
-
-        lay = QVBoxLayout(self)
-        lay.setContentsMargins(0, 0, 0, 0)
-        lay.addWidget(self.canvas)
+        self.canvas.mpl_connect("draw_event", self._on_draw)
+        self.canvas.mpl_connect("scroll_event", self._on_scroll)
+        self.canvas.mpl_connect("button_press_event", self._on_press)
+        self.canvas.mpl_connect("motion_notify_event", self._on_motion)
+        self.canvas.mpl_connect("button_release_event", self._on_release)
+        self.canvas.mpl_connect("resize_event", self._on_resize)
+        self._lay.addWidget(self.canvas)
+        self.overlay.raise_()
 
     def resizeEvent(self, ev):
         super().resizeEvent(ev)
-        self.overlay.resize(self.canvas.size())
+        self.overlay.resize(self.size())
 
     def set_busy(self, flag: bool):
         self.overlay.setVisible(flag)
@@ -294,8 +432,81 @@ class TalbotCanvas(QWidget):
             else:
                 self._movie.stop()
 
-    def update_image(self, arr):
-        zmax = self.ctrl.zmax.current()
+    def _on_draw(self, _ev):
+        if self._t_update is not None:
+            self.redrawn.emit((time.perf_counter() - self._t_update) * 1e3)
+            self._t_update = None
+
+    def plot_shape(self) -> tuple[int, int]:
+        """Размер области осей в пикселях экрана (nz, nx)."""
+        if self.fig is None:
+            return self.height(), self.width()
+        box = self.ax.get_window_extent()
+        return max(1, int(box.height)), max(1, int(box.width))
+
+    def _view_extent(self):
+        return self.view or self.ctrl.window()
+
+    def _set_view(self, view):
+        self.view = view
+        if self.fig is not None:
+            x0, x1, z0, z1 = self._view_extent()
+            self.ax.set_xlim(x0, x1)
+            self.ax.set_ylim(z1, z0)
+            if view is None and self.roi_im is not None:
+                self.roi_im.set_visible(False)
+            self.canvas.draw_idle()
+        self.viewChanged.emit(view)
+
+    def _on_scroll(self, ev):
+        if ev.inaxes is not self.ax:
+            return
+        k = 0.8 if ev.button == "up" else 1.25
+        view = _zoom_view(self._view_extent(), self.ctrl.window(), ev.xdata, ev.ydata, k)
+        if view != self.view:
+            self._set_view(view)
+
+    def _on_press(self, ev):
+        if ev.inaxes is not self.ax:
+            return
+        if ev.dblclick:
+            self._drag = None
+            self._set_view(None)
+        else:
+            self._drag = (ev.x, ev.y, self._view_extent())
+
+    def _on_motion(self, ev):
+        if self._drag is None or ev.x is None:
+            return
+        sx, sy, (x0, x1, z0, z1) = self._drag
+        box = self.ax.get_window_extent()
+        # ось z направлена вниз, а y экрана matplotlib — вверх
+        dx = (ev.x - sx) / max(1.0, box.width) * (x1 - x0)
+        dz = (sy - ev.y) / max(1.0, box.height) * (z1 - z0)
+        view = _pan_view((x0, x1, z0, z1), self.ctrl.window(), dx, dz)
+        if view != self.view:
+            self._set_view(view)
+
+    def _on_release(self, _ev):
+        self._drag = None
+
+    def _on_resize(self, _ev):
+        # другая плотность пикселей — окно зума пересчитывается под неё
+        if self.view is not None:
+            self.viewChanged.emit(self.view)
+
+    def update_image(self, arr, extent=None):
+        """extent — окно зума (x0, x1, z0, z1), если arr посчитан только для него."""
+        self._t_update = time.perf_counter()
+        if self.fig is None:
+            self._build_figure()
+        arr = _relative(arr)
+        if extent is not None:
+            self._update_roi(arr, extent)
+            return
+        x0, x1, z0, z1 = self.ctrl.window()
+        if self.roi_im is not None:
+            self.roi_im.set_visible(False)
         if self.im is None:
             size = BASE_MULT * GRAPH_FONT_SCALE
             # отрисовываем данные на ax
@@ -305,13 +516,376 @@ class TalbotCanvas(QWidget):
                 aspect="auto",
                 vmin=0,
                 vmax=1,
-                extent=[-3, 3, zmax, 0],
+                extent=[x0, x1, z1, z0],
             )
             # создаём colorbar на заранее определённой оси cax
             self.cbar = self.fig.colorbar(self.im, cax=self.cax, orientation="vertical")
-            self.cbar.set_label("Интенсивность (0–1)", fontsize=size)
+            self.cbar.set_label("Интенсивность / максимум", fontsize=size)
             self.cbar.ax.tick_params(labelsize=size)
         else:
             self.im.set_data(arr)
-            self.im.set_extent([-3, 3, zmax, 0])
+            self.im.set_extent([x0, x1, z1, z0])
+        self._apply_limits()
+
+    def _update_roi(self, arr, extent):
+        x0, x1, z0, z1 = extent
+        if self.roi_im is None:
+            self.roi_im = self.ax.imshow(arr, cmap="viridis", aspect="auto", vmin=0, vmax=1,
+                                         extent=[x0, x1, z1, z0])
+        else:
+            self.roi_im.set_data(arr)
+            self.roi_im.set_extent([x0, x1, z1, z0])
+        self.roi_im.set_visible(True)
+        self._apply_limits()
+
+    def _apply_limits(self):
+        # imshow и set_extent автоматически подгоняют пределы осей под картинку
+        x0, x1, z0, z1 = self._view_extent()
+        self.ax.set_xlim(x0, x1)
+        self.ax.set_ylim(z1, z0)
         self.canvas.draw_idle()
+
+
+# ────────── FastTalbotCanvas ───────────────────────────────────────────
+def _colormap_lut(name: str = "viridis") -> np.ndarray:
+    """256 цветов colormap в формате 0xFFRRGGBB (QImage.Format_RGB32)."""
+    import matplotlib
+    rgb = (matplotlib.colormaps[name](np.linspace(0, 1, 256))[:, :3] * 255).astype(np.uint32)
+    return 0xFF000000 | (rgb[:, 0] << 16) | (rgb[:, 1] << 8) | rgb[:, 2]
+
+
+def _pool(arr: np.ndarray, h: int, w: int, mode: str = "max") -> np.ndarray:
+    """
+    Уменьшить arr блочным max/mean-пулингом так, чтобы он был не больше h×w.
+    Неполные блоки у нижнего и правого края сводятся отдельно, своим
+    размером, — ни одна строка не теряется и картинка не съезжает
+    относительно extent. Увеличение не делается — растягивает уже QPainter.
+    """
+    fz = max(1, -(-arr.shape[0] // max(1, h)))
+    fx = max(1, -(-arr.shape[1] // max(1, w)))
+    if fz == fx == 1:
+        return arr
+    (Z, X), bz, bx = arr.shape, arr.shape[0] // fz, arr.shape[1] // fx
+    out = np.empty((-(-Z // fz), -(-X // fx)), dtype=arr.dtype)
+    # (срез входа, строка/столбец выхода, размер блока): целые блоки и остаток
+    rows = [(slice(0, bz * fz), slice(0, bz), fz), (slice(bz * fz, Z), slice(bz, bz + 1), Z - bz * fz)]
+    cols = [(slice(0, bx * fx), slice(0, bx), fx), (slice(bx * fx, X), slice(bx, bx + 1), X - bx * fx)]
+    for ri, ro, f in rows:
+        for ci, co, g in cols:
+            part = arr[ri, ci]
+            if part.size == 0:
+                continue
+            blocks = part.reshape(part.shape[0] // f, f, part.shape[1] // g, g)
+            out[ro, co] = blocks.max(axis=(1, 3)) if mode == "max" else blocks.mean(axis=(1, 3))
+    return out
+
+
+class FastTalbotCanvas(QWidget):
+    """
+    Быстрая альтернатива TalbotCanvas без matplotlib на горячем пути:
+    массив пулингом сводится к размеру виджета в пикселях, переводится
+    в uint8 и через 256-цветную LUT в RGB32, буфер оборачивается в QImage
+    без копирования и выводится QPainter-ом. Оси, подписи и цветовая шкала
+    рисуются поверх тем же QPainter. Время перерисовки — в redrawn (мс).
+
+    С панелью ctrl холст масштабируется, как TalbotCanvas: колесо,
+    перетаскивание, двойной щелчок, окно — в view и viewChanged. Массив
+    окна зума (update_image с extent) рисуется поверх полного.
+    """
+    redrawn = pyqtSignal(float)
+    viewChanged = pyqtSignal(object)
+
+    MARGIN_L, MARGIN_R, MARGIN_T, MARGIN_B = 90, 110, 20, 70
+    N_TICKS = 7
+    XLABEL, YLABEL = "x/a", "z/zT"
+
+    def __init__(self, ctrl: ControlPanel | None, cmap: str = "viridis", pool: str = "max"):
+        super().__init__()
+        self.ctrl = ctrl
+        # (x0, x1, z0, z1) данных _arr; None — окно панели ctrl
+        self.extent = None
+        # окно просмотра (зум); None — всё окно данных
+        self.view = None
+        self.zoomable = ctrl is not None
+        self.pool = pool
+        self.vmin, self.vmax = 0.0, 1.0
+        self._lut = _colormap_lut(cmap)
+        self._arr = None
+        self._img = None          # (буфер, QImage): QImage смотрит в память буфера
+        self._roi = None          # (массив, окно) пересчёта окна зума
+        self._roi_img = None
+        self._drag = None
+        self._bar = None
+        self.last_redraw_ms = 0.0
+        self.setMinimumSize(300, 200)
+        font = QFont()
+        font.setPointSize(int(BASE_MULT * 0.75))
+        self.setFont(font)
+        self.overlay, self._movie = _busy_overlay(self)
+
+    def resizeEvent(self, ev):
+        super().resizeEvent(ev)
+        self.overlay.resize(self.size())
+        self._render()
+        if self.zoomable and self.view is not None:
+            self.viewChanged.emit(self.view)
+
+    def set_busy(self, flag: bool):
+        self.overlay.setVisible(flag)
+        if self._movie:
+            if flag:
+                self._movie.start()
+            else:
+                self._movie.stop()
+
+    def plot_shape(self) -> tuple[int, int]:
+        """Размер области графика в пикселях (nz, nx)."""
+        r = self._plot_rect()
+        return r.height(), r.width()
+
+    def _plot_rect(self) -> QRect:
+        return QRect(self.MARGIN_L, self.MARGIN_T,
+                     max(1, self.width() - self.MARGIN_L - self.MARGIN_R),
+                     max(1, self.height() - self.MARGIN_T - self.MARGIN_B))
+
+    def _to_image(self, arr: np.ndarray):
+        if arr.dtype == np.uint8 and (self.vmin, self.vmax) == (0.0, 1.0):
+            idx = arr                 # нормированный uint8 — уже индексы LUT
+        else:
+            # целые типы — доли максимума, шкала vmin…vmax в тех же долях
+            full = float(np.iinfo(arr.dtype).max) if arr.dtype.kind == "u" else 1.0
+            scale = 255.0 / max(self.vmax - self.vmin, 1e-12)
+            idx = np.clip((arr / full - self.vmin) * scale, 0, 255).astype(np.uint8)
+        buf = np.ascontiguousarray(self._lut[idx])
+        h, w = buf.shape
+        return buf, QImage(buf.data, w, h, 4 * w, QImage.Format.Format_RGB32)
+
+    def _render(self):
+        if self._arr is None and self._roi is None:
+            return
+        t0 = time.perf_counter()
+        r = self._plot_rect()
+        if self._arr is not None:
+            # полный ковёр — под размер всего окна, при зуме растягивается
+            self._img = self._to_image(_pool(self._arr, r.height(), r.width(), self.pool))
+        if self._roi is not None:
+            self._roi_img = self._to_image(_pool(self._roi[0], r.height(), r.width(), self.pool))
+        self.update()
+        self.last_redraw_ms = (time.perf_counter() - t0) * 1e3
+
+    def update_image(self, arr, extent=None):
+        """extent — окно зума (x0, x1, z0, z1), если arr посчитан только для него."""
+        if extent is None:
+            self._arr = np.asarray(arr)
+            self._roi = self._roi_img = None
+        else:
+            self._roi = (np.asarray(arr), tuple(extent))
+        self._render()
+
+    def _target(self, r: QRect, extent) -> QRectF:
+        """Прямоугольник на экране, куда ложатся данные extent при текущем окне."""
+        x0, x1, z0, z1 = self._view_extent()
+        e0, e1, f0, f1 = extent
+        sx, sz = r.width() / (x1 - x0), r.height() / max(z1 - z0, 1e-12)
+        return QRectF(r.left() + (e0 - x0) * sx, r.top() + (f0 - z0) * sz,
+                      (e1 - e0) * sx, (f1 - f0) * sz)
+
+    def paintEvent(self, ev):
+        t0 = time.perf_counter()
+        p = QPainter(self)
+        p.fillRect(self.rect(), QColor("white"))
+        r = self._plot_rect()
+        p.setClipRect(r)
+        if self._img is not None:
+            p.drawImage(self._target(r, self._data_extent()), self._img[1])
+        if self._roi_img is not None:
+            p.drawImage(self._target(r, self._roi[1]), self._roi_img[1])
+        p.setClipping(False)
+        self._draw_axes(p, r)
+        self._draw_colorbar(p, r)
+        p.end()
+        ms = self.last_redraw_ms + (time.perf_counter() - t0) * 1e3
+        self.redrawn.emit(ms)
+
+    def _data_extent(self):
+        if self.extent is not None:
+            return self.extent
+        return self.ctrl.window()
+
+    def _bounds(self):
+        """Пределы, в которых двигается окно зума."""
+        return self._data_extent()
+
+    def _view_extent(self):
+        return self.view or self._bounds()
+
+    # ---------- зум и сдвиг ----------------------------------------------
+    def _set_view(self, view):
+        if view == self.view:
+            return
+        self.view = view
+        if view is None:
+            self._roi = self._roi_img = None
+        self._view_moved()
+
+    def _view_moved(self):
+        self.update()
+        self.viewChanged.emit(self.view)
+
+    def _to_data(self, pos):
+        r = self._plot_rect()
+        x0, x1, z0, z1 = self._view_extent()
+        tx = (pos.x() - r.left()) / max(1, r.width())
+        tz = (pos.y() - r.top()) / max(1, r.height())
+        return x0 + tx * (x1 - x0), z0 + tz * (z1 - z0)
+
+    def wheelEvent(self, ev):
+        if not self.zoomable:
+            return super().wheelEvent(ev)
+        k = 0.8 if ev.angleDelta().y() > 0 else 1.25
+        cx, cz = self._to_data(ev.position())
+        self._set_view(_zoom_view(self._view_extent(), self._bounds(), cx, cz, k))
+
+    def mousePressEvent(self, ev):
+        if not self.zoomable:
+            return super().mousePressEvent(ev)
+        self._drag = (ev.position(), self._view_extent())
+
+    def mouseMoveEvent(self, ev):
+        if self._drag is None:
+            return super().mouseMoveEvent(ev)
+        start, (x0, x1, z0, z1) = self._drag
+        r = self._plot_rect()
+        dx = (ev.position().x() - start.x()) / max(1, r.width()) * (x1 - x0)
+        dz = (ev.position().y() - start.y()) / max(1, r.height()) * (z1 - z0)
+        self._set_view(_pan_view((x0, x1, z0, z1), self._bounds(), dx, dz))
+
+    def mouseReleaseEvent(self, ev):
+        self._drag = None
+
+    def mouseDoubleClickEvent(self, ev):
+        if not self.zoomable:
+            return super().mouseDoubleClickEvent(ev)
+        self._drag = None
+        self._set_view(None)
+
+    def _draw_axes(self, p: QPainter, r: QRect):
+        x0, x1, z0, z1 = self._view_extent()
+        p.setPen(QColor("black"))
+        p.drawRect(r)
+        fm = p.fontMetrics()
+        for i in range(self.N_TICKS):
+            t = i / (self.N_TICKS - 1)
+            xv, zv = x0 + (x1 - x0) * t, z0 + (z1 - z0) * t
+            px = r.left() + int(t * r.width())
+            pz = r.top() + int(t * r.height())
+            p.drawLine(px, r.bottom(), px, r.bottom() + 5)
+            p.drawLine(r.left() - 5, pz, r.left(), pz)
+            lx, lz = f"{xv:.3g}", f"{zv:.3g}"
+            p.drawText(px - fm.horizontalAdvance(lx) // 2, r.bottom() + 8 + fm.ascent(), lx)
+            p.drawText(r.left() - 8 - fm.horizontalAdvance(lz), pz + fm.ascent() // 2, lz)
+        p.drawText(r.center().x(), self.height() - 8, self.XLABEL)
+        p.save()
+        p.translate(16, r.center().y())
+        p.rotate(-90)
+        p.drawText(0, 0, self.YLABEL)
+        p.restore()
+
+    def _draw_colorbar(self, p: QPainter, r: QRect):
+        if self._bar is None:
+            col = np.ascontiguousarray(self._lut[::-1].reshape(256, 1))
+            self._bar = (col, QImage(col.data, 1, 256, 4, QImage.Format.Format_RGB32))
+        cb = QRect(r.right() + 20, r.top(), 20, r.height())
+        p.drawImage(cb, self._bar[1])
+        p.drawRect(cb)
+        fm = p.fontMetrics()
+        for v in (self.vmin, (self.vmin + self.vmax) / 2, self.vmax):
+            t = (v - self.vmin) / max(self.vmax - self.vmin, 1e-12)
+            pz = cb.bottom() - int(t * cb.height())
+            p.drawText(cb.right() + 6, pz + fm.ascent() // 2, f"{v:g}")
+        p.drawText(r.right() + 10, self.height() - 8, f"{self.last_redraw_ms:.1f} мс")
+
+
+# ────────── StoreCanvas ────────────────────────────────────────────────
+class StoreCanvas(FastTalbotCanvas):
+    """
+    Просмотр ковра из tiles.CarpetStore: колесо мыши — масштаб вокруг
+    курсора, перетаскивание — сдвиг, двойной щелчок — всё окно. На каждый кадр читается только
+    уровень пирамиды и окно, нужные для текущего размера виджета.
+    """
+
+    def __init__(self, store, cmap: str = "viridis"):
+        super().__init__(None, cmap=cmap, pool="mean")
+        self.store = store
+        self.zoomable = True
+
+    def _bounds(self):
+        return tuple(self.store.extent)
+
+    def _view_moved(self):
+        self._refetch()
+
+    def _refetch(self):
+        r = self._plot_rect()
+        x0, x1, z0, z1 = self._view_extent()
+        arr, self.extent = self.store.view(x0, x1, z0, z1, r.height(), r.width())
+        self.update_image(arr)
+
+    def showEvent(self, ev):
+        super().showEvent(ev)
+        self._refetch()
+
+    def resizeEvent(self, ev):
+        super().resizeEvent(ev)
+        self._refetch()
+
+
+# ────────── PlaneViewer ────────────────────────────────────────────────
+class PlaneCanvas(FastTalbotCanvas):
+    """Плоскость x–y двумерной решётки: те же LUT и оси, подписи x/a, y/a."""
+    XLABEL, YLABEL = "x/a", "y/a"
+
+    def __init__(self, cmap: str = "viridis"):
+        super().__init__(None, cmap=cmap, pool="mean")
+
+
+class PlaneViewer(QWidget):
+    """
+    Прокрутка плоскостей x–y по z. source — grating2d.VolumeStore (объём
+    на диске) или grating2d.PlaneCache (расчёт на лету с памятью уже
+    посчитанных плоскостей): оба дают z, extent и plane(i).
+    Шкала цвета — по максимуму текущей плоскости.
+    """
+
+    def __init__(self, source):
+        super().__init__()
+        self.source = source
+        self.canvas = PlaneCanvas()
+        x0, x1, y0, y1 = source.extent
+        self.canvas.extent = (x0, x1, y0, y1)
+
+        self.slider = QSlider(Qt.Orientation.Horizontal)
+        self.slider.setRange(0, len(source.z) - 1)
+        self.label = QLabel()
+        font = QFont()
+        font.setPointSize(int(BASE_MULT * 0.75))
+        self.label.setFont(font)
+        self.slider.valueChanged.connect(self._show)
+
+        row = QHBoxLayout()
+        row.addWidget(self.slider, 1)
+        row.addWidget(self.label)
+        lay = QVBoxLayout(self)
+        lay.addWidget(self.canvas, 1)
+        lay.addLayout(row)
+        self._show(0)
+
+    def _show(self, i: int):
+        t0 = time.perf_counter()
+        arr = self.source.plane(i)
+        self.canvas.vmax = max(float(arr.max()), 1e-12)
+        self.canvas.update_image(arr)
+        text = f"z/zT = {self.source.z[i]:.4f}   {(time.perf_counter() - t0) * 1e3:.0f} мс"
+        if hasattr(self.source, "computed"):
+            text += f"   посчитано плоскостей: {self.source.computed}"
+        self.label.setText(text)
@@ -1,12 +1,315 @@
+# worker.py — фоновые расчёты: поток-задача, планировщик «побеждает последний»
+# и предвыборка соседних шагов слайдера в простое
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PyQt6.QtCore import QObject, QThread, pyqtSignal
+from cache import cache_key
+from compute import talbot_carpet, serial, Cancelled
+import timing
+
+# не чаще, чем раз в столько секунд, отдаём в GUI частичный результат
+PARTIAL_INTERVAL = 0.1
+# предвыборка: шагов в каждую сторону от текущего значения и потоков пула
+PREFETCH_STEPS = 1
+PREFETCH_WORKERS = 1
+# прогрессивный рендер: сначала проходы с разрешением res // f (у окна зума —
+# сетка shape // f), затем полный. Проход /4 стоит ~1/16 полного, так что
+# общий бюджет почти не растёт.
+COARSE_FACTORS = (4,)
+MIN_COARSE_RES = 30
+
+
+def _passes(res: int) -> list[int]:
+    """Разрешения проходов от грубого к полному."""
+    coarse = [res // f for f in COARSE_FACTORS if res // f >= MIN_COARSE_RES]
+    return coarse + [res]
+
+
+def _pass_params(params: dict) -> list[dict]:
+    """Параметры проходов от грубого к полному; последний — сами params."""
+    if params.get("view") is not None:
+        # окно зума: цена — по пикселям окна, грубеет сетка shape, движок тот же
+        nz, nx = params["shape"]
+        return [{**params, "shape": (nz // f, nx // f)} for f in COARSE_FACTORS
+                if min(nz, nx) // f >= MIN_COARSE_RES] + [params]
+    preview = _preview_engine(params)
+    coarse = _passes(int(params["res"]))[:-1]
+    return [{**params, "res": r, "engine": preview} for r in coarse] + [params]
+
+
+def _pass_cost(params: dict) -> int:
+    if params.get("view") is not None:
+        return params["shape"][0] * params["shape"][1]
+    return params["res"] ** 2
+
+
+def _preview_engine(params: dict) -> str:
+    """
+    Самый дешёвый движок для грубых проходов. Гармоники (ряд Фурье идеальной
+    решётки) совпадают с FFT, пока решётка перекрывает всё окно по x, а
+    стоят в разы меньше и не требуют scipy.fft — первый кадр приходит сразу.
+    """
+    if params.get("engine", "fft") != "fft" or params.get("pad"):
+        return params.get("engine", "fft")
+    a, n, half = params["a"], params["nslits"], params["duty"] * params["a"] / 2
+    first, last = -(n // 2) * a - half, (n - 1 - n // 2) * a + half
+    if first <= params["x_min"] and params["x_max"] <= last:
+        return "harmonic"
+    return "fft"
+
+
+def _upsample(arr: np.ndarray, shape: tuple[int, int]) -> np.ndarray:
+    """Растянуть грубый проход до shape ближайшим соседом."""
+    iz = np.rint(np.linspace(0, arr.shape[0] - 1, shape[0])).astype(np.intp)
+    ix = np.rint(np.linspace(0, arr.shape[1] - 1, shape[1])).astype(np.intp)
+    return arr[np.ix_(iz, ix)]
 
-from PyQt6.QtCore import QThread, pyqtSignal
-from compute import talbot_carpet
 
 class ComputeThread(QThread):
-    finished = pyqtSignal(object)
-    def __init__(self, params):
+    """
+    Один расчёт talbot_carpet(**params) в отдельном потоке.
+    Отмена кооперативная: cancel() взводит токен, расчёт прерывается
+    на ближайшей границе чанка по z и результат не публикуется.
+
+    Рендер прогрессивный: грубые проходы отдаются через partial целиком,
+    а полный проход — полосами по z поверх растянутого грубого превью.
+    """
+    result = pyqtSignal(object)     # готовый массив
+    progress = pyqtSignal(int)      # 0–100 %
+    partial = pyqtSignal(object)    # копия частично заполненного массива
+    timings = pyqtSignal(dict)      # timing.Trace.summary() расчёта
+
+    def __init__(self, params, cache=None, submitted: float | None = None):
         super().__init__()
         self.params = params
+        self.cache = cache
+        self.submitted = submitted if submitted is not None else time.perf_counter()
+        self.token = threading.Event()
+        self._last_partial = 0.0
+        self._preview = None
+        self._base, self._weight = 0.0, 1.0
+
+    def cancel(self):
+        self.token.set()
+
+    def _on_progress(self, done, total, arr):
+        frac = self._base + self._weight * done / max(1, total)
+        self.progress.emit(int(100 * frac))
+        now = time.perf_counter()
+        if (arr is not None and 0 < done < total and not self.token.is_set()
+                and now - self._last_partial >= PARTIAL_INTERVAL):
+            self._last_partial = now
+            if self._preview is not None:
+                img = _upsample(self._preview, arr.shape)
+                img[:done] = arr[:done]
+            else:
+                img = arr.copy()
+            self.partial.emit(img)
+
     def run(self):
-        arr = talbot_carpet(**self.params)
-        self.finished.emit(arr)
+        if not timing.ENABLED:
+            self._run()
+            return
+        with timing.trace("compute", **self.params) as tr:
+            timing.record("queue", time.perf_counter() - self.submitted)
+            self._run()
+        if not self.token.is_set():
+            self.timings.emit(tr.summary())
+
+    def _run(self):
+        if self.cache is not None:
+            with timing.stage("cache_lookup"):
+                hit = self.cache.get(self.params)
+            if hit is not None:
+                self.result.emit(hit)
+                return
+        passes = _pass_params(self.params)
+        cost = [_pass_cost(p) for p in passes]
+        try:
+            for i, p in enumerate(passes):
+                self._base = sum(cost[:i]) / sum(cost)
+                self._weight = cost[i] / sum(cost)
+                arr = talbot_carpet(**p, cancel=self.token, progress=self._on_progress)
+                if p is not passes[-1] and not self.token.is_set():
+                    self._preview = arr
+                    self.partial.emit(arr)
+        except Cancelled:
+            return
+        if not self.token.is_set():
+            if self.cache is not None:
+                self.cache.put(self.params, arr)
+            self.result.emit(arr)
+
+
+class ComputeScheduler(QObject):
+    """
+    Планировщик «побеждает последний»: одновременно идёт не больше одного
+    расчёта, новые запросы схлопываются в один отложенный (только самые
+    свежие параметры), а текущий расчёт при этом отменяется.
+    """
+    busy = pyqtSignal(bool)
+    finished = pyqtSignal(object)
+    progress = pyqtSignal(int)
+    partial = pyqtSignal(object)
+    timings = pyqtSignal(dict)
+
+    def __init__(self, parent=None, cache=None):
+        super().__init__(parent)
+        self.cache = cache
+        self._job: ComputeThread | None = None
+        self._pending: dict | None = None
+        self._pending_at = 0.0
+
+    def submit(self, params: dict):
+        self._pending = params
+        self._pending_at = time.perf_counter()
+        if self._job is not None:
+            # дождёмся остановки текущего расчёта, затем запустим свежий
+            self._job.cancel()
+            return
+        self._start_next()
+
+    def cancel(self):
+        self._pending = None
+        if self._job is not None:
+            self._job.cancel()
+
+    def shutdown(self):
+        """Отменить всё и дождаться остановки потока (при закрытии окна)."""
+        self.cancel()
+        if self._job is not None:
+            self._job.wait()
+
+    def _start_next(self):
+        params, self._pending = self._pending, None
+        if params is None:
+            self.busy.emit(False)
+            return
+        self.busy.emit(True)
+        job = ComputeThread(params, self.cache, self._pending_at)
+        job.result.connect(self.finished.emit)
+        job.timings.connect(self.timings.emit)
+        job.progress.connect(self.progress.emit)
+        job.partial.connect(self.partial.emit)
+        job.finished.connect(self._on_job_done)
+        self._job = job
+        job.start()
+
+    def _on_job_done(self):
+        self._job.deleteLater()
+        self._job = None
+        self._start_next()
+
+
+# ────────── предвыборка соседних шагов ──────────────────────────────────
+def _lower_priority():
+    """
+    Поток пула — с наименьшим приоритетом ОС (Linux: nice отдельного потока).
+    nice достаётся только ему, не потокам scipy.fft и Numba, — поэтому сами
+    задачи идут в один поток (compute.serial).
+    """
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+    except (AttributeError, OSError):
+        pass
+
+
+class Prefetcher:
+    """
+    Спекулятивный расчёт в простое: ковры для соседних шагов последнего
+    сдвинутого слайдера считаются в ограниченном пуле и кладутся в кэш
+    результатов, так что шаг на соседнее значение — мгновенное попадание.
+    Настоящий запрос вытесняет предвыборку: preempt() отменяет все задачи
+    на ближайшей границе чанка, ещё не начатые не запускаются вовсе.
+
+    Статистика: доля запросов, которые уже были посчитаны заранее, и CPU,
+    потраченный впустую (отменённые задачи и результаты, так и не
+    понадобившиеся). CPU — thread_time() потока задачи: внутри serial()
+    scipy.fft и Numba считают в нём же, а перерисовки GUI и настоящие
+    расчёты в других потоках в цифру не попадают.
+    """
+
+    def __init__(self, cache, workers: int = PREFETCH_WORKERS):
+        self.cache = cache
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch",
+                                        initializer=_lower_priority)
+        self._lock = threading.Lock()
+        self._inflight: dict[threading.Event, str] = {}
+        self._ready: dict[str, float] = {}      # ключ → CPU-секунды, ещё не востребован
+        self.requests = self.hits = self.computed = self.cancelled = 0
+        self.cpu_s = self.cancelled_s = 0.0
+
+    def schedule(self, candidates):
+        """Поставить в очередь параметры, которых ещё нет ни в кэше, ни в работе."""
+        for params in candidates:
+            key = cache_key(params)
+            with self._lock:
+                if key in self._ready or key in self._inflight.values():
+                    continue
+            if self.cache.contains(params):
+                continue
+            token = threading.Event()
+            with self._lock:
+                self._inflight[token] = key
+            self._pool.submit(self._run, params, key, token)
+
+    def preempt(self):
+        with self._lock:
+            for token in self._inflight:
+                token.set()
+
+    def ready(self, params) -> bool:
+        """Посчитан ли этот набор параметров заранее (без учёта в статистике)."""
+        with self._lock:
+            return cache_key(params) in self._ready
+
+    def note_request(self, params) -> bool:
+        """Учесть настоящий запрос; True — его результат уже предвыбран."""
+        key = cache_key(params)
+        with self._lock:
+            self.requests += 1
+            if self._ready.pop(key, None) is None:
+                return False
+            self.hits += 1
+            return True
+
+    def _run(self, params, key, token):
+        if token.is_set():
+            with self._lock:
+                self._inflight.pop(token, None)
+            return
+        t0 = time.thread_time()
+        try:
+            with serial():
+                arr = talbot_carpet(**params, cancel=token)
+        except Cancelled:
+            arr = None
+        cpu = time.thread_time() - t0
+        if arr is not None:
+            self.cache.put(params, arr)
+        with self._lock:
+            self._inflight.pop(token, None)
+            self.cpu_s += cpu
+            if arr is None:
+                self.cancelled += 1
+                self.cancelled_s += cpu
+            else:
+                self.computed += 1
+                self._ready[key] = cpu
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(
+                requests=self.requests, hits=self.hits,
+                hit_rate=self.hits / self.requests if self.requests else 0.0,
+                computed=self.computed, cancelled=self.cancelled, cpu_s=self.cpu_s,
+                wasted_cpu_s=self.cancelled_s + sum(self._ready.values()),
+            )
+
+    def shutdown(self):
+        self.preempt()
+        self._pool.shutdown(wait=True, cancel_futures=True)
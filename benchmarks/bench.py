@@ -0,0 +1,286 @@
+"""
+bench.py — бенчмарк всех вычислительных путей и перекрёстная проверка движков.
+
+    python benchmarks/bench.py                          # полная матрица → bench.json
+    python benchmarks/bench.py --quick -o quick.json
+    python benchmarks/bench.py --save-baseline          # записать baseline.json
+    python benchmarks/bench.py --baseline benchmarks/baseline.json --threshold 0.2
+
+Для каждого (движок, размер) пишется лучшее время из --repeat повторов,
+пиковая память (tracemalloc, учитывает буферы NumPy) и пропускная
+способность в пикселях/с, плюс метаданные машины. При сравнении с
+baseline замедление больше threshold считается регрессией. Движки
+сверяются между собой численно (Френель — эталон для FFT и гармоник).
+Код возврата ненулевой при регрессии или расхождении движков.
+"""
+
+from __future__ import annotations
+import argparse
+import datetime
+import json
+import os
+import pathlib
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "application"))
+
+import compute                       # noqa: E402
+from compute import talbot_carpet    # noqa: E402
+from nonlinear import sh_carpet      # noqa: E402
+from polychromatic import gaussian_spectrum, polychromatic_carpet  # noqa: E402
+
+BASE = dict(a=1.0, wavelength=1.0, duty=0.2, x_min=-3.0, x_max=3.0, use_gpu=False)
+
+# (res, z_max, nslits): nx = 6·res + 1, nz ≈ z_max·res
+SIZES = [(100, 1.0, 20), (200, 3.0, 20), (300, 6.0, 60), (500, 6.0, 20)]
+QUICK_SIZES = [(100, 1.0, 20), (200, 3.0, 20)]
+# Френель на порядок дороже — для него урезанная матрица
+FRESNEL_SIZES = [(100, 1.0, 20), (200, 1.0, 20)]
+
+
+def _carpet(engine, use_gpu=False, pad=False, out_dtype="float32"):
+    def run(res, z_max, nslits):
+        return talbot_carpet(**{**BASE, "use_gpu": use_gpu}, engine=engine, pad=pad,
+                             res=res, z_max=z_max, nslits=nslits, out_dtype=out_dtype)
+    return run
+
+
+def _poly(samples):
+    wl, w = gaussian_spectrum(BASE["wavelength"], 0.3, samples)
+    def run(res, z_max, nslits):
+        p = {k: v for k, v in BASE.items() if k not in ("wavelength", "use_gpu")}
+        return polychromatic_carpet(wl, w, **p, res=res, z_max=z_max, nslits=nslits)
+    return run
+
+
+def _sh(method):
+    def run(res, z_max, nslits):
+        x = np.linspace(-3, 3, 6 * res + 1)
+        z = compute.z_grid(z_max, res) * 4.0
+        return sh_carpet(x, z, a=1.0, wavelength=0.5, w0=1.0,
+                         coeffs=np.ones(2 * nslits + 1), method=method)
+    return run
+
+
+def _no_symmetry(fn):
+    def run(*size):
+        compute.USE_SYMMETRY = False
+        try:
+            return fn(*size)
+        finally:
+            compute.USE_SYMMETRY = True
+    return run
+
+
+def _numpy_only(fn):
+    def run(*size):
+        compute.USE_NUMBA = False
+        try:
+            return fn(*size)
+        finally:
+            compute.USE_NUMBA = True
+    return run
+
+
+def paths(quick: bool):
+    sizes = QUICK_SIZES if quick else SIZES
+    out = {
+        "fft_cpu": (_carpet("fft"), sizes),
+        "fft_pad": (_carpet("fft", pad=True), sizes),
+        # fft_cpu на симметричном окне идёт по половине спектра — полное FFT для сравнения
+        "fft_full": (_no_symmetry(_carpet("fft")), sizes),
+        # нормированный uint8, как в GUI: потоковая нормировка вместо float32-ковра
+        "fft_uint8": (_carpet("fft", out_dtype="uint8"), sizes),
+        "harmonic": (_carpet("harmonic"), sizes),
+        "poly15": (_poly(15), sizes[:2]),
+        "fresnel": (_carpet("fresnel"), FRESNEL_SIZES[:1] if quick else FRESNEL_SIZES),
+        "sh_direct": (_sh("direct"), sizes),
+        "sh_fft": (_sh("fft"), sizes),
+    }
+    if compute.NUMBA:
+        # fft_cpu/fresnel идут через ядра Numba — для сравнения путь NumPy
+        out["fft_numpy"] = (_numpy_only(_carpet("fft")), sizes)
+        out["fresnel_numpy"] = (_numpy_only(_carpet("fresnel")), out["fresnel"][1])
+    if compute.TORCH_OK:
+        # torch_fft: GPU, если есть, иначе пул потоков torch на CPU (TALBOT_TORCH_DEVICE)
+        out["fft_torch"] = (_carpet("fft", use_gpu=True), sizes)
+        out["fft_torch_uint8"] = (_carpet("fft", use_gpu=True, out_dtype="uint8"), sizes)
+    return out
+
+
+def measure(fn, size, repeat: int) -> dict:
+    best, peak, shape = float("inf"), 0, None
+    for _ in range(repeat):
+        compute._STAGES.clear()          # холодный расчёт, без переиспользования стадий
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        arr = fn(*size)
+        dt = time.perf_counter() - t0
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        best, shape = min(best, dt), arr.shape
+    px = shape[0] * shape[1]
+    return dict(res=size[0], z_max=size[1], nslits=size[2], nz=shape[0], nx=shape[1],
+                seconds=best, peak_mb=peak / 2**20, mpix_per_s=px / best / 1e6)
+
+
+def _torch_info() -> dict:
+    if not compute.TORCH_OK:
+        return dict(torch=None)
+    import torch
+    import torch_fft
+    return dict(torch=torch.__version__, torch_device=str(torch_fft.device()),
+                torch_threads=torch.get_num_threads())
+
+
+def machine() -> dict:
+    import scipy
+    return dict(
+        host=platform.node(), platform=platform.platform(), python=platform.python_version(),
+        processor=platform.processor() or platform.machine(), cpus=os.cpu_count(),
+        numpy=np.__version__, scipy=scipy.__version__, **_torch_info(),
+        numba_threads=compute.kernels.nb.get_num_threads() if compute.kernels else 0,
+        date=datetime.datetime.now().isoformat(timespec="seconds"),
+    )
+
+
+# ────────── перекрёстная проверка ────────────────────────────────────
+def _rel(A, B):
+    return float(np.abs(A - B).mean() / np.abs(B).mean())
+
+
+def cross_validate(res: int = 200) -> list[dict]:
+    """
+    Относительная L1-разница движков на широкой апертуре. Допуски
+    покрывают дискретизацию сетки FFT (сходится как ~1/res).
+    """
+    checks = []
+    p = dict(BASE, res=res, z_max=0.5)
+
+    # FFT без заворота (защитная полоса) против точного Френеля, 7 щелей
+    F = talbot_carpet(**p, nslits=7, engine="fresnel")
+    G = talbot_carpet(**p, nslits=7, pad=True)
+    checks.append(dict(name="fft pad vs fresnel", rel=_rel(G, F), tol=0.08))
+
+    # зеркальная половина спектра против полного FFT (nx = 901: длина без Блюстейна)
+    S = talbot_carpet(**{**p, "res": 150}, nslits=7)
+    compute._STAGES.clear()              # иначе Q придёт из кэша строк S
+    Q = _no_symmetry(_carpet("fft"))(150, p["z_max"], 7)
+    checks.append(dict(name="fft mirror vs full", rel=_rel(S, Q), tol=1e-5))
+
+    # окно зума (chirp-z по полосе спектра, модель pad на сетке res) против
+    # полного FFT на вчетверо более мелкой сетке: пиксели окна — её узлы,
+    # полоса окна (Найквист пикселя) — её полоса, так что совпасть должно точно
+    f = 4
+    Gf = talbot_carpet(**{**p, "res": f * res}, nslits=7, pad=True)
+    z, x = compute.z_grid(p["z_max"], f * res), np.linspace(p["x_min"], p["x_max"], Gf.shape[1])
+    i0, j0, m = x.size // 3, 40, 200
+    R = talbot_carpet(**p, nslits=7, pad=True, view=(x[i0], x[i0 + m], z[j0], z[j0 + m]),
+                      shape=(m + 1, m + 1))
+    checks.append(dict(name="roi czt vs finer fft", rel=_rel(R, Gf[j0:j0 + m + 1, i0:i0 + m + 1]),
+                       tol=1e-5))
+
+    if compute.TORCH_OK:
+        # torch-движок против CPU-пути на той же геометрии: полосой и компактным типом
+        T = talbot_carpet(**{**p, "use_gpu": True}, nslits=7, pad=True)
+        checks.append(dict(name="fft torch vs cpu", rel=_rel(T, G), tol=1e-5))
+        T8 = talbot_carpet(**{**p, "use_gpu": True}, nslits=7, out_dtype="uint8")
+        C8 = talbot_carpet(**p, nslits=7, out_dtype="uint8")
+        checks.append(dict(name="fft torch uint8 vs cpu",
+                           rel=float(np.abs(T8.astype(int) - C8).max()) / 255, tol=1 / 255))
+
+    # идеальная решётка (гармоники) против Френеля на 401 щели, центр
+    p1 = {**p, "x_min": -1.0, "x_max": 1.0}
+    F = talbot_carpet(**p1, nslits=401, engine="fresnel")
+    H = talbot_carpet(**p1, nslits=401, engine="harmonic", tol=1e-4)
+    checks.append(dict(name="harmonic vs fresnel", rel=_rel(H, F), tol=0.08))
+    # то же при res, где строки z_grid (Z0 = 0.01) не ложатся на сетку 1/res от нуля
+    p2 = {**p1, "res": 150}
+    F = talbot_carpet(**p2, nslits=401, engine="fresnel")
+    H = talbot_carpet(**p2, nslits=401, engine="harmonic", tol=1e-4)
+    checks.append(dict(name="harmonic vs fresnel res 150", rel=_rel(H, F), tol=0.08))
+
+    # две схемы нелинейного движка
+    D = _sh("direct")(res, 1.0, 20)
+    Q = _sh("fft")(res, 1.0, 20)
+    checks.append(dict(name="sh fft vs direct", rel=_rel(Q, D), tol=1e-3))
+
+    for c in checks:
+        c["ok"] = c["rel"] <= c["tol"]
+    return checks
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    base = {(r["path"], r["res"], r["z_max"], r["nslits"]): r for r in baseline["results"]}
+    regressions = []
+    for r in results["results"]:
+        b = base.get((r["path"], r["res"], r["z_max"], r["nslits"]))
+        if b is None:
+            continue
+        r["baseline_s"] = b["seconds"]
+        r["speedup"] = b["seconds"] / r["seconds"]
+        if r["seconds"] > b["seconds"] * (1 + threshold):
+            regressions.append(f"{r['path']} res={r['res']} z={r['z_max']} n={r['nslits']}: "
+                               f"{b['seconds']:.3f} → {r['seconds']:.3f} с")
+    return regressions
+
+
+def main(argv=None):
+    here = pathlib.Path(__file__).resolve().parent
+    ap = argparse.ArgumentParser(description="Бенчмарк и перекрёстная проверка движков")
+    ap.add_argument("-o", "--out", default="bench.json")
+    ap.add_argument("--quick", action="store_true", help="малая матрица размеров")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--only", nargs="*", help="только эти пути (fft_cpu, harmonic, …)")
+    ap.add_argument("--baseline", default=str(here / "baseline.json"))
+    ap.add_argument("--save-baseline", action="store_true")
+    ap.add_argument("--threshold", type=float, default=0.2, help="допустимое замедление (0.2 = 20 %%)")
+    ap.add_argument("--no-validate", action="store_true")
+    args = ap.parse_args(argv)
+    compute.load_kernels()               # компиляция не входит в замеры
+
+    rows = []
+    for name, (fn, sizes) in paths(args.quick).items():
+        if args.only and name not in args.only:
+            continue
+        fn(*sizes[0])                    # прогрев (импорты, планы FFT)
+        for size in sizes:
+            r = dict(path=name, **measure(fn, size, args.repeat))
+            rows.append(r)
+            print(f"{name:10s} res={r['res']:4d} nz×nx={r['nz']}×{r['nx']:5d} "
+                  f"{r['seconds'] * 1e3:9.1f} мс {r['peak_mb']:8.1f} МБ {r['mpix_per_s']:8.2f} Мпикс/с")
+    results = dict(machine=machine(), results=rows)
+
+    failed = False
+    if not args.no_validate:
+        results["validation"] = cross_validate()
+        for c in results["validation"]:
+            print(f"{'OK ' if c['ok'] else 'FAIL'} {c['name']:22s} rel={c['rel']:.4f} (tol {c['tol']})")
+            failed |= not c["ok"]
+
+    base_path = pathlib.Path(args.baseline)
+    if base_path.exists() and not args.save_baseline:
+        baseline = json.loads(base_path.read_text(encoding="utf-8"))
+        if baseline["machine"].get("host") != results["machine"]["host"]:
+            print(f"внимание: baseline снят на другой машине ({baseline['machine'].get('host')})")
+        regressions = compare(results, baseline, args.threshold)
+        results["regressions"] = regressions
+        for line in regressions:
+            print("REGRESSION", line)
+        failed |= bool(regressions)
+
+    pathlib.Path(args.out).write_text(json.dumps(results, indent=1), encoding="utf-8")
+    if args.save_baseline:
+        base_path.write_text(json.dumps(results, indent=1), encoding="utf-8")
+        print(f"baseline записан в {base_path}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
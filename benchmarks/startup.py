@@ -0,0 +1,116 @@
+"""
+startup.py — время запуска GUI: импорт, показ окна, первый кадр.
+
+    python benchmarks/startup.py                     # → startup.json
+    python benchmarks/startup.py --save-baseline     # записать startup_baseline.json
+    python benchmarks/startup.py --budget 1.5        # окно не позже 1.5 с
+
+Каждый замер — отдельный процесс (холодный импорт, offscreen-платформа Qt),
+из --repeat повторов берётся лучший. Время считается от запуска
+интерпретатора: import main → окно показано → первый кадр на холсте.
+Замедление больше threshold относительно baseline или превышение
+--budget дают ненулевой код возврата.
+"""
+
+from __future__ import annotations
+import argparse
+import json
+import os
+import pathlib
+import subprocess
+import sys
+import time
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+APP = ROOT / "application"
+
+# код дочернего процесса: печатает JSON с отметками времени (с)
+_CHILD = r"""
+import json, sys, time
+t0 = float(sys.argv[1])
+sys.argv = ["main.py"] + sys.argv[2:]
+sys.path.insert(0, %(app)r)
+from PyQt6.QtWidgets import QApplication
+from PyQt6.QtCore import QTimer
+app = QApplication(sys.argv)
+import main
+t_import = time.time() - t0
+win = main.MainWindow()
+win.resize(1200, 800)
+win.show()
+t_window = time.time() - t0
+marks = {}
+
+def frame(_arr):
+    marks.setdefault("first_frame_s", time.time() - t0)
+
+def done(_arr):
+    marks.setdefault("final_frame_s", time.time() - t0)
+    QTimer.singleShot(0, app.quit)
+
+win.scheduler.partial.connect(frame)
+win.scheduler.finished.connect(frame)
+win.scheduler.finished.connect(done)
+QTimer.singleShot(60000, app.quit)
+app.exec()
+win.scheduler.shutdown()
+print(json.dumps(dict(import_s=t_import, window_s=t_window, **marks)))
+"""
+
+METRICS = ("import_s", "window_s", "first_frame_s", "final_frame_s")
+
+
+def measure_once(fast: bool) -> dict:
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen")
+    args = [sys.executable, "-c", _CHILD % {"app": str(APP)}, repr(time.time())]
+    if fast:
+        args.append("--fast")
+    out = subprocess.run(args, env=env, cwd=APP, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def measure(repeat: int, fast: bool) -> dict:
+    runs = [measure_once(fast) for _ in range(repeat)]
+    return {m: min(r[m] for r in runs if m in r) for m in METRICS if any(m in r for r in runs)}
+
+
+def main(argv=None):
+    here = pathlib.Path(__file__).resolve().parent
+    ap = argparse.ArgumentParser(description="Бенчмарк времени запуска GUI")
+    ap.add_argument("-o", "--out", default="startup.json")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--baseline", default=str(here / "startup_baseline.json"))
+    ap.add_argument("--save-baseline", action="store_true")
+    ap.add_argument("--threshold", type=float, default=0.3, help="допустимое замедление (0.3 = 30 %%)")
+    ap.add_argument("--budget", type=float, default=0.0, help="предел window_s, с (0 — без предела)")
+    args = ap.parse_args(argv)
+
+    results = {}
+    for name, fast in (("matplotlib", False), ("fast", True)):
+        results[name] = r = measure(args.repeat, fast)
+        print(f"{name:10s} " + "  ".join(f"{m} {r[m]:.3f}" for m in METRICS if m in r))
+
+    failed = False
+    for name, r in results.items():
+        if args.budget and r["window_s"] > args.budget:
+            print(f"BUDGET {name}: окно через {r['window_s']:.3f} с > {args.budget} с")
+            failed = True
+    base_path = pathlib.Path(args.baseline)
+    if base_path.exists() and not args.save_baseline:
+        baseline = json.loads(base_path.read_text(encoding="utf-8"))
+        for name, r in results.items():
+            for m, v in r.items():
+                b = baseline.get(name, {}).get(m)
+                if b is not None and v > b * (1 + args.threshold):
+                    print(f"REGRESSION {name} {m}: {b:.3f} → {v:.3f} с")
+                    failed = True
+
+    pathlib.Path(args.out).write_text(json.dumps(results, indent=1), encoding="utf-8")
+    if args.save_baseline:
+        base_path.write_text(json.dumps(results, indent=1), encoding="utf-8")
+        print(f"baseline записан в {base_path}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,6 +6,12 @@ from matplotlib.colors import LinearSegmentedColormap
 a = 0.01  # период решетки (мм)
 wavelength = 0.0005  # длина волны (мм)
 N = 20  # количество учитываемых гармоник
+duty = 0.5  # доля прозрачной части периода
+
+
+def fourier_coeffs(n, a):
+    """Коэффициент Фурье прямоугольной решётки: c_n = duty·sinc(n·duty)."""
+    return duty * np.sinc(n * duty)
 
 # Длина Талбота
 z_t = 2 * a**2 / wavelength
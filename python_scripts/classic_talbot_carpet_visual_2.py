@@ -1,7 +1,12 @@
+import pathlib
+import sys
+
 import numpy as np
 import matplotlib.pyplot as plt
-from scipy.special import fresnel
-import matplotlib.colors as colors
+from matplotlib.colors import LinearSegmentedColormap
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent / "application"))
+from fresnel import fresnel_carpet
 
 # Параметры системы
 a = 1.0            # Период решетки
@@ -23,39 +28,17 @@ x_ratio = np.arange(-x_ratio_max, x_ratio_max, dx)  # x/a
 z_ratio = np.arange(0.01, z_ratio_max, dz)          # z/zT
 X, Z = np.meshgrid(x_ratio, z_ratio)
 
-# Массив для интенсивности
-intensity = np.zeros_like(X)
-
-# Вычисляем интенсивность для каждой точки
-for i in range(len(z_ratio)):
-    z = z_ratio[i] * zT  # Абсолютное z
-    
-    # Масштабный коэффициент Френеля
-    scale = np.sqrt(z * lambda_ / np.pi)
-    
-    # Нормированные координаты
-    sx = X[i,:] * a / scale  # x/a -> безразмерный аргумент
-    sw = slit_width / scale  # ширина щели
-    sp = a / scale           # период решетки
-    
-    c_tot, s_tot = 0.0, 0.0
-    
-    for j in range(nslits):
-        # Положение j-й щели
-        pos = (j - nslits//2) * sp
-        
-        # Границы щели
-        x1 = sw/2 - pos - sx
-        x2 = -sw/2 - pos - sx
-        
-        # Интегралы Френеля
-        c1, s1 = fresnel(x1)
-        c2, s2 = fresnel(x2)
-        
-        c_tot += (c1 - c2)
-        s_tot += (s1 - s2)
-    
-    intensity[i,:] = (c_tot**2 + s_tot**2)
+# Интенсивность для всех (z, x) сразу: щели в точках (j − nslits//2)·a
+# (как в исходном цикле по позициям −pos), ширина slit_width,
+# масштаб Френеля √(zλ/π) для каждой строки
+intensity = fresnel_carpet(
+    x_ratio * a,
+    np.sqrt(z_ratio * zT * lambda_ / np.pi),
+    c0=(nslits // 2 - nslits + 1) * a,
+    pitch=a,
+    nslits=nslits,
+    width=slit_width,
+)
 
 # Создание кастомной цветовой карты
 colors = [(0, 0, 0.5), (0, 0, 1), (0, 1, 1), (1, 1, 0), (1, 0, 0), (0.5, 0, 0)]
@@ -1,7 +1,13 @@
+import pathlib
+import sys
+
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.colors import LinearSegmentedColormap
 
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent / "application"))
+from nonlinear import sh_carpet
+
 # Параметры системы
 a = 1.0                  # Период решетки
 lambda_s = 0.5           # Длина волны второй гармоники
@@ -19,29 +25,13 @@ zT0 = 2 * a**2 / lambda_s  # базовая длина Тальбота без 
 # Сетка
 x_ratio = np.arange(-x_ratio_max, x_ratio_max, dx)  # x/a
 z_ratio = np.arange(0.01, z_ratio_max, dz)          # z/zT0
-X, Z = np.meshgrid(x_ratio, z_ratio)
-
-# Преобразуем в физические координаты
-x = X * a
-z = Z * zT0
-
-# Расчет параметра увеличения и радиуса пучка в плоскости наблюдения
-w_z = w0 * np.sqrt(1 + (2 * z / (w0**2))**2)
 
 # Коэффициенты Фурье решетки (ограничим числом членов)
 N = 20
 b_n = np.ones(2 * N + 1)  # амплитуды, например, все по 1 (для прямоугольной решетки)
-n_vals = np.arange(-N, N + 1).reshape(-1, 1, 1)
-
-# Вычисляем фазовые члены (саморепродукция)
-phase_z = np.exp(-1j * np.pi * lambda_s * (n_vals**2) * (w0**2) * z / (a**2 * w_z**2))
-phase_x = np.exp(1j * 2 * np.pi * n_vals * w0**2 * x / (a * w_z**2))
-
-# Сумма по n
-field = np.sum(b_n.reshape(-1, 1, 1) * phase_z * phase_x, axis=0)
 
-# Интенсивность
-intensity = np.abs(field)**2
+# Сумма по гармоникам копится по чанкам строк z, без тензоров (2N+1, nz, nx)
+intensity = sh_carpet(x_ratio * a, z_ratio * zT0, a=a, wavelength=lambda_s, w0=w0, coeffs=b_n)
 
 # Создание кастомной цветовой карты
 colors_list = [(0, 0, 0.5), (0, 0, 1), (0, 1, 1), (1, 1, 0), (1, 0, 0), (0.5, 0, 0)]
@@ -1,8 +1,13 @@
+import pathlib
+import sys
+
 import numpy as np
 import matplotlib.pyplot as plt
-from scipy.special import fresnel
 import matplotlib.colors as colors
 
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent / "application"))
+from fresnel import fresnel_carpet
+
 # Параметры решетки
 a = 1.0          # ширина щели
 off1 = 10.0      # расстояние между щелями
@@ -16,36 +21,19 @@ z_max = 2.0      # максимальное значение z
 x = np.arange(-xmax, xmax, dx)
 z = np.linspace(0.01, z_max, num_z)
 
-# Функция для расчета интенсивности через интегралы Френеля с учетом alpha
+# Интенсивность через интегралы Френеля с учетом alpha: щели шириной a
+# с центрами ±(2jj+1)·off1 образуют решётку с шагом 2·off1
 def calculate_fresnel_intensity(alpha):
-    intensity = np.zeros((num_z, len(x)))
-    
-    for i, zi in enumerate(z):
-        # Модифицируем z с учетом alpha
-        z_eff = zi / alpha if alpha != 0 else zi
-        
-        sa = a / np.sqrt(z_eff/np.pi)
-        sx = x / np.sqrt(z_eff/np.pi)
-        soff1 = off1 / np.sqrt(z_eff/np.pi)
-        
-        # Функция для расчета интегралов Френеля для jj-й щели
-        def fresnel_for_slit(jj):
-            c1, s1 = fresnel(sa/2 - (2*jj+1)*soff1 - sx)
-            c2, s2 = fresnel(-sa/2 - (2*jj+1)*soff1 - sx)
-            c3, s3 = fresnel(sa/2 + (2*jj+1)*soff1 - sx)
-            c4, s4 = fresnel(-sa/2 + (2*jj+1)*soff1 - sx)
-            return (c1-c2+c3-c4, s1-s2+s3-s4)
-        
-        # Суммируем вклады от всех щелей
-        c_tot, s_tot = fresnel_for_slit(0)
-        for jj in range(1, nslits):
-            c, s = fresnel_for_slit(jj)
-            c_tot += c
-            s_tot += s
-        
-        intensity[i,:] = 0.5*(c_tot**2 + s_tot**2)
-    
-    return intensity
+    z_eff = z / alpha if alpha != 0 else z
+    return fresnel_carpet(
+        x,
+        np.sqrt(z_eff / np.pi),
+        c0=-(2 * nslits - 1) * off1,
+        pitch=2 * off1,
+        nslits=2 * nslits,
+        width=a,
+        norm=0.5,
+    )
 
 # Значения alpha (доли длины Талбота)
 alphas = [1.0, 0.5, 0.25, 0.125]
@@ -1,10 +1,12 @@
+import pathlib
+import sys
+import time
+
 import numpy as np
-import matplotlib.pyplot as plt
-from scipy.special import fresnel
-import matplotlib.colors as colors
-from matplotlib.animation import FuncAnimation
-from PIL import Image
-import io
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent / "application"))
+from fresnel import fresnel_carpet
+from animation import master_grid, frame_from_master, render_animation
 
 # Параметры решетки
 a = 1.0          # ширина щели
@@ -19,65 +21,115 @@ z_max = 2.0      # максимальное значение z
 x = np.arange(-xmax, xmax, dx)
 z = np.linspace(0.01, z_max, num_z)
 
-# Функция для расчета интенсивности через интегралы Френеля с учетом alpha
-def calculate_fresnel_intensity(alpha):
+# Значения alpha для кадров
+alpha_values = np.arange(0.1, 2.1, 0.1)
+
+
+# Интенсивность через интегралы Френеля при заданных z_eff: щели шириной a
+# с центрами ±(2jj+1)·off1 образуют решётку с шагом 2·off1
+def fresnel_intensity(z_eff):
+    return fresnel_carpet(
+        x,
+        np.sqrt(z_eff / np.pi),
+        c0=-(2 * nslits - 1) * off1,
+        pitch=2 * off1,
+        nslits=2 * nslits,
+        width=a,
+        norm=0.5,
+    )
+
+
+# Прежний скрипт для сравнения (--compare): цикл по строкам z и щелям на
+# каждый кадр, FuncAnimation и Pillow
+def legacy_fresnel_intensity(alpha):
+    from scipy.special import fresnel
+
     intensity = np.zeros((num_z, len(x)))
-    
     for i, zi in enumerate(z):
-        # Модифицируем z с учетом alpha
         z_eff = zi / alpha if alpha != 0 else zi
-        
-        sa = a / np.sqrt(z_eff/np.pi)
-        sx = x / np.sqrt(z_eff/np.pi)
-        soff1 = off1 / np.sqrt(z_eff/np.pi)
-        
-        # Функция для расчета интегралов Френеля для jj-й щели
+        sa = a / np.sqrt(z_eff / np.pi)
+        sx = x / np.sqrt(z_eff / np.pi)
+        soff1 = off1 / np.sqrt(z_eff / np.pi)
+
         def fresnel_for_slit(jj):
-            c1, s1 = fresnel(sa/2 - (2*jj+1)*soff1 - sx)
-            c2, s2 = fresnel(-sa/2 - (2*jj+1)*soff1 - sx)
-            c3, s3 = fresnel(sa/2 + (2*jj+1)*soff1 - sx)
-            c4, s4 = fresnel(-sa/2 + (2*jj+1)*soff1 - sx)
-            return (c1-c2+c3-c4, s1-s2+s3-s4)
-        
-        # Суммируем вклады от всех щелей
+            c1, s1 = fresnel(sa / 2 - (2 * jj + 1) * soff1 - sx)
+            c2, s2 = fresnel(-sa / 2 - (2 * jj + 1) * soff1 - sx)
+            c3, s3 = fresnel(sa / 2 + (2 * jj + 1) * soff1 - sx)
+            c4, s4 = fresnel(-sa / 2 + (2 * jj + 1) * soff1 - sx)
+            return (c1 - c2 + c3 - c4, s1 - s2 + s3 - s4)
+
         c_tot, s_tot = fresnel_for_slit(0)
         for jj in range(1, nslits):
             c, s = fresnel_for_slit(jj)
             c_tot += c
             s_tot += s
-        
-        intensity[i,:] = 0.5*(c_tot**2 + s_tot**2)
-    
+        intensity[i, :] = 0.5 * (c_tot ** 2 + s_tot ** 2)
     return intensity
 
-# Создаем фигуру
-fig, ax = plt.subplots(figsize=(10, 6))
-plt.xlabel('Поперечная координата x')
-plt.ylabel('Продольная координата z')
 
-# Начальное изображение
-alpha_values = np.arange(0.1, 2.1, 0.1)
-intensity = calculate_fresnel_intensity(alpha_values[0])
-im = ax.imshow(intensity, extent=[-xmax, xmax, z[-1], z[0]], 
-               cmap='inferno', aspect='auto', norm=colors.PowerNorm(gamma=0.3))
-cbar = fig.colorbar(im, ax=ax, label='Интенсивность')
-title = ax.set_title(f'α = {alpha_values[0]:.1f}')
-
-# Функция обновления кадра
-def update(frame):
-    alpha = alpha_values[frame]
-    intensity = calculate_fresnel_intensity(alpha)
-    im.set_array(intensity)
-    title.set_text(f'α = {alpha:.1f}')
-    return im, title
-
-# Создаем анимацию
-ani = FuncAnimation(fig, update, frames=len(alpha_values), interval=200, blit=False)
-
-# Сохраняем как GIF
-print("Создание анимации...")
-gif_path = "animation.gif"
-ani.save(gif_path, writer='pillow', fps=5, dpi=100)
-
-print(f"Анимация сохранена как {gif_path}")
-plt.close()
+def legacy_animation(gif_path):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.colors as colors
+    import matplotlib.pyplot as plt
+    from matplotlib.animation import FuncAnimation
+
+    fig, ax = plt.subplots(figsize=(10, 6))
+    plt.xlabel('Поперечная координата x')
+    plt.ylabel('Продольная координата z')
+    intensity = legacy_fresnel_intensity(alpha_values[0])
+    im = ax.imshow(intensity, extent=[-xmax, xmax, z[-1], z[0]],
+                   cmap='inferno', aspect='auto', norm=colors.PowerNorm(gamma=0.3))
+    fig.colorbar(im, ax=ax, label='Интенсивность')
+    title = ax.set_title(f'α = {alpha_values[0]:.1f}')
+
+    def update(frame):
+        alpha = alpha_values[frame]
+        im.set_array(legacy_fresnel_intensity(alpha))
+        title.set_text(f'α = {alpha:.1f}')
+        return im, title
+
+    ani = FuncAnimation(fig, update, frames=len(alpha_values), interval=200, blit=False)
+    ani.save(gif_path, writer='pillow', fps=5, dpi=100)
+    plt.close(fig)
+
+
+def main(gif_path="animation.gif", compare=False):
+    t0 = time.perf_counter()
+    # Один мастер-ковёр по z_eff ∈ [z_min/alpha_max, z_max/alpha_min]
+    zm = master_grid(z, alpha_values)
+    master = fresnel_intensity(zm)
+    t_master = time.perf_counter() - t0
+    print(f"Мастер-ковёр: {zm.size} строк вместо {num_z * len(alpha_values)}, {t_master:.1f} с")
+
+    # Шкала цвета фиксируется по первому кадру, как при FuncAnimation
+    first = frame_from_master(zm, master, z / alpha_values[0])
+    style = dict(
+        extent=[-xmax, xmax, z[-1], z[0]],
+        cmap="inferno",
+        gamma=0.3,
+        vmin=float(first.min()),
+        vmax=float(first.max()),
+        xlabel="Поперечная координата x",
+        ylabel="Продольная координата z",
+        clabel="Интенсивность",
+        title="α = {:.1f}",
+    )
+    frames = ((al, frame_from_master(zm, master, z / al)) for al in alpha_values)
+
+    print("Создание анимации...")
+    render_animation(frames, gif_path, style, fps=5)
+    total = time.perf_counter() - t0
+    print(f"Анимация сохранена как {gif_path} за {total:.1f} с")
+
+    if compare:
+        # прежний скрипт целиком: покадровый расчёт по строкам и запись GIF
+        legacy_path = str(pathlib.Path(gif_path).with_suffix("")) + "_legacy.gif"
+        t1 = time.perf_counter()
+        legacy_animation(legacy_path)
+        legacy = time.perf_counter() - t1
+        print(f"Прежний скрипт: {legacy:.1f} с ({legacy_path}), ускорение ×{legacy / total:.1f}")
+
+
+if __name__ == "__main__":
+    main(compare="--compare" in sys.argv)